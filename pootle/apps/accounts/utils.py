@@ -17,6 +17,7 @@ from django.core.validators import ValidationError
 from allauth.account.models import EmailAddress
 from allauth.account.utils import sync_user_email_addresses
 
+from pootle.core.models import Revision
 from pootle_store.constants import FUZZY, UNTRANSLATED
 from pootle_store.util import SuggestionStates
 
@@ -197,57 +198,61 @@ class UserPurger(object):
         """
 
         # Revert unit comments where self.user is latest commenter.
-        for unit in self.user.commented.iterator():
-
-            # Find comments by other self.users
-            comments = unit.get_comments().exclude(submitter=self.user)
-
-            if comments.exists():
-                # If there are previous comments by others update the
-                # translator_comment, commented_by, and commented_on
-                last_comment = comments.latest("pk")
-                unit.translator_comment = last_comment.new_value
-                unit.commented_by_id = last_comment.submitter_id
-                unit.commented_on = last_comment.creation_time
-                logger.debug("Unit comment reverted: %s", repr(unit))
-            else:
-                unit.translator_comment = ""
-                unit.commented_by = None
-                unit.commented_on = None
-                logger.debug("Unit comment removed: %s", repr(unit))
-
-            # Increment revision
-            unit._comment_updated = True
-            unit.save()
+        units = self.user.commented
+        with Revision.allocate(units.count()) as incr_revision:
+            for unit in units.iterator():
+
+                # Find comments by other self.users
+                comments = unit.get_comments().exclude(submitter=self.user)
+
+                if comments.exists():
+                    # If there are previous comments by others update the
+                    # translator_comment, commented_by, and commented_on
+                    last_comment = comments.latest("pk")
+                    unit.translator_comment = last_comment.new_value
+                    unit.commented_by_id = last_comment.submitter_id
+                    unit.commented_on = last_comment.creation_time
+                    logger.debug("Unit comment reverted: %s", repr(unit))
+                else:
+                    unit.translator_comment = ""
+                    unit.commented_by = None
+                    unit.commented_on = None
+                    logger.debug("Unit comment removed: %s", repr(unit))
+
+                # Increment revision
+                unit._comment_updated = True
+                unit.save(incr_revision=incr_revision)
 
     @write_stdout(" * Reverting units edited by: %(user)s... ")
     def revert_units_edited(self):
         """Revert unit edits made by a user to previous edit.
         """
         # Revert unit target where user is the last submitter.
-        for unit in self.user.submitted.iterator():
-
-            # Find the last submission by different user that updated the
-            # unit.target.
-            edits = unit.get_edits().exclude(submitter=self.user)
-
-            if edits.exists():
-                last_edit = edits.latest("pk")
-                unit.target_f = last_edit.new_value
-                unit.submitted_by_id = last_edit.submitter_id
-                unit.submitted_on = last_edit.creation_time
-                logger.debug("Unit edit reverted: %s", repr(unit))
-            else:
-                # if there is no previous submissions set the target to "" and
-                # set the unit.submitted_by to None
-                unit.target_f = ""
-                unit.submitted_by = None
-                unit.submitted_on = unit.creation_time
-                logger.debug("Unit edit removed: %s", repr(unit))
-
-            # Increment revision
-            unit._target_updated = True
-            unit.save()
+        units = self.user.submitted
+        with Revision.allocate(units.count()) as incr_revision:
+            for unit in units.iterator():
+
+                # Find the last submission by different user that updated the
+                # unit.target.
+                edits = unit.get_edits().exclude(submitter=self.user)
+
+                if edits.exists():
+                    last_edit = edits.latest("pk")
+                    unit.target_f = last_edit.new_value
+                    unit.submitted_by_id = last_edit.submitter_id
+                    unit.submitted_on = last_edit.creation_time
+                    logger.debug("Unit edit reverted: %s", repr(unit))
+                else:
+                    # if there is no previous submissions set the target to "" and
+                    # set the unit.submitted_by to None
+                    unit.target_f = ""
+                    unit.submitted_by = None
+                    unit.submitted_on = unit.creation_time
+                    logger.debug("Unit edit removed: %s", repr(unit))
+
+                # Increment revision
+                unit._target_updated = True
+                unit.save(incr_revision=incr_revision)
 
     @write_stdout(" * Reverting units reviewed by: %(user)s... ")
     def revert_units_reviewed(self):
@@ -275,21 +280,23 @@ class UserPurger(object):
             # Remove the review.
             review.delete()
 
-        for unit in self.user.reviewed.iterator():
-            reviews = unit.get_suggestion_reviews().exclude(submitter=self.user)
-            if reviews.exists():
-                previous_review = reviews.latest("pk")
-                unit.reviewed_by_id = previous_review.submitter_id
-                unit.reviewed_on = previous_review.creation_time
-                logger.debug("Unit reviewed_by reverted: %s", repr(unit))
-            else:
-                unit.reviewed_by = None
-                unit.reviewed_on = None
-
-                # Increment revision
-                unit._target_updated = True
-                logger.debug("Unit reviewed_by removed: %s", repr(unit))
-            unit.save()
+        units = self.user.reviewed
+        with Revision.allocate(units.count()) as incr_revision:
+            for unit in units.iterator():
+                reviews = unit.get_suggestion_reviews().exclude(submitter=self.user)
+                if reviews.exists():
+                    previous_review = reviews.latest("pk")
+                    unit.reviewed_by_id = previous_review.submitter_id
+                    unit.reviewed_on = previous_review.creation_time
+                    logger.debug("Unit reviewed_by reverted: %s", repr(unit))
+                else:
+                    unit.reviewed_by = None
+                    unit.reviewed_on = None
+
+                    # Increment revision
+                    unit._target_updated = True
+                    logger.debug("Unit reviewed_by removed: %s", repr(unit))
+                unit.save(incr_revision=incr_revision)
 
     @write_stdout(" * Reverting unit state changes by: %(user)s... ")
     def revert_units_state_changed(self):
@@ -299,33 +306,37 @@ class UserPurger(object):
         # Delete orphaned submissions.
         self.user.submission_set.filter(unit__isnull=True).delete()
 
-        for submission in self.user.get_unit_states_changed().iterator():
-            unit = submission.unit
-
-            # We have to get latest by pk as on mysql precision is not to
-            # microseconds - so creation_time can be ambiguous
-            if submission != unit.get_state_changes().latest("pk"):
-                # If the unit has been changed more recently we don't need to
-                # revert the unit state.
+        submissions = self.user.get_unit_states_changed()
+        with Revision.allocate(submissions.count()) as incr_revision:
+            for submission in submissions.iterator():
+                unit = submission.unit
+
+                # We have to get latest by pk as on mysql precision is not to
+                # microseconds - so creation_time can be ambiguous
+                if submission != unit.get_state_changes().latest("pk"):
+                    # If the unit has been changed more recently we don't need to
+                    # revert the unit state.
+                    submission.delete()
+                    return
                 submission.delete()
-                return
-            submission.delete()
-            other_submissions = unit.get_state_changes().exclude(submitter=self.user)
-            if other_submissions.exists():
-                new_state = other_submissions.latest("pk").new_value
-            else:
-                new_state = UNTRANSLATED
-            if new_state != unit.state:
-                if unit.state == FUZZY:
-                    unit.markfuzzy(False)
-                elif new_state == FUZZY:
-                    unit.markfuzzy(True)
-                unit.state = new_state
-
-                # Increment revision
-                unit._state_updated = True
-                unit.save()
-                logger.debug("Unit state reverted: %s", repr(unit))
+                other_submissions = unit.get_state_changes().exclude(
+                    submitter=self.user
+                )
+                if other_submissions.exists():
+                    new_state = other_submissions.latest("pk").new_value
+                else:
+                    new_state = UNTRANSLATED
+                if new_state != unit.state:
+                    if unit.state == FUZZY:
+                        unit.markfuzzy(False)
+                    elif new_state == FUZZY:
+                        unit.markfuzzy(True)
+                    unit.state = new_state
+
+                    # Increment revision
+                    unit._state_updated = True
+                    unit.save(incr_revision=incr_revision)
+                    logger.debug("Unit state reverted: %s", repr(unit))
 
 
 def verify_user(user):
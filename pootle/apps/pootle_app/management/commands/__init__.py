@@ -9,14 +9,37 @@
 
 import datetime
 import logging
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from pootle.core.utils.workers import get_worker_state, run_in_workers
 from pootle.runner import set_sync_mode
 from pootle_project.models import Project
 from pootle_translationproject.models import TranslationProject
 
 
+def _run_translation_project(args):
+    """Runs the worker's command over a translation project.
+
+    Errors are reported as failures of the translation project rather than
+    raised, so they don't abort the whole pool.
+
+    :param args: a `(tp_id, pootle_path)` tuple.
+    :return: a `(pootle_path, success, elapsed_seconds)` tuple.
+    """
+    tp_id, pootle_path = args
+    command, options = get_worker_state()
+    start = time.time()
+    try:
+        tp = TranslationProject.objects.get(id=tp_id)
+        success = command.do_translation_project(tp, **options)
+    except Exception:
+        logging.exception(u"Failed to run %s over %s", command.name, pootle_path)
+        success = False
+    return pootle_path, success, time.time() - start
+
+
 class SkipChecksMixin(object):
     def check(
         self,
@@ -63,6 +86,12 @@ class PootleCommand(BaseCommand):
             default=False,
             help=("Run all jobs in a single process, without using rq workers"),
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of processes to spread translation projects across",
+        )
 
     def __init__(self, *args, **kwargs):
         self.languages = []
@@ -70,6 +99,10 @@ class PootleCommand(BaseCommand):
         super().__init__(*args, **kwargs)
 
     def do_translation_project(self, tp, **options):
+        """Runs the command over `tp`.
+
+        :return: `False` if running the command failed, `True` otherwise.
+        """
         process_stores = True
 
         if hasattr(self, "handle_translation_project"):
@@ -78,10 +111,10 @@ class PootleCommand(BaseCommand):
                 process_stores = self.handle_translation_project(tp, **options)
             except Exception:
                 logging.exception(u"Failed to run %s over %s", self.name, tp)
-                return
+                return False
 
             if not process_stores:
-                return
+                return True
 
         if hasattr(self, "handle_all_stores"):
             logging.info(u"Running %s over %s's files", self.name, tp)
@@ -89,7 +122,47 @@ class PootleCommand(BaseCommand):
                 self.handle_all_stores(tp, **options)
             except Exception:
                 logging.exception(u"Failed to run %s over %s's files", self.name, tp)
-                return
+                return False
+
+        return True
+
+    def do_translation_projects_in_pool(self, tps, **options):
+        """Runs the command over `tps` spread across `options["jobs"]`
+        worker processes.
+        """
+        tp_args = [(tp.id, tp.pootle_path) for tp in tps]
+        failed = []
+        start = time.time()
+        results = run_in_workers(
+            _run_translation_project, tp_args, options["jobs"], state=(self, options)
+        )
+        for i, (pootle_path, success, elapsed) in enumerate(results, 1):
+            if not success:
+                failed.append(pootle_path)
+            logging.info(
+                u"[%d/%d] %s %s in %.1fs",
+                i,
+                len(tp_args),
+                "Failed" if not success else "Finished",
+                pootle_path,
+                elapsed,
+            )
+
+        logging.info(
+            u"Ran %s over %d translation projects (%d failed) in %.1fs",
+            self.name,
+            len(tp_args),
+            len(failed),
+            time.time() - start,
+        )
+        self.check_failed(failed)
+
+    def check_failed(self, failed):
+        """Raises a `CommandError` listing the `failed` TP paths, if any."""
+        if failed:
+            raise CommandError(
+                u"Failed to run %s over: %s" % (self.name, ", ".join(sorted(failed)))
+            )
 
     def handle(self, **options):
         # adjust debug level to the verbosity option
@@ -125,10 +198,8 @@ class PootleCommand(BaseCommand):
         end = datetime.datetime.now()
         logging.info("All done for %s in %s", self.name, end - start)
 
-    def handle_all(self, **options):
-        if options["no_rq"]:
-            set_sync_mode(options["noinput"])
-
+    def get_translation_projects(self):
+        """Gets the translation projects the command should run over."""
         if self.projects:
             project_query = Project.objects.filter(code__in=self.projects)
         else:
@@ -144,4 +215,20 @@ class PootleCommand(BaseCommand):
                 tp_query = tp_query.filter(language__code__in=self.languages)
 
             for tp in tp_query.iterator():
-                self.do_translation_project(tp, **options)
+                yield tp
+
+    def handle_all(self, **options):
+        if options["no_rq"]:
+            set_sync_mode(options["noinput"])
+
+        if options["jobs"] > 1:
+            self.do_translation_projects_in_pool(
+                self.get_translation_projects(), **options
+            )
+            return
+
+        failed = []
+        for tp in self.get_translation_projects():
+            if not self.do_translation_project(tp, **options):
+                failed.append(tp.pootle_path)
+        self.check_failed(failed)
@@ -11,7 +11,9 @@ import os
 # This must be run before importing Django.
 os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
 
-from pootle.core.checks.checker import QualityCheckUpdater
+from django.core.management.base import CommandError
+
+from pootle.core.checks.checker import FailedStoreRangesError, QualityCheckUpdater
 
 from . import PootleCommand
 
@@ -37,6 +39,9 @@ class Command(PootleCommand):
     def handle_all(self, **options):
         if not self.projects and not self.languages:
             self.stdout.write(u"Running %s (noargs)" % self.name)
-            QualityCheckUpdater(options["check_names"]).update()
+            try:
+                QualityCheckUpdater(options["check_names"]).update(jobs=options["jobs"])
+            except FailedStoreRangesError as e:
+                raise CommandError(str(e))
         else:
             super().handle_all(**options)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+
+os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
+
+from django.core.management.base import BaseCommand
+
+from pootle.core.mixins.treeitem import CachedMethods
+from pootle.core.stats import HashStatsBackend, KeyStatsBackend
+from . import SkipChecksMixin
+
+
+class Command(SkipChecksMixin, BaseCommand):
+    help = "Convert per-key stats cache data into per-path hashes."
+    skip_system_check_tags = ("data",)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-keys",
+            action="store_true",
+            default=False,
+            dest="keep_keys",
+            help="Don't remove the per-key stats data after converting it.",
+        )
+
+    def handle(self, **options):
+        key_backend = KeyStatsBackend()
+        hash_backend = HashStatsBackend()
+        names = CachedMethods.get_all()
+
+        paths = set()
+        for key in key_backend.cache.iter_keys("*:get_*"):
+            path, name = key.rsplit(":", 1)
+            if name in names:
+                paths.add(path)
+
+        for path in sorted(paths):
+            values = key_backend.get_many([path], names)[path]
+            hash_backend.set_many(
+                path,
+                {name: value for name, value in values.items() if value is not None},
+            )
+            if not options["keep_keys"]:
+                key_backend.delete(path, names)
+
+        self.stdout.write("Converted stats for %d paths." % len(paths))
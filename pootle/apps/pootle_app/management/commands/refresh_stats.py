@@ -12,6 +12,7 @@ import os
 # This must be run before importing Django.
 os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
 
+from pootle.core.mixins.treeitem import CachedMethods, NoCachedStats, prefetched_stats
 from pootle_store.models import Store
 
 from . import PootleCommand
@@ -34,14 +35,47 @@ class Command(PootleCommand):
             default=False,
             help="Process disabled projects",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            dest="bulk",
+            default=False,
+            help="Recalculate stats in bulk within this process, without "
+            "creating a job for every file",
+        )
 
     def handle_all(self, **options):
         self.__class__.process_disabled_projects = options["disabled_projects"]
 
         super().handle_all(**options)
 
-    def handle_all_stores(self, translation_project, **options_):
+        if options["bulk"]:
+            projects = {
+                tp.project_id: tp.project for tp in self.get_translation_projects()
+            }
+            for project in projects.values():
+                self.refresh_project_stats(project)
+
+    def refresh_project_stats(self, project):
+        logger.info("Update stats for %s", project.pootle_path)
+        with prefetched_stats(project.children):
+            for name in CachedMethods.get_all():
+                try:
+                    project.update_cached(name)
+                except NoCachedStats:
+                    logger.warning(
+                        "Missing %s stats for some of %s's children",
+                        name,
+                        project.pootle_path,
+                    )
+
+    def handle_all_stores(self, translation_project, **options):
+        if options["bulk"]:
+            logger.info("Update stats for %s", translation_project.pootle_path)
+            translation_project.refresh_stats_bulk()
+            return
+
         stores = Store.objects.live().filter(translation_project=translation_project)
         for store in stores.iterator():
             logger.info("Add job to update stats for %s", store.pootle_path)
-            store.update_all_cache()
+            store.update_all_cache(full_refresh=True)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+
+os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from pootle_store.unit.textsearch import IndexedUnitTextSearch, get_text_search_backend
+from . import SkipChecksMixin
+
+
+class Command(SkipChecksMixin, BaseCommand):
+    help = "Create the full-text index used by the unit text search backend."
+    skip_system_check_tags = ("data",)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            default=False,
+            dest="drop",
+            help="Drop the index instead of creating it.",
+        )
+
+    def handle(self, **options):
+        backend = get_text_search_backend()
+        if not issubclass(backend, IndexedUnitTextSearch):
+            raise CommandError(
+                "The configured text search backend doesn't use an index."
+            )
+        if connection.vendor != backend.vendor:
+            raise CommandError(
+                "The configured text search backend requires a %s database."
+                % backend.vendor
+            )
+
+        if options["drop"]:
+            backend.drop_index(connection)
+            self.stdout.write("Dropped the text search index.")
+        else:
+            backend.create_index(connection)
+            self.stdout.write("Created the text search index.")
@@ -8,37 +8,103 @@
 # AUTHORS file for copyright and authorship information.
 
 import os
-import sys
+import time
+from collections import deque
 from hashlib import md5
 
 # This must be run before importing Django.
 os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
 
-from elasticsearch import Elasticsearch, helpers
+from django_redis import get_redis_connection
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
 
-from pootle.core.search.backends.elasticsearch import INDEX_PREFIX
+from pootle.core.search.broker import get_search_backend
 from pootle.core.utils import dateformat
+from pootle.core.utils.workers import get_worker_state, run_in_workers
+from pootle_language.models import Language
 from pootle_store.models import Unit
 
 
-ALL_TM_INDICES = INDEX_PREFIX + "*"
 BULK_CHUNK_SIZE = 5000
 
 
+def _index_language(args):
+    """Indexes the translations of a language in a worker process.
+
+    :return: a `(language_code, indexed_count, elapsed_seconds)` tuple.
+    """
+    command, options = get_worker_state()
+    # TM server connections can't be shared with the parent process
+    command.backend = get_search_backend()
+    language_code, start_position = args
+    return (language_code,) + command.index_language(
+        language_code, start_position, **options
+    )
+
+
+class Checkpoints(object):
+    """Per-language progress of an `update_tmserver` run, stored in Redis.
+
+    The position of each language is the `(revision, id)` pair of the last
+    unit known to be indexed, as units are indexed in that order. Languages
+    which were completely indexed are marked as done. Checkpoints are kept
+    until the whole run finishes, so that an interrupted run can resume
+    where it stopped.
+    """
+
+    KEY = "pootle:tm:update_checkpoints"
+    DONE = "done"
+
+    def __init__(self):
+        self.connection = get_redis_connection("redis")
+
+    def get_all(self):
+        """Gets the checkpoints of all languages.
+
+        :return: a dictionary of `{language_code: position}`, where position
+            is either a `(revision, id)` tuple or `Checkpoints.DONE`.
+        """
+        checkpoints = {}
+        for language_code, value in self.connection.hgetall(self.KEY).items():
+            value = value.decode("utf-8")
+            if value != self.DONE:
+                value = tuple(int(number) for number in value.split(":"))
+            checkpoints[language_code.decode("utf-8")] = value
+        return checkpoints
+
+    def set(self, language_code, revision, unit_id):
+        self.connection.hset(self.KEY, language_code, "%d:%d" % (revision, unit_id))
+
+    def set_done(self, language_code):
+        self.connection.hset(self.KEY, language_code, self.DONE)
+
+    def clear(self):
+        self.connection.delete(self.KEY)
+
+
 class DBParser(object):
     def __init__(self, *args, **kwargs):
         self.stdout = kwargs.pop("stdout")
         self.exclude_disabled_projects = not kwargs.pop("disabled_projects")
 
-    def get_units(self):
-        """Gets the units to import and its total count."""
+    def get_units(self, language_code, start_position):
+        """Gets the units of a language to import and its total count.
+
+        Units are sorted by revision and ID, so that the position of the last
+        unit indexed can be used to resume importing.
+
+        :param start_position: `(revision, id)` pair of the last unit already
+            imported. Only units after it are retrieved.
+        """
+        revision, unit_id = start_position
         units_qs = (
             Unit.simple_objects.exclude(target_f__isnull=True)
             .exclude(target_f__exact="")
-            .filter(revision__gt=self.last_indexed_revision)
+            .filter(store__translation_project__language__code=language_code)
+            .filter(Q(revision__gt=revision) | Q(revision=revision, id__gt=unit_id))
             .select_related(
                 "submitted_by",
                 "store",
@@ -64,7 +130,7 @@ class DBParser(object):
             "store__translation_project__project__fullname",
             "store__pootle_path",
             "store__translation_project__language__code",
-        ).order_by()
+        ).order_by("revision", "id")
 
         return units_qs.iterator(), units_qs.count()
 
@@ -80,12 +146,8 @@ class DBParser(object):
         if unit["submitted_on"]:
             mtime = int(dateformat.format(unit["submitted_on"], "U"))
 
-        index_name = (
-            INDEX_PREFIX + unit["store__translation_project__language__code"].lower()
-        )
         return {
-            "_index": index_name,
-            "_id": unit["id"],
+            "id": unit["id"],
             "revision": unit["revision"],
             "project": unit["store__translation_project__project__fullname"],
             "path": unit["store__pootle_path"],
@@ -132,71 +194,166 @@ class Command(BaseCommand):
             help="Add translations from disabled projects",
         )
 
-    def _parse_translations(self, **options):
-        units, total = self.parser.get_units()
-
-        if total == 0:
-            self.stdout.write("No translations to index")
-            sys.exit()
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to spread languages across",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            dest="chunk_size",
+            default=BULK_CHUNK_SIZE,
+            help="Number of translations to send to the TM server per request",
+        )
+        parser.add_argument(
+            "--no-resume",
+            action="store_false",
+            dest="resume",
+            default=True,
+            help="Discard the progress of an interrupted run and start over",
+        )
 
-        self.stdout.write("%s translations to index" % total)
+    def _initialize(self, **options):
+        if not settings.ZING_TM_SERVER:
+            raise CommandError("ZING_TM_SERVER setting is missing.")
 
-        if options["dry_run"]:
-            sys.exit()
+        self.backend = get_search_backend()
+        if self.backend is None:
+            raise CommandError("ZING_TM_SERVER setting is invalid.")
 
-        self.stdout.write("")
+        self.parser = DBParser(
+            stdout=self.stdout, disabled_projects=options["disabled_projects"],
+        )
+        self.checkpoints = Checkpoints()
 
-        i = 0
-        for i, unit in enumerate(units, start=1):
-            if (i % 1000 == 0) or (i == total):
-                percent = "%.1f" % (i * 100.0 / total)
-                self.stdout.write("%s (%s%%)" % (i, percent), ending="\r")
-                self.stdout.flush()
+    def _get_latest_indexed_revisions(self, **options):
+        """Gets the latest revision indexed for each language.
 
-            yield self.parser.get_unit_data(unit)
+        :return: a dictionary of `{language_code: revision}`. Languages
+            missing from the TM are left out.
+        """
+        if options["rebuild"] or options["refresh"]:
+            return {}
 
-        if i != total:
-            self.stdout.write("Expected %d, loaded %d." % (total, i))
+        return self.backend.get_indexed_revisions(
+            Language.objects.values_list("code", flat=True)
+        )
 
-    def _initialize(self, **options):
-        if not settings.ZING_TM_SERVER:
-            raise CommandError("ZING_TM_SERVER setting is missing.")
+    def _get_start_positions(self, checkpoints, **options):
+        """Gets the position to start indexing each language from.
+
+        :return: a list of `(language_code, (revision, id))` pairs, leaving
+            out languages an interrupted run already finished.
+        """
+        indexed_revisions = self._get_latest_indexed_revisions(**options)
+        positions = []
+        for code in Language.objects.order_by("code").values_list("code", flat=True):
+            checkpoint = checkpoints.get(code)
+            if checkpoint == Checkpoints.DONE:
+                continue
+            if checkpoint is None:
+                checkpoint = (indexed_revisions.get(code, -1), 0)
+            positions.append((code, checkpoint))
+
+        return positions
+
+    def _get_objs(self, units, positions):
+        for unit in units:
+            positions.append((unit["revision"], unit["id"]))
+            yield self.parser.get_unit_data(unit)
 
-        tm_settings = settings.ZING_TM_SERVER
+    def index_language(self, language_code, start_position, **options):
+        """Indexes the translations of a language after `start_position`,
+        checkpointing progress after each chunk.
 
-        self.es = Elasticsearch(
-            [{"host": tm_settings["HOST"], "port": tm_settings["PORT"]}],
-            retry_on_timeout=True,
-        )
+        :return: a `(indexed_count, elapsed_seconds)` tuple.
+        """
+        start = time.time()
+        units, total = self.parser.get_units(language_code, start_position)
+        if total == 0:
+            self.checkpoints.set_done(language_code)
+            return 0, time.time() - start
 
-        self.parser = DBParser(
-            stdout=self.stdout, disabled_projects=options["disabled_projects"],
+        # Positions of units sent to the TM server but not acknowledged yet.
+        # Results are yielded in order once their chunk has been indexed.
+        positions = deque()
+        chunk_size = options["chunk_size"]
+        i = 0
+        results = self.backend.bulk_update(
+            language_code, self._get_objs(units, positions), chunk_size
         )
+        for i, _ in enumerate(results, start=1):
+            position = positions.popleft()
+            if i % chunk_size == 0:
+                self.checkpoints.set(language_code, *position)
 
-    def _set_latest_indexed_revision(self, **options):
-        self.last_indexed_revision = -1
-
-        if not options["rebuild"] and not options["refresh"]:
-            result = self.es.search(
-                index=ALL_TM_INDICES,
-                body={"aggs": {"max_revision": {"max": {"field": "revision"}}}},
-                size=0,
-            )
-            if "aggregations" in result:
-                self.last_indexed_revision = (
-                    int(result["aggregations"]["max_revision"]["value"]) or -1
+        self.checkpoints.set_done(language_code)
+        if i != total:
+            self.stdout.write("%s: expected %d, loaded %d." % (language_code, total, i))
+        return i, time.time() - start
+
+    def _index_languages(self, positions, **options):
+        """Indexes languages in `positions`, optionally spread across
+        `options["workers"]` worker processes.
+        """
+        if options["workers"] <= 1:
+            for language_code, start_position in positions:
+                yield (language_code,) + self.index_language(
+                    language_code, start_position, **options
                 )
+            return
 
-        self.parser.last_indexed_revision = self.last_indexed_revision
-
-        self.stdout.write("Last indexed revision = %s" % self.last_indexed_revision)
+        yield from run_in_workers(
+            _index_language, positions, options["workers"], state=(self, options)
+        )
 
     def handle(self, **options):
         self._initialize(**options)
 
-        if options["rebuild"] and not options["dry_run"]:
-            self.es.indices.delete(index=ALL_TM_INDICES)
+        checkpoints = {}
+        if options["resume"]:
+            checkpoints = self.checkpoints.get_all()
+        elif not options["dry_run"]:
+            self.checkpoints.clear()
 
-        self._set_latest_indexed_revision(**options)
+        if checkpoints:
+            self.stdout.write("Resuming interrupted run")
+        elif options["rebuild"] and not options["dry_run"]:
+            self.backend.delete_all()
 
-        helpers.bulk(self.es, self._parse_translations(**options))
+        positions = self._get_start_positions(checkpoints, **options)
+
+        if options["dry_run"]:
+            total = sum(
+                self.parser.get_units(code, position)[1] for code, position in positions
+            )
+            self.stdout.write("%s translations to index" % total)
+            return
+
+        indexed = 0
+        start = time.time()
+        results = self._index_languages(positions, **options)
+        for i, (language_code, count, elapsed) in enumerate(results, start=1):
+            indexed += count
+            if count == 0:
+                continue
+            self.stdout.write(
+                "[%d/%d] %s: indexed %d translations in %.1fs (%.0f/s)"
+                % (
+                    i,
+                    len(positions),
+                    language_code,
+                    count,
+                    elapsed,
+                    count / max(elapsed, 0.001),
+                )
+            )
+
+        elapsed = time.time() - start
+        self.checkpoints.clear()
+        self.stdout.write(
+            "Indexed %d translations in %.1fs (%.0f/s)"
+            % (indexed, elapsed, indexed / max(elapsed, 0.001))
+        )
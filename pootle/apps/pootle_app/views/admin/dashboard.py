@@ -17,6 +17,7 @@ from django_rq.queues import get_queue
 from django_rq.workers import Worker
 
 from pootle.core.decorators import admin_required
+from pootle.core.mixins.treeitem import get_update_cache_job_stats
 
 
 def rq_stats():
@@ -39,11 +40,16 @@ def rq_stats():
         status_msg = _("Stopped")
 
     failed_job_registry = FailedJobRegistry(queue.name, queue.connection)
+    stats_jobs = get_update_cache_job_stats(queue)
+    if stats_jobs["run"]:
+        stats_jobs["avg_run_time"] = stats_jobs["run_time"] / stats_jobs["run"]
     result = {
         "job_count": queue.count,
+        "scheduled_job_count": stats_jobs["scheduled"],
         "failed_job_count": len(failed_job_registry),
         "is_running": is_running,
         "status_msg": status_msg,
+        "stats_jobs": stats_jobs,
     }
 
     return result
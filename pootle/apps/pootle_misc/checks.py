@@ -9,6 +9,7 @@
 
 import logging
 import re
+from collections import OrderedDict
 from functools import lru_cache
 
 from translate.filters import checks
@@ -23,6 +24,9 @@ from .util import import_func
 
 re._MAXCACHE = 2000
 
+#: Maximum number of distinct source strings to keep fingerprints for.
+SOURCE_FINGERPRINT_CACHE_SIZE = 10000
+
 CATEGORY_IDS = {
     "critical": Category.CRITICAL,
     "cosmetic": Category.COSMETIC,
@@ -273,6 +277,37 @@ linebreaks_single_regex = re.compile(r"(?<!\n)\n(?!\n)")
 linebreaks_double_regex = re.compile(r"(?<!\n)\n\n(?!\n)")
 linebreaks_multiple_regex = re.compile(r"(?<!\n)\n{3,}(?!\n)")
 
+# A character every match of the given `_generic_check()` regex contains:
+# strings lacking it have no placeholders, and can skip splitting altogether.
+generic_check_triggers = {
+    java_format_regex: u"{",
+    template_format_regex: u"$",
+    android_format_regex: u"%",
+    objective_c_format_regex: u"%",
+    javaencoded_unicode_regex: u"\\",
+    dollar_sign_placeholders_regex: u"$",
+    dollar_sign_closure_placeholders_regex: u"$",
+    percent_sign_closure_placeholders_regex: u"%",
+    percent_sign_placeholders_regex: u"%",
+    uppercase_placeholders_regex: u"_",
+    mustache_placeholders_regex: u"{",
+    percent_brace_placeholders_regex: u"%",
+}
+
+# Source-only preconditions of checks: a check always passes for source
+# strings its precondition returns `False` for, whatever the translation is.
+source_preconditions = {
+    "accelerators": lambda string: not plurr_format_regex.search(string),
+    "double_quotes_in_tags": lambda string: not img_banner_regex.match(string),
+    "ellipsis": lambda string: u"…" in string,
+    "mustache_placeholders": lambda string: not plurr_format_regex.search(string),
+    "plurr_format": lambda string: bool(plurr_format_regex.search(string)),
+    "plurr_placeholders": lambda string: bool(plurr_placeholders_regex.search(string)),
+    "unbalanced_curly_braces": lambda string: not plurr_format_regex.search(string),
+    "unescaped_ampersands": lambda string: bool(escaped_entities_regex.search(string)),
+    "uppercase_placeholders": lambda string: not plurr_format_regex.search(string),
+}
+
 
 def clean_plurr_placeholder(string):
     return plurr_plural_suffix_regex.sub("", string)
@@ -294,6 +329,81 @@ class SkipCheck(Exception):
     pass
 
 
+class SourceFingerprintCache(object):
+    """Bounded LRU cache of source string fingerprints.
+
+    Source fingerprints only depend on the source string and the check, so
+    they can be reused across units and languages sharing the same source.
+    Checks which don't apply to a source (those whose source-only
+    precondition fails, or which raise `SkipCheck` for it) are remembered
+    too, so they can be skipped altogether.
+    """
+
+    def __init__(self, maxsize=SOURCE_FINGERPRINT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def clear(self):
+        self.data.clear()
+
+    def get_entry(self, string):
+        """Returns a `(fingerprints, skipped_checks)` tuple for `string`."""
+        # Use plain strings as keys: hashing and comparing `multistring`s is
+        # considerably slower
+        key = str.__str__(string)
+        entry = self.data.get(key)
+        if entry is None:
+            skipped_checks = set(
+                name
+                for name, precondition in source_preconditions.items()
+                if not precondition(key)
+            )
+            entry = self.data[key] = ({}, skipped_checks)
+            if len(self.data) > self.maxsize:
+                try:
+                    self.data.popitem(last=False)
+                except KeyError:
+                    pass
+        else:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:
+                pass
+
+        return entry
+
+    def get(self, get_fingerprint_func, name, string):
+        """Returns the fingerprint of the `string` source for the `name`
+        check, calculating it via `get_fingerprint_func` if needed.
+
+        :return: the fingerprint, or the `SkipCheck` class itself if the
+            check doesn't apply to `string`.
+        """
+        fingerprints, skipped_checks = self.get_entry(string)
+        try:
+            fingerprint = fingerprints[name]
+        except KeyError:
+            try:
+                fingerprint = get_fingerprint_func(string, is_source=True)
+            except SkipCheck:
+                fingerprint = SkipCheck
+                skipped_checks.add(name)
+            fingerprints[name] = fingerprint
+
+        return fingerprint
+
+    def get_skipped_checks(self, string):
+        """Returns the names of the checks known to pass for the `string`
+        source whatever its translation is.
+
+        The returned set is shared, and must not be modified.
+        """
+        return self.get_entry(string)[1]
+
+
+source_fingerprints = SourceFingerprintCache()
+
+
 class ENChecker(checks.UnitChecker):
     def run_test(self, test, unit):
         """Runs the given test on the given unit."""
@@ -316,6 +426,14 @@ class ENChecker(checks.UnitChecker):
 
         return super().run_filters(unit, categorised)
 
+    def get_ignored_filters(self):
+        """Ignores checks not applying to the current source string on top
+        of the language specific ones.
+        """
+        return super().get_ignored_filters() + list(
+            source_fingerprints.get_skipped_checks(self.str1)
+        )
+
     @critical
     def java_format(self, str1, str2, **kwargs):
         return _generic_check(str1, str2, java_format_regex, u"java_format")
@@ -441,7 +559,9 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(
+            get_fingerprint, str1, str2, name=u"mustache_placeholder_pairs"
+        ):
             return True
 
         raise checks.FilterFailure(u"mustache_placeholder_pairs")
@@ -487,7 +607,9 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(
+            get_fingerprint, str1, str2, name=u"mustache_like_placeholder_pairs"
+        ):
             return True
 
         raise checks.FilterFailure(u"mustache_like_placeholder_pairs")
@@ -506,7 +628,7 @@ class ENChecker(checks.UnitChecker):
 
             return is_date_format
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"date_format"):
             return True
 
         raise checks.FilterFailure(u"Incorrect date format")
@@ -537,7 +659,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"whitespace"):
             return True
 
         raise checks.FilterFailure(u"Incorrect whitespaces")
@@ -547,7 +669,7 @@ class ENChecker(checks.UnitChecker):
         def get_fingerprint(string, is_source=False, translation=""):
             return 0
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"test_check"):
             return True
 
         raise checks.FilterFailure(u"Incorrect test check")
@@ -607,7 +729,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"changed_attributes"):
             return True
 
         raise checks.FilterFailure(u"Changed attributes")
@@ -630,7 +752,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"c_format"):
             return True
 
         raise checks.FilterFailure(u"Incorrect C format")
@@ -654,7 +776,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"non_printable"):
             return True
 
         raise checks.FilterFailure(u"Non printable mismatch")
@@ -682,7 +804,9 @@ class ENChecker(checks.UnitChecker):
 
             return level
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(
+            get_fingerprint, str1, str2, name=u"unbalanced_tag_braces"
+        ):
             return True
 
         raise checks.FilterFailure(u"Unbalanced tag braces")
@@ -722,7 +846,9 @@ class ENChecker(checks.UnitChecker):
         if plurr_format_regex.search(str1):
             return True
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(
+            get_fingerprint, str1, str2, name=u"unbalanced_curly_braces"
+        ):
             return True
 
         raise checks.FilterFailure(u"Unbalanced curly braces")
@@ -768,7 +894,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"tags_differ"):
             return True
 
         raise checks.FilterFailure(u"Tags differ")
@@ -824,7 +950,7 @@ class ENChecker(checks.UnitChecker):
         if plurr_format_regex.search(str1):
             return True
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"accelerators"):
             return True
 
         raise checks.FilterFailure(u"Accelerator mismatch")
@@ -896,7 +1022,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"broken_entities"):
             return True
 
         raise checks.FilterFailure(u"Broken HTML entities")
@@ -953,7 +1079,7 @@ class ENChecker(checks.UnitChecker):
 
             return fingerprint
 
-        if check_translation(get_fingerprint, str1, str2):
+        if check_translation(get_fingerprint, str1, str2, name=u"doublequoting"):
             return True
 
         raise checks.FilterFailure(u"Double quotes mismatch")
@@ -1141,6 +1267,11 @@ def run_given_filters(checker, unit, check_names=None):
     checker.results_cache = {}
     failures = {}
 
+    if isinstance(checker, ENChecker):
+        skipped_checks = source_fingerprints.get_skipped_checks(checker.str1)
+        if skipped_checks:
+            check_names = [name for name in check_names if name not in skipped_checks]
+
     for functionname in check_names:
         filterfunction = getattr(checker, functionname, None)
 
@@ -1259,8 +1390,13 @@ def get_qc_data_by_name(check_name):
 
 
 def _generic_check(str1, str2, regex, message):
+    trigger = generic_check_triggers.get(regex)
+
     def get_fingerprint(string, is_source=False, translation=""):
-        chunks = regex.split(string)
+        if trigger is not None and trigger not in string:
+            chunks = [string]
+        else:
+            chunks = regex.split(string)
 
         d = {}
         fingerprint = ""
@@ -1285,22 +1421,34 @@ def _generic_check(str1, str2, regex, message):
 
         return fingerprint
 
-    if check_translation(get_fingerprint, str1, str2):
+    if check_translation(get_fingerprint, str1, str2, name=message):
         return True
 
     raise checks.FilterFailure(message)
 
 
-def check_translation(get_fingerprint_func, string, translation):
-    if translation == "":
+def check_translation(get_fingerprint_func, string, translation, name=None):
+    """Compares the fingerprints of the `string` source and its `translation`.
+
+    :param name: name of the check. If set, the source fingerprint is looked
+        up in (and stored into) `source_fingerprints`, so it must only depend
+        on the source string.
+    """
+    if not translation:
         # no real translation provided, skipping
         return True
 
-    try:
-        a_fingerprint = get_fingerprint_func(
-            string, is_source=True, translation=translation
-        )
-    except SkipCheck:
+    if name is None:
+        try:
+            a_fingerprint = get_fingerprint_func(
+                string, is_source=True, translation=translation
+            )
+        except SkipCheck:
+            a_fingerprint = SkipCheck
+    else:
+        a_fingerprint = source_fingerprints.get(get_fingerprint_func, name, string)
+
+    if a_fingerprint is SkipCheck:
         # skip translation as it doesn't match required criteria
         return True
 
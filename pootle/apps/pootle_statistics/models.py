@@ -337,16 +337,21 @@ class Submission(models.Model):
 
         return result
 
+    def get_new_scorelogs(self):
+        """Returns the unsaved score logs to record for this submission."""
+        if not self.needs_scorelog():
+            return []
+
+        return [
+            ScoreLog(**score)
+            for score in ScoreLog.get_scorelogs(submission=self)
+            if "action_code" in score and score["user"] is not None
+        ]
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
 
-        if not self.needs_scorelog():
-            return
-
-        scorelogs_created = []
-        for score in ScoreLog.get_scorelogs(submission=self):
-            if "action_code" in score and score["user"] is not None:
-                scorelogs_created.append(ScoreLog(**score))
+        scorelogs_created = self.get_new_scorelogs()
         if scorelogs_created:
             self.scorelog_set.add(*scorelogs_created, bulk=False)
 
@@ -528,7 +533,28 @@ class ScoreLog(models.Model):
             suggester_score,
         ]
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def bulk_save(cls, scorelogs):
+        """Saves many score logs at once, updating users' scores.
+
+        Scores must have been calculated beforehand via `calculate_score()`.
+        """
+        cls.objects.bulk_create(scorelogs)
+
+        score_deltas = {}
+        for scorelog in scorelogs:
+            score_deltas[scorelog.user_id] = (
+                score_deltas.get(scorelog.user_id, 0) + scorelog.score_delta
+            )
+
+        User = get_user_model()
+        for user_id, score_delta in score_deltas.items():
+            User.objects.filter(id=user_id).update(score=F("score") + score_delta)
+
+        for scorelog in scorelogs:
+            scorelog.log()
+
+    def calculate_score(self):
         # copy current user rate
         self.rate = self.user.rate
         self.review_rate = self.user.review_rate
@@ -536,6 +562,9 @@ class ScoreLog(models.Model):
         translated = self.get_paid_wordcounts()[0]
         self.translated_wordcount = translated
 
+    def save(self, *args, **kwargs):
+        self.calculate_score()
+
         super().save(*args, **kwargs)
 
         User = get_user_model()
@@ -8,7 +8,9 @@
 # AUTHORS file for copyright and authorship information.
 
 import difflib
+import json
 from collections import OrderedDict
+from hashlib import md5
 
 from django.db import models
 from django.utils.functional import cached_property
@@ -37,9 +39,75 @@ class UnitDiffProxy(UnitProxy):
     def __ne__(self, other):
         return not self == other
 
+    @cached_property
+    def content_hash(self):
+        return get_content_hash(self)
+
+
+def get_content_hash(unit):
+    """Returns a fingerprint of the `unit` attributes compared by `StoreDiff`.
+
+    Two units have the same fingerprint if and only if they compare equal as
+    `UnitDiffProxy` objects. `unit` can be either a `UnitDiffProxy` or a
+    `Unit` model instance, which stores its fingerprint in `content_hash`.
+    """
+    content = []
+    for attr in UnitDiffProxy.match_attrs:
+        value = getattr(unit, attr)
+        if attr in ("source", "target"):
+            value = multistring_to_python(value).strings
+        content.append(value or "")
+
+    return md5(json.dumps(content).encode("utf-8")).hexdigest()
+
+
+def get_opcodes(a, b):
+    """Returns the `difflib.SequenceMatcher` opcodes to turn `a` into `b`.
+
+    The common prefix and suffix of both sequences are matched upfront, and
+    only what remains in between is fed to `SequenceMatcher`. Stores are
+    mostly updated by appending or removing a few units, so this avoids
+    running the matcher over whole stores. For sequences of unique items
+    such as unit IDs, the result is the same as matching them as a whole.
+    """
+    len_a, len_b = len(a), len(b)
+    max_common = min(len_a, len_b)
+
+    prefix = 0
+    while prefix < max_common and a[prefix] == b[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while suffix < max_common - prefix and a[-suffix - 1] == b[-suffix - 1]:
+        suffix += 1
+
+    opcodes = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+
+    end_a, end_b = len_a - suffix, len_b - suffix
+    if prefix == end_a and prefix < end_b:
+        opcodes.append(("insert", prefix, prefix, prefix, end_b))
+    elif prefix == end_b and prefix < end_a:
+        opcodes.append(("delete", prefix, end_a, prefix, prefix))
+    elif prefix < end_a:
+        sm = difflib.SequenceMatcher(None, a[prefix:end_a], b[prefix:end_b])
+        opcodes.extend(
+            (tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix)
+            for (tag, i1, i2, j1, j2) in sm.get_opcodes()
+        )
+
+    if suffix:
+        opcodes.append(("equal", end_a, len_a, end_b, len_b))
+
+    return opcodes
+
 
 class DBUnit(UnitDiffProxy):
-    pass
+    @cached_property
+    def content_hash(self):
+        # Units last saved before fingerprints were stored lack one
+        return self.unit.get("content_hash") or get_content_hash(self)
 
 
 class FileUnit(UnitDiffProxy):
@@ -100,6 +168,10 @@ class FileStore(object):
         """Retrieves a comparable `FileUnit` object by `id`."""
         return FileUnit(self.units[id])
 
+    def get_content_hash(self, id):
+        """Retrieves the content fingerprint of the unit identified by `id`."""
+        return self.get_unit(id).content_hash
+
 
 class DBStore(object):
     """DB store representation for diffing.
@@ -115,6 +187,11 @@ class DBStore(object):
         "id",
         "index",
         "revision",
+        "content_hash",
+    )
+
+    #: Fields needed to calculate the fingerprint of units lacking one
+    content_fields = (
         "source_f",
         "target_f",
         "developer_comment",
@@ -133,8 +210,20 @@ class DBStore(object):
         qs = self.store.unit_set
         if self.only_active:
             qs = qs.live()
-        units = qs.values(*self.unit_fields).order_by("index")
-        return OrderedDict((unit["unitid"], unit) for unit in units)
+        units = OrderedDict(
+            (unit["unitid"], unit)
+            for unit in qs.values(*self.unit_fields).order_by("index")
+        )
+
+        # Content fields are only fetched for units without a stored
+        # fingerprint, as comparing the rest doesn't need them
+        missing = qs.filter(content_hash__isnull=True).values(
+            "unitid", *self.content_fields
+        )
+        for values in missing.order_by().iterator():
+            units[values["unitid"]].update(values)
+
+        return units
 
     @cached_property
     def active_uids(self):
@@ -144,6 +233,10 @@ class DBStore(object):
         """Retrieves a comparable `DBUnit` object by `id`."""
         return DBUnit(self.units[id])
 
+    def get_content_hash(self, id):
+        """Retrieves the content fingerprint of the unit identified by `id`."""
+        return self.get_unit(id).content_hash
+
     def get_updated_uids(self, since_revision):
         """Return a list of *active* unit IDs that were updated since
         `since_revision` revision.
@@ -248,8 +341,7 @@ class StoreDiff(object):
 
     @cached_property
     def opcodes(self):
-        sm = difflib.SequenceMatcher(None, self.target.active_uids, self.new_unit_list)
-        return sm.get_opcodes()
+        return get_opcodes(self.target.active_uids, self.new_unit_list)
 
     def diff(self):
         """Return a dictionary of change actions or None if there are no
@@ -331,7 +423,8 @@ class StoreDiff(object):
                     for uid in self.target.active_uids[i1:i2]
                     if (
                         uid in self.source.units
-                        and self.source.get_unit(uid) != self.target.get_unit(uid)
+                        and self.source.get_content_hash(uid)
+                        != self.target.get_content_hash(uid)
                     )
                 )
             )
@@ -463,6 +463,20 @@ class UnitSearchForm(forms.Form):
         return self.cleaned_data["include_disabled"]
 
 
+class QualityCheckToggleForm(UnitSearchForm):
+    """Selects units like `UnitSearchForm`, along with a check to mute or
+    unmute for all of them.
+    """
+
+    check = forms.ChoiceField(required=True, choices=list(check_names.items()))
+    mute = forms.BooleanField(required=False, initial=False)
+
+
+class UnitTMPrefetchForm(forms.Form):
+
+    tm_prefetch = MultipleArgsField(field=forms.IntegerField(), required=False,)
+
+
 class UnitViewRowsForm(forms.Form):
 
     uids = MultipleArgsField(field=forms.IntegerField(), required=True,)
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.5 on 2026-10-17 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_store", "0005_auto_20200124_0617"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="unit",
+            name="content_hash",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.5 on 2026-10-17 06:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_language", "0002_case_insensitive_schema"),
+        ("pootle_store", "0006_unit_content_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TMNgram",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ngram", models.IntegerField()),
+                ("length", models.PositiveIntegerField()),
+                (
+                    "language",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="pootle_language.Language",
+                    ),
+                ),
+                (
+                    "unit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="pootle_store.Unit",
+                    ),
+                ),
+            ],
+            options={"index_together": {("language", "ngram", "length", "unit")},},
+        ),
+    ]
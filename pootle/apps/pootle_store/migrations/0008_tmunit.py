@@ -0,0 +1,41 @@
+# Generated by Django 3.0.5 on 2026-10-17 08:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_language", "0002_case_insensitive_schema"),
+        ("pootle_store", "0007_tmngram"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TMUnit",
+            fields=[
+                (
+                    "unit",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="pootle_store.Unit",
+                    ),
+                ),
+                ("revision", models.IntegerField()),
+                (
+                    "language",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="pootle_language.Language",
+                    ),
+                ),
+            ],
+            options={"index_together": {("language", "revision")},},
+        ),
+    ]
@@ -21,13 +21,15 @@ from translate.storage.factory import getobject
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models
 from django.db.models import F
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
+from django_rq.queues import get_queue
+
 from pootle.core.log import (
     MUTE_QUALITYCHECK,
     STORE_ADDED,
@@ -62,6 +64,7 @@ from pootle_misc.util import import_func
 from pootle_statistics.models import Submission, SubmissionFields, SubmissionTypes
 
 from .constants import FUZZY, NEW, OBSOLETE, PARSED, TRANSLATED, UNTRANSLATED
+from .diff import get_content_hash
 from .fields import MultiStringField, TranslationStoreField
 from .managers import StoreManager, SuggestionManager, UnitManager
 from .syncer import PoStoreSyncer
@@ -71,6 +74,19 @@ from .util import SuggestionStates
 
 TM_BROKER = None
 
+#: Number of rows inserted per query when creating objects in bulk
+BULK_CREATE_BATCH_SIZE = 1000
+
+#: Redis set of IDs of units pending to be indexed in the TM server
+KEY_TM_PENDING_UNITS = "pootle:tm:pending"
+#: Flag set while a job flushing pending TM units is enqueued
+KEY_TM_FLUSH_SCHEDULED = "pootle:tm:flush_scheduled"
+#: Seconds after which the flag expires, so that a flush job which never runs
+#: doesn't keep pending units from being flushed
+TM_FLUSH_SCHEDULED_TIMEOUT = 5 * 60
+#: Number of pending units indexed in the TM server at once
+TM_FLUSH_BATCH_SIZE = 5000
+
 
 def get_tm_broker():
     global TM_BROKER
@@ -79,6 +95,101 @@ def get_tm_broker():
     return TM_BROKER
 
 
+def update_tmserver_job(unit_ids):
+    """Indexes the units with the given IDs in the TM server at once."""
+    units = Unit.simple_objects.filter(id__in=unit_ids).select_related(
+        "submitted_by",
+        "store__translation_project__project",
+        "store__translation_project__language",
+    )
+    objs_by_language = {}
+    for unit in units.iterator():
+        language = unit.store.translation_project.language.code
+        objs_by_language.setdefault(language, []).append(unit.get_tm_data())
+
+    for language, objs in objs_by_language.items():
+        get_tm_broker().update_many(language, objs)
+
+
+def buffer_tmserver_units(redis_connection, unit_ids):
+    """Adds units to the set of units pending to be indexed in the TM server.
+
+    :return: `True` if a job flushing pending units needs to be enqueued,
+        `False` if there's one enqueued already.
+    """
+    pipe = redis_connection.pipeline()
+    pipe.sadd(KEY_TM_PENDING_UNITS, *unit_ids)
+    pipe.set(KEY_TM_FLUSH_SCHEDULED, 1, nx=True, ex=TM_FLUSH_SCHEDULED_TIMEOUT)
+    return bool(pipe.execute()[1])
+
+
+def flush_tmserver_buffer_job():
+    """Indexes all units pending to be indexed in the TM server, in batches
+    of `TM_FLUSH_BATCH_SIZE` units.
+
+    Units of a batch failing to be indexed are buffered back, to be flushed
+    along with the next buffered units.
+    """
+    redis_connection = get_queue().connection
+    # Units buffered from now on need a new job, unless this one picks them up
+    redis_connection.delete(KEY_TM_FLUSH_SCHEDULED)
+    while True:
+        unit_ids = redis_connection.spop(KEY_TM_PENDING_UNITS, TM_FLUSH_BATCH_SIZE)
+        if not unit_ids:
+            break
+        try:
+            update_tmserver_job([int(unit_id) for unit_id in unit_ids])
+        except Exception:
+            redis_connection.sadd(KEY_TM_PENDING_UNITS, *unit_ids)
+            raise
+
+
+def queue_tmserver_units(unit_ids):
+    """Schedules units to be indexed in the TM server.
+
+    Units are buffered in Redis once the current transaction is committed,
+    and indexed in bulk by a background job. Units are indexed right away
+    when jobs are run synchronously.
+    """
+    queue = get_queue()
+    if not queue._is_async:
+        update_tmserver_job(unit_ids)
+        return
+
+    def _buffer_tmserver_units():
+        if buffer_tmserver_units(queue.connection, unit_ids):
+            queue.enqueue(flush_tmserver_buffer_job)
+
+    connection.on_commit(_buffer_tmserver_units)
+
+
+def prefetch_tm_suggestions_job(unit_ids):
+    """Caches TM matches for the units with the given IDs."""
+    units = Unit.simple_objects.filter(id__in=unit_ids).select_related(
+        "store__translation_project__language",
+    )
+    units_by_language = {}
+    for unit in units.iterator():
+        language = unit.store.translation_project.language.code
+        units_by_language.setdefault(language, []).append(unit)
+
+    for language, language_units in units_by_language.items():
+        get_tm_broker().prefetch(language, language_units)
+
+
+def queue_tm_suggestions_prefetch(unit_ids):
+    """Schedules TM matches for upcoming units to be looked up in the
+    background, so their TM suggestions are served from cache.
+    """
+    broker = get_tm_broker()
+    if not broker.enabled:
+        return
+
+    unit_ids = unit_ids[: broker.prefetch_units]
+    if unit_ids:
+        get_queue().enqueue(prefetch_tm_suggestions_job, unit_ids)
+
+
 # # # # # # # # Quality Check # # # # # # #
 
 
@@ -105,6 +216,97 @@ class QualityCheck(models.Model):
         unknown_checks = QualityCheck.objects.exclude(name__in=list(check_names.keys()))
         unknown_checks.delete()
 
+    @classmethod
+    def toggle_many(cls, units, name, false_positive, user):
+        """Mutes or unmutes the `name` check for all `units` at once.
+
+        This is the bulk counterpart of `Unit.toggle_qualitycheck()`: checks
+        are updated with a single query, submissions are created in bulk and
+        stats are updated once per affected store.
+
+        :param units: a `Unit` queryset.
+        :param name: name of the check to toggle.
+        :param false_positive: whether to mute (`True`) or unmute checks.
+        :param user: user to attribute the changes to.
+        :return: the number of toggled checks.
+        """
+        checks = list(
+            cls.objects.filter(
+                unit__in=units.order_by().values("id"),
+                name=name,
+                false_positive=not false_positive,
+            ).values(
+                "id",
+                "unit_id",
+                "unit__target_f",
+                "unit__store_id",
+                "unit__store__pootle_path",
+                "unit__store__translation_project_id",
+                "unit__store__translation_project__language__code",
+            )
+        )
+        if not checks:
+            return 0
+
+        cls.objects.filter(id__in=[check["id"] for check in checks]).update(
+            false_positive=false_positive
+        )
+
+        now = timezone.now()
+        # update timestamps, as saving each unit would
+        Unit.simple_objects.filter(
+            id__in=[check["unit_id"] for check in checks]
+        ).update(mtime=now)
+
+        if false_positive:
+            action = MUTE_QUALITYCHECK
+            sub_type = SubmissionTypes.MUTE_CHECK
+        else:
+            action = UNMUTE_QUALITYCHECK
+            sub_type = SubmissionTypes.UNMUTE_CHECK
+
+        # (Un)muting checks doesn't affect scores, so there are no score logs
+        # to create for these submissions
+        Submission.objects.bulk_create(
+            [
+                Submission(
+                    creation_time=now,
+                    translation_project_id=check["unit__store__translation_project_id"],
+                    submitter=user,
+                    field=SubmissionFields.NONE,
+                    unit_id=check["unit_id"],
+                    store_id=check["unit__store_id"],
+                    type=sub_type,
+                    quality_check_id=check["id"],
+                )
+                for check in checks
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+
+        for check in checks:
+            action_log(
+                user=user,
+                action=action,
+                lang=check["unit__store__translation_project__language__code"],
+                unit=check["unit_id"],
+                translation=check["unit__target_f"],
+                path=check["unit__store__pootle_path"],
+            )
+
+        stores = list(
+            Store.objects.filter(
+                id__in=set(check["unit__store_id"] for check in checks)
+            )
+        )
+        for store in stores:
+            store.mark_dirty(
+                CachedMethods.CHECKS, CachedMethods.LAST_ACTION, CachedMethods.MTIME
+            )
+        Store.update_cached_many(stores)
+
+        return len(checks)
+
 
 # # # # # # # # # Suggestion # # # # # # # #
 
@@ -228,6 +430,9 @@ class Unit(models.Model, base.TranslationUnit):
     target_wordcount = models.SmallIntegerField(default=0, editable=False)
     target_length = models.SmallIntegerField(db_index=True, default=0, editable=False)
 
+    # Fingerprint of the content compared by `StoreDiff`
+    content_hash = models.CharField(max_length=32, null=True, editable=False)
+
     developer_comment = models.TextField(null=True, blank=True)
     translator_comment = models.TextField(null=True, blank=True)
     locations = models.TextField(null=True, editable=False)
@@ -300,6 +505,13 @@ class Unit(models.Model, base.TranslationUnit):
         self.target_f = value
         self._target_updated = True
 
+    @property
+    def _checks_outdated(self):
+        """Whether any inputs of quality checks changed since the unit was
+        last saved. State or comment changes alone don't affect checks.
+        """
+        return self._source_updated or self._target_updated or self._locations_updated
+
     @cached_property
     def terminology(self):
         """Retrieves terminology suggestions."""
@@ -328,6 +540,7 @@ class Unit(models.Model, base.TranslationUnit):
         self._source_updated = False
         self._rich_target = None
         self._target_updated = False
+        self._locations_updated = False
         self._state_updated = False
         self._comment_updated = False
         self._auto_translated = False
@@ -376,6 +589,69 @@ class Unit(models.Model, base.TranslationUnit):
             self._log_user = User.objects.get_system_user()
         user = kwargs.pop("user", self._log_user)
 
+        self._prepare_save(
+            created,
+            revision=kwargs.pop("revision", None),
+            incr_revision=kwargs.pop("incr_revision", None),
+        )
+
+        if not created and hasattr(self, "_save_action"):
+            action_log(
+                user=self._log_user,
+                action=self._save_action,
+                lang=self.store.translation_project.language.code,
+                unit=self.id,
+                translation=self.target_f,
+                path=self.store.pootle_path,
+            )
+
+        super().save(*args, **kwargs)
+
+        if hasattr(self, "_save_action") and self._save_action == UNIT_ADDED:
+            # just added FUZZY unit
+            if self.state == FUZZY:
+                self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS)
+
+            action_log(
+                user=self._log_user,
+                action=self._save_action,
+                lang=self.store.translation_project.language.code,
+                unit=self.id,
+                translation=self.target_f,
+                path=self.store.pootle_path,
+            )
+
+            self.add_initial_submission(user=user)
+
+        if self._checks_outdated and not (created and self.state == UNTRANSLATED):
+            self.update_qualitychecks()
+
+        if (self._source_updated or self._target_updated) and self.istranslated():
+            self.update_tmserver()
+
+        # done processing source/target update remove flag
+        self._source_updated = False
+        self._target_updated = False
+        self._locations_updated = False
+        self._state_updated = False
+        self._comment_updated = False
+        self._auto_translated = False
+
+        # update cache only if we are updating a single unit
+        if self.store.state >= PARSED:
+            self.store.mark_dirty(CachedMethods.MTIME)
+            self.store.update_dirty_cache()
+
+    def _prepare_save(self, created, revision=None, incr_revision=None):
+        """Updates fields derived from the source, target and state before
+        saving, and marks the affected store caches as dirty.
+
+        :param created: whether the unit is about to be created.
+        :param revision: revision to set for the unit, unless it has been
+            auto-translated (in which case it needs further sync).
+        :param incr_revision: callable returning a new revision number for
+            the unit, `Revision.incr` by default.
+        """
         if created:
             self._save_action = UNIT_ADDED
             self.store.mark_dirty(
@@ -415,21 +691,10 @@ class Unit(models.Model, base.TranslationUnit):
         # a new value (the same for all units during its store updated)
         # since that change doesn't require further sync but note that
         # auto_translated units require further sync
-        revision = kwargs.pop("revision", None)
         if revision is not None and not self._auto_translated:
             self.revision = revision
         elif self._target_updated or self._state_updated or self._comment_updated:
-            self.revision = Revision.incr()
-
-        if not created and hasattr(self, "_save_action"):
-            action_log(
-                user=self._log_user,
-                action=self._save_action,
-                lang=self.store.translation_project.language.code,
-                unit=self.id,
-                translation=self.target_f,
-                path=self.store.pootle_path,
-            )
+            self.revision = (incr_revision or Revision.incr)()
 
         if (
             self._state_updated
@@ -453,41 +718,7 @@ class Unit(models.Model, base.TranslationUnit):
             self.submitted_by = None
             self.submitted_on = None
 
-        super().save(*args, **kwargs)
-
-        if hasattr(self, "_save_action") and self._save_action == UNIT_ADDED:
-            # just added FUZZY unit
-            if self.state == FUZZY:
-                self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS)
-
-            action_log(
-                user=self._log_user,
-                action=self._save_action,
-                lang=self.store.translation_project.language.code,
-                unit=self.id,
-                translation=self.target_f,
-                path=self.store.pootle_path,
-            )
-
-            self.add_initial_submission(user=user)
-
-        if self._source_updated or self._target_updated:
-            if not (created and self.state == UNTRANSLATED):
-                self.update_qualitychecks()
-            if self.istranslated():
-                self.update_tmserver()
-
-        # done processing source/target update remove flag
-        self._source_updated = False
-        self._target_updated = False
-        self._state_updated = False
-        self._comment_updated = False
-        self._auto_translated = False
-
-        # update cache only if we are updating a single unit
-        if self.store.state >= PARSED:
-            self.store.mark_dirty(CachedMethods.MTIME)
-            self.store.update_dirty_cache()
+        self.content_hash = get_content_hash(self)
 
     def get_absolute_url(self):
         return self.store.get_absolute_url()
@@ -522,18 +753,28 @@ class Unit(models.Model, base.TranslationUnit):
         user_projects = Project.accessible_by_user(user)
         return self.store.translation_project.project.code in user_projects
 
+    def get_initial_submission(self, user=None):
+        """Returns an unsaved initial submission for a newly created unit, or
+        `None` if the unit has no translation.
+        """
+        if not (self.istranslated() or self.isfuzzy()):
+            return None
+
+        return Submission(
+            creation_time=self.creation_time,
+            translation_project=self.store.translation_project,
+            submitter=user or self._log_user,
+            unit=self,
+            store=self.store,
+            type=SubmissionTypes.UNIT_CREATE,
+            field=SubmissionFields.TARGET,
+            new_value=self.target,
+        )
+
     def add_initial_submission(self, user=None):
-        if self.istranslated() or self.isfuzzy():
-            Submission.objects.create(
-                creation_time=self.creation_time,
-                translation_project=self.store.translation_project,
-                submitter=user or self._log_user,
-                unit=self,
-                store=self.store,
-                type=SubmissionTypes.UNIT_CREATE,
-                field=SubmissionFields.TARGET,
-                new_value=self.target,
-            )
+        submission = self.get_initial_submission(user=user)
+        if submission is not None:
+            submission.save()
 
     @cached_property
     def unit_syncer(self):
@@ -642,6 +883,7 @@ class Unit(models.Model, base.TranslationUnit):
         if self.locations != locations and (self.locations or locations):
             self.locations = locations or None
             changed = True
+            self._locations_updated = True
 
         context = unit.getcontext()
         if self.context != unit.getcontext() and (self.context or context):
@@ -690,22 +932,21 @@ class Unit(models.Model, base.TranslationUnit):
     def update_qualitychecks(self, keep_false_positives=False):
         """Run quality checks and store result in the database.
 
+        Changes to existing checks are calculated in memory first, and then
+        applied with (at most) one query per kind of change.
+
         :param keep_false_positives: when set to `False`, it will activate
             (unmute) any existing false positive checks.
         :return: `True` if quality checks were updated or `False` if they
             left unchanged.
         """
-        unmute_list = []
-        result = False
-
-        checks = self.qualitycheck_set.all()
+        # FIXME: avoid this
+        from pootle.core.checks.checker import UnitQualityCheck
 
-        existing = {}
-        for check in checks.values("name", "false_positive", "id"):
-            existing[check["name"]] = {
-                "false_positive": check["false_positive"],
-                "id": check["id"],
-            }
+        existing = {
+            check["name"]: check
+            for check in self.qualitycheck_set.values("name", "false_positive", "id")
+        }
 
         # no checks if unit is untranslated
         if not self.target:
@@ -716,39 +957,27 @@ class Unit(models.Model, base.TranslationUnit):
 
             return False
 
-        checker = self.store.translation_project.checker
-        qc_failures = checker.run_filters(self, categorised=True)
-        checks_to_add = []
-        for name in iter(qc_failures.keys()):
-            if name in existing:
-                # keep false-positive checks if check is active
-                if existing[name]["false_positive"] and not keep_false_positives:
-                    unmute_list.append(name)
-                del existing[name]
-                continue
-
-            message = qc_failures[name]["message"]
-            category = qc_failures[name]["category"]
-            checks_to_add.append(
-                QualityCheck(unit=self, name=name, message=message, category=category)
-            )
-            self.store.mark_dirty(CachedMethods.CHECKS)
-            result = True
-
-        if checks_to_add:
-            self.qualitycheck_set.bulk_create(checks_to_add)
+        unit_checks = UnitQualityCheck(
+            self,
+            self.store.translation_project.checker,
+            existing,
+            None,
+            keep_false_positives=keep_false_positives,
+        )
+        if not unit_checks.update():
+            return False
 
-        if not keep_false_positives and unmute_list:
-            self.qualitycheck_set.filter(name__in=unmute_list).update(
+        if unit_checks.new_checks:
+            QualityCheck.objects.bulk_create(unit_checks.new_checks)
+        if unit_checks.delete_ids:
+            QualityCheck.objects.filter(id__in=unit_checks.delete_ids).delete()
+        if unit_checks.unmute_ids:
+            QualityCheck.objects.filter(id__in=unit_checks.unmute_ids).update(
                 false_positive=False
             )
+        self.store.mark_dirty(CachedMethods.CHECKS)
 
-        # delete inactive checks
-        if existing:
-            self.store.mark_dirty(CachedMethods.CHECKS)
-            self.qualitycheck_set.filter(name__in=existing).delete()
-
-        return result or bool(unmute_list) or bool(existing)
+        return True
 
     def get_qualitychecks(self):
         return self.qualitycheck_set.all()
@@ -781,7 +1010,8 @@ class Unit(models.Model, base.TranslationUnit):
 
     # # # # # # # # # # # TranslationUnit # # # # # # # # # # # # # #
 
-    def update_tmserver(self):
+    def get_tm_data(self):
+        """Returns the unit data to be indexed by the TM server."""
         obj = {
             "id": self.id,
             # 'revision' must be an integer for statistical queries to work
@@ -809,7 +1039,10 @@ class Unit(models.Model, base.TranslationUnit):
                 }
             )
 
-        get_tm_broker().update(self.store.translation_project.language.code, obj)
+        return obj
+
+    def update_tmserver(self):
+        self.store.update_tmserver_units([self.id])
 
     def get_tm_suggestions(self):
         return get_tm_broker().search(self)
@@ -933,7 +1166,6 @@ class Unit(models.Model, base.TranslationUnit):
             self.state = UNTRANSLATED
 
         self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS)
-        self.update_qualitychecks(keep_false_positives=True)
         self._state_updated = True
         self._save_action = UNIT_RESURRECTED
         return True
@@ -1305,7 +1537,7 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                 translation="",
                 path=self.pootle_path,
             )
-        unit_query.update(state=OBSOLETE, index=0)
+        unit_query.update(state=OBSOLETE, index=0, content_hash=None)
         self.obsolete = True
         self.save()
         self.clear_cache()
@@ -1352,15 +1584,16 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
         :return: The number of units marked as obsolete.
         """
         obsoleted = 0
-        for unit in self.findid_bulk(uids_to_obsolete):
-            # Use the same (parent) object since units will
-            # accumulate the list of cache attributes to clear
-            # in the parent Store object
-            unit.store = self
-            if not unit.isobsolete():
-                unit.makeobsolete()
-                unit.save(revision=update_revision)
-                obsoleted += 1
+        with Revision.allocate(len(uids_to_obsolete)) as incr_revision:
+            for unit in self.findid_bulk(uids_to_obsolete):
+                # Use the same (parent) object since units will
+                # accumulate the list of cache attributes to clear
+                # in the parent Store object
+                unit.store = self
+                if not unit.isobsolete():
+                    unit.makeobsolete()
+                    unit.save(revision=update_revision, incr_revision=incr_revision)
+                    obsoleted += 1
 
         return obsoleted
 
@@ -1375,7 +1608,17 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
     def record_submissions(
         self, unit, old_target, old_state, current_time, user, submission_type=None
     ):
-        """Records all applicable submissions for `unit`.
+        """Records all applicable submissions for `unit`."""
+        subs_created = self.get_unit_submissions(
+            unit, old_target, old_state, current_time, user, submission_type
+        )
+        if subs_created:
+            unit.submission_set.add(*subs_created, bulk=False)
+
+    def get_unit_submissions(
+        self, unit, old_target, old_state, current_time, user, submission_type=None
+    ):
+        """Returns all applicable unsaved submissions for `unit`.
 
         EXTREME HAZARD: this relies on implicit `._<field>_updated` members
         being available in `unit`. Let's look into replacing such members with
@@ -1422,8 +1665,7 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                     new_value=create_subs[field][1],
                 )
             )
-        if subs_created:
-            unit.submission_set.add(*subs_created, bulk=False)
+        return subs_created
 
     def update(self, store, user=None, store_revision=None, submission_type=None):
         """Update DB with units from a ttk Store.
@@ -1490,6 +1732,114 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
             newunit.save(revision=update_revision, user=user)
         return newunit
 
+    def addunits(self, units, user=None, update_revision=None):
+        """Adds many units at once.
+
+        The end result is the same as calling `addunit()` for each unit, but
+        units, their initial submissions and quality checks are created with
+        bulk queries, the new translations are indexed in the TM server by a
+        single background job and store caches are updated once.
+
+        :param units: iterable of `(unit, index)` pairs.
+        :return: the list of added units.
+        """
+        User = get_user_model()
+        log_user = User.objects.get_system_user()
+
+        newunits = []
+        for unit, index in units:
+            newunit = self.UnitClass(store=self, index=index)
+            newunit.update(unit, user=user)
+            if newunit._target_updated or newunit.istranslated():
+                newunit.submitted_by = user
+                newunit.submitted_on = timezone.now()
+            newunit._log_user = log_user
+            newunit._prepare_save(created=True, revision=update_revision)
+            newunits.append(newunit)
+
+        if not newunits:
+            return newunits
+
+        self.unit_set.bulk_create(newunits, batch_size=BULK_CREATE_BATCH_SIZE)
+        # Primary keys are only set by `bulk_create()` on some DB backends
+        if any(newunit.id is None for newunit in newunits):
+            unit_ids = {}
+            for i in range(0, len(newunits), BULK_CREATE_BATCH_SIZE):
+                unitid_hashes = [
+                    newunit.unitid_hash
+                    for newunit in newunits[i : i + BULK_CREATE_BATCH_SIZE]
+                ]
+                unit_ids.update(
+                    self.unit_set.filter(unitid_hash__in=unitid_hashes).values_list(
+                        "unitid_hash", "id"
+                    )
+                )
+            for newunit in newunits:
+                newunit.id = unit_ids[newunit.unitid_hash]
+
+        checker = self.translation_project.checker
+        submissions = []
+        checks = []
+        tm_unit_ids = []
+        for newunit in newunits:
+            if newunit.state == FUZZY:
+                self.mark_dirty(CachedMethods.WORDCOUNT_STATS)
+
+            action_log(
+                user=log_user,
+                action=UNIT_ADDED,
+                lang=self.translation_project.language.code,
+                unit=newunit.id,
+                translation=newunit.target_f,
+                path=self.pootle_path,
+            )
+
+            submission = newunit.get_initial_submission(user=user)
+            if submission is not None:
+                submissions.append(submission)
+
+            if newunit.state != UNTRANSLATED and newunit.target:
+                qc_failures = checker.run_filters(newunit, categorised=True)
+                for name, failure in qc_failures.items():
+                    checks.append(
+                        QualityCheck(
+                            unit=newunit,
+                            name=name,
+                            message=failure["message"],
+                            category=failure["category"],
+                        )
+                    )
+
+            if newunit.istranslated():
+                tm_unit_ids.append(newunit.id)
+
+            newunit._source_updated = False
+            newunit._target_updated = False
+            newunit._locations_updated = False
+            newunit._state_updated = False
+            newunit._comment_updated = False
+            newunit._auto_translated = False
+
+        Submission.objects.bulk_create(submissions, batch_size=BULK_CREATE_BATCH_SIZE)
+        if checks:
+            QualityCheck.objects.bulk_create(checks, batch_size=BULK_CREATE_BATCH_SIZE)
+            self.mark_dirty(CachedMethods.CHECKS)
+
+        self.update_tmserver_units(tm_unit_ids)
+
+        if self.state >= PARSED:
+            self.mark_dirty(CachedMethods.MTIME)
+            self.update_dirty_cache()
+
+        return newunits
+
+    def update_tmserver_units(self, unit_ids):
+        """Indexes units with the given IDs in the TM server in the
+        background.
+        """
+        if unit_ids and get_tm_broker().enabled:
+            queue_tmserver_units(unit_ids)
+
     def findunits(self, source, obsolete=False):
         if not obsolete and hasattr(self, "sourceindex"):
             return super().findunits(source)
@@ -1631,7 +1981,75 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
         """
         return super().all_pootle_paths()
 
+    @classmethod
+    def calc_cached_many(cls, stores, names):
+        from .stats import get_stores_stats
+
+        stores_stats = get_stores_stats(
+            Store.objects.filter(id__in=[store.id for store in stores]), names
+        )
+        return {store.cache_key: stores_stats[store.id] for store in stores}
+
+    def get_stats_delta_paths(self):
+        paths = self.all_pootle_paths()[1:]
+        if self.translation_project.disabled:
+            # Stores from disabled projects don't count towards project stats
+            project_path = self.translation_project.project.pootle_path
+            paths = [path for path in paths if path != project_path]
+
+        return paths
+
     # # # /TreeItem
 
 
 # # # # # # # # # # # # # # # #  Translation # # # # # # # # # # # # # # #
+
+
+# # # # # # # # # # # # # # # # # # TM index # # # # # # # # # # # # # # # # #
+
+
+class TMNgram(models.Model):
+    """A source text n-gram of a unit indexed in the embedded TM.
+
+    Rows make up an inverted index from n-grams to the units having them,
+    which `pootle.core.search.backends.embedded.EmbeddedTMBackend` looks up.
+    """
+
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name="+")
+    language = models.ForeignKey(
+        "pootle_language.Language",
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+",
+    )
+    #: Hash of the n-gram
+    ngram = models.IntegerField()
+    #: Length of the unit's source text, to filter out units too short or too
+    #: long to be similar enough
+    length = models.PositiveIntegerField()
+
+    class Meta:
+        index_together = [["language", "ngram", "length", "unit"]]
+
+
+class TMUnit(models.Model):
+    """A unit indexed in the embedded TM, along with the revision it was
+    indexed at.
+
+    Incremental TM updates resume from the latest indexed revision, which
+    later changes to units not reindexed in the TM don't affect.
+    """
+
+    unit = models.OneToOneField(
+        Unit, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    language = models.ForeignKey(
+        "pootle_language.Language",
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+",
+    )
+    revision = models.IntegerField()
+
+    class Meta:
+        index_together = [["language", "revision"]]
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Bulk calculation of cached stats for many stores at once."""
+
+from translate.filters.decorators import Category
+
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+
+from pootle.core.mixins import CachedMethods, CachedTreeItem
+from pootle.core.utils import dateformat
+from pootle.core.utils.timezone import datetime_min
+from pootle_statistics.models import Submission, SubmissionTypes
+
+from .constants import FUZZY, OBSOLETE, TRANSLATED, UNTRANSLATED
+from .models import QualityCheck, Store, Suggestion, Unit
+from .util import SuggestionStates
+
+
+def get_stores_stats(stores, names=None):
+    """Calculates cached stats for `stores` with grouped queries.
+
+    The values match the ones calculated by `Store._get_*()` methods, but
+    rather than running a query per store and stat, at most one query per
+    stat is run for all stores (typically those of a translation project).
+
+    :param stores: a `Store` queryset.
+    :param names: cached method names to calculate stats for. Defaults to
+        all of them.
+    :return: a dictionary of `{store_id: {cached_method_name: value}}`.
+    """
+    if names is None:
+        names = CachedMethods.get_all()
+    names = set(str(name) for name in names)
+
+    store_ids = list(stores.values_list("id", flat=True))
+    defaults = {
+        str(CachedMethods.WORDCOUNT_STATS): lambda: {
+            "total": 0,
+            "translated": 0,
+            "fuzzy": 0,
+        },
+        str(CachedMethods.CHECKS): lambda: {
+            "unit_critical_error_count": 0,
+            "checks": {},
+        },
+        str(CachedMethods.SUGGESTIONS): lambda: 0,
+        str(CachedMethods.MTIME): lambda: datetime_min,
+        str(CachedMethods.LAST_UPDATED): CachedTreeItem._get_last_updated,
+        str(CachedMethods.LAST_ACTION): CachedTreeItem._get_last_action,
+    }
+    result = {
+        store_id: {name: defaults[name]() for name in names} for store_id in store_ids
+    }
+    if not store_ids:
+        return result
+
+    units = Unit.objects.filter(store__in=store_ids).order_by()
+
+    if str(CachedMethods.WORDCOUNT_STATS) in names:
+        wordcounts = (
+            units.filter(state__gt=OBSOLETE)
+            .values("store_id", "state")
+            .annotate(wordcount=Sum("source_wordcount"))
+        )
+        for item in wordcounts:
+            wordcount_stats = result[item["store_id"]][
+                str(CachedMethods.WORDCOUNT_STATS)
+            ]
+            wordcount_stats["total"] += item["wordcount"]
+            if item["state"] == TRANSLATED:
+                wordcount_stats["translated"] = item["wordcount"]
+            elif item["state"] == FUZZY:
+                wordcount_stats["fuzzy"] = item["wordcount"]
+
+    if names & {str(CachedMethods.MTIME), str(CachedMethods.LAST_UPDATED)}:
+        times = units.values("store_id").annotate(
+            mtime=Max("mtime"), creation_time=Max("creation_time")
+        )
+        for item in times:
+            store_stats = result[item["store_id"]]
+            if str(CachedMethods.MTIME) in names and item["mtime"] is not None:
+                store_stats[str(CachedMethods.MTIME)] = item["mtime"]
+            if (
+                str(CachedMethods.LAST_UPDATED) in names
+                and item["creation_time"] is not None
+            ):
+                store_stats[str(CachedMethods.LAST_UPDATED)] = int(
+                    dateformat.format(item["creation_time"], "U")
+                )
+
+    if str(CachedMethods.CHECKS) in names:
+        checks = (
+            QualityCheck.objects.filter(
+                unit__store__in=store_ids,
+                unit__state__gt=UNTRANSLATED,
+                false_positive=False,
+            )
+            .values("unit__store_id", "unit", "name", "category")
+            .order_by("unit", "-category")
+        )
+        saved_unit = None
+        for item in checks.iterator():
+            store_checks = result[item["unit__store_id"]][str(CachedMethods.CHECKS)]
+            if item["unit"] != saved_unit:
+                saved_unit = item["unit"]
+                if item["category"] == Category.CRITICAL:
+                    store_checks["unit_critical_error_count"] += 1
+            store_checks["checks"][item["name"]] = (
+                store_checks["checks"].get(item["name"], 0) + 1
+            )
+
+    if str(CachedMethods.SUGGESTIONS) in names:
+        suggestions = (
+            Suggestion.objects.filter(
+                unit__store__in=store_ids,
+                unit__state__gt=OBSOLETE,
+                state=SuggestionStates.PENDING,
+            )
+            .values("unit__store_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for item in suggestions:
+            result[item["unit__store_id"]][str(CachedMethods.SUGGESTIONS)] = item[
+                "count"
+            ]
+
+    if str(CachedMethods.LAST_ACTION) in names:
+        last_submissions = (
+            Submission.simple_objects.filter(store=OuterRef("pk"))
+            .exclude(type=SubmissionTypes.UNIT_CREATE)
+            .order_by("-creation_time", "-pk")
+            .values("pk")[:1]
+        )
+        last_submission_ids = (
+            Store.objects.filter(id__in=store_ids)
+            .annotate(last_submission=Subquery(last_submissions))
+            .filter(last_submission__isnull=False)
+            .values_list("last_submission", flat=True)
+        )
+        submissions = Submission.simple_objects.filter(
+            id__in=list(last_submission_ids)
+        ).select_related("unit", "quality_check", "suggestion__reviewer", "submitter")
+        for submission in submissions.iterator():
+            result[submission.store_id][
+                str(CachedMethods.LAST_ACTION)
+            ] = submission.get_submission_info()
+
+    return result
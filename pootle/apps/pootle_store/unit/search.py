@@ -12,7 +12,8 @@ from django.utils.functional import cached_property
 
 from pootle_store.constants import SIMPLY_SORTED
 from pootle_store.models import Unit
-from pootle_store.unit.filters import UnitSearchFilter, UnitTextSearch
+from pootle_store.unit.filters import UnitSearchFilter
+from pootle_store.unit.textsearch import get_text_search_backend
 
 
 MAX_RESULTS = 500
@@ -124,7 +125,8 @@ class DBSearchBackend(object):
                 ).distinct()
 
         if sfields and search:
-            qs = UnitTextSearch(qs).search(search, sfields, exact=exact)
+            text_search = get_text_search_backend()
+            qs = text_search(qs).search(search, sfields, exact=exact)
         return qs
 
     @cached_property
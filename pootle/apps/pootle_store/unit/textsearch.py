@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Backends for searching text in units.
+
+The backend in use is set via the `ZING_TEXT_SEARCH_BACKEND` setting. Backends
+relying on a full-text index need it to be created first by running the
+`text_search_index` command.
+"""
+
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+
+from pootle_misc.util import import_func
+
+from .filters import UnitTextSearch
+
+
+DEFAULT_TEXT_SEARCH_BACKEND = "pootle_store.unit.filters.UnitTextSearch"
+
+
+def get_text_search_backend():
+    """Returns the configured unit text search class."""
+    path = getattr(settings, "ZING_TEXT_SEARCH_BACKEND", DEFAULT_TEXT_SEARCH_BACKEND)
+    return import_func(path)
+
+
+class IndexedUnitTextSearch(UnitTextSearch):
+    """Base class for text searches narrowing down units via an index.
+
+    Units matched by the index are a superset of the actual results, which
+    are then filtered with the same lookups as `UnitTextSearch`, so results
+    are the same regardless of the backend in use. Indexes are maintained by
+    the database itself, hence kept in sync with any unit update, including
+    bulk ones.
+    """
+
+    #: Database vendor the index is implemented for
+    vendor = None
+
+    #: Shortest word the index can look up. Searches including shorter words
+    #: fall back to a plain `UnitTextSearch`.
+    min_word_length = 1
+
+    @classmethod
+    def create_index(cls, connection):
+        """Creates the index and populates it with existing units."""
+        raise NotImplementedError
+
+    @classmethod
+    def drop_index(cls, connection):
+        raise NotImplementedError
+
+    def get_candidates_sql(self, words, fields):
+        """Returns a `(sql, params)` query selecting the IDs of units having
+        all `words` in any of `fields`, according to the index.
+        """
+        raise NotImplementedError
+
+    def can_search(self, words):
+        return all(len(word) >= self.min_word_length for word in words)
+
+    def search(self, text, sfields, exact=False):
+        qs = self.qs
+        words = self.get_words(text, exact)
+        fields = sorted(self.get_search_fields(sfields))
+        if words and fields and self.can_search(words):
+            qs = qs.filter(id__in=RawSQL(*self.get_candidates_sql(words, fields)))
+
+        return UnitTextSearch(qs).search(text, sfields, exact=exact)
+
+
+class SQLiteUnitTextSearch(IndexedUnitTextSearch):
+    """Searches units via an FTS5 table using the trigram tokenizer.
+
+    The table is kept in sync with units via triggers. It requires SQLite
+    3.34 or later.
+    """
+
+    vendor = "sqlite"
+    min_word_length = 3
+    table_name = "pootle_store_unit_fts"
+
+    @classmethod
+    def create_index(cls, connection):
+        table = cls.table_name
+        fields = ", ".join(cls.search_fields)
+        new_values = ", ".join("new.%s" % field for field in cls.search_fields)
+        old_values = ", ".join("old.%s" % field for field in cls.search_fields)
+        insert_new = "INSERT INTO %s(rowid, %s) VALUES (new.id, %s);" % (
+            table,
+            fields,
+            new_values,
+        )
+        delete_old = "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.id, %s);" % (
+            table,
+            table,
+            fields,
+            old_values,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE %s USING fts5(%s, content='pootle_store_unit', "
+                "content_rowid='id', tokenize='trigram')" % (table, fields)
+            )
+            cursor.execute(
+                "CREATE TRIGGER %s_ai AFTER INSERT ON pootle_store_unit "
+                "BEGIN %s END" % (table, insert_new)
+            )
+            cursor.execute(
+                "CREATE TRIGGER %s_ad AFTER DELETE ON pootle_store_unit "
+                "BEGIN %s END" % (table, delete_old)
+            )
+            cursor.execute(
+                "CREATE TRIGGER %s_au AFTER UPDATE OF %s ON pootle_store_unit "
+                "BEGIN %s %s END" % (table, fields, delete_old, insert_new)
+            )
+            cursor.execute("INSERT INTO %s(%s) VALUES ('rebuild')" % (table, table))
+
+    @classmethod
+    def drop_index(cls, connection):
+        with connection.cursor() as cursor:
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(
+                    "DROP TRIGGER IF EXISTS %s_%s" % (cls.table_name, suffix)
+                )
+            cursor.execute("DROP TABLE IF EXISTS %s" % cls.table_name)
+
+    @staticmethod
+    def quote(word):
+        return '"%s"' % word.replace('"', '""')
+
+    def get_candidates_sql(self, words, fields):
+        query = " OR ".join(
+            "(%s)"
+            % " AND ".join("{%s} : %s" % (field, self.quote(word)) for word in words)
+            for field in fields
+        )
+        sql = "SELECT rowid FROM %s WHERE %s MATCH %%s" % (
+            self.table_name,
+            self.table_name,
+        )
+        return sql, [query]
+
+
+class MySQLUnitTextSearch(IndexedUnitTextSearch):
+    """Searches units via InnoDB FULLTEXT indexes using the ngram parser.
+
+    Words shorter than the server's `ngram_token_size` (2 by default) can't
+    be looked up in the indexes. Stopwords should be disabled via
+    `innodb_ft_enable_stopword` before creating the indexes.
+    """
+
+    vendor = "mysql"
+    min_word_length = 2
+    index_prefix = "pootle_store_unit_fts_"
+
+    @classmethod
+    def create_index(cls, connection):
+        with connection.cursor() as cursor:
+            for field in cls.search_fields:
+                cursor.execute(
+                    "ALTER TABLE pootle_store_unit ADD FULLTEXT INDEX %s%s (%s) "
+                    "WITH PARSER ngram" % (cls.index_prefix, field, field)
+                )
+
+    @classmethod
+    def drop_index(cls, connection):
+        with connection.cursor() as cursor:
+            for field in cls.search_fields:
+                cursor.execute(
+                    "ALTER TABLE pootle_store_unit DROP INDEX %s%s"
+                    % (cls.index_prefix, field)
+                )
+
+    def can_search(self, words):
+        # Double quotes can't be escaped within boolean mode phrases
+        return super().can_search(words) and not any('"' in word for word in words)
+
+    def get_candidates_sql(self, words, fields):
+        query = " ".join('+"%s"' % word for word in words)
+        sql = " UNION ".join(
+            "SELECT id FROM pootle_store_unit "
+            "WHERE MATCH(%s) AGAINST (%%s IN BOOLEAN MODE)" % field
+            for field in fields
+        )
+        return sql, [query] * len(fields)
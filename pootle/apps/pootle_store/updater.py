@@ -8,19 +8,54 @@
 # AUTHORS file for copyright and authorship information.
 
 import logging
+from functools import partial
 
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.utils.functional import cached_property
 
-from pootle.core.log import log
+from pootle.core.log import action_log, log
+from pootle.core.mixins import CachedMethods
 from pootle.core.models import Revision
+from pootle_statistics.models import ScoreLog, Submission
 
 from .constants import OBSOLETE, PARSED
 from .diff import StoreDiff
 from .util import get_change_str
 
 
+#: Number of updated units saved to the DB at once
+UNIT_UPDATE_BATCH_SIZE = 500
+
+#: Unit fields which can change when updating units
+UNIT_UPDATE_FIELDS = [
+    "index",
+    "unitid",
+    "unitid_hash",
+    "source_f",
+    "source_hash",
+    "source_wordcount",
+    "source_length",
+    "target_f",
+    "target_wordcount",
+    "target_length",
+    "content_hash",
+    "developer_comment",
+    "translator_comment",
+    "locations",
+    "context",
+    "state",
+    "revision",
+    "mtime",
+    "submitted_by",
+    "submitted_on",
+    "commented_by",
+    "commented_on",
+    "reviewed_by",
+    "reviewed_on",
+]
+
+
 class StoreUpdate(object):
     """Wraps either a db or file store with instructions for updating
     a target db store
@@ -163,13 +198,9 @@ class UnitUpdater(object):
     def create_suggestion(self):
         return bool(self.unit.add_suggestion(self.newunit.target, self.update.user)[1])
 
-    def save_unit(self):
-        """Saves the updated unit to the DB.
-
-        The method takes care of recording submissions as well as setting
-        values for denormalized fields.
-        """
-        self.unit.store.record_submissions(
+    def get_submissions(self):
+        """Returns the unsaved submissions to record for the updated unit."""
+        return self.unit.store.get_unit_submissions(
             self.unit,
             self.original.target,
             self.original.state,
@@ -178,6 +209,8 @@ class UnitUpdater(object):
             self.update.submission_type,
         )
 
+    def update_submitter_fields(self):
+        """Sets values for the denormalized submitter fields of the unit."""
         if self.translator_comment_updated:
             self.unit.commented_by = self.update.user
             self.unit.commented_on = self.at
@@ -188,21 +221,32 @@ class UnitUpdater(object):
             self.unit.reviewed_on = None
             self.unit.reviewed_by = None
 
-        self.unit.save(revision=self.update.update_revision)
+    def save_unit(self):
+        """Saves the updated unit to the DB.
 
-    def update_unit(self):
-        """Updates the current `self.unit` in the DB.
+        The method takes care of recording submissions as well as setting
+        values for denormalized fields.
+        """
+        self.unit.store.record_submissions(
+            self.unit,
+            self.original.target,
+            self.original.state,
+            self.at,
+            self.update.user,
+            self.update.submission_type,
+        )
+        self.update_submitter_fields()
+        self.unit.save(revision=self.update.update_revision)
 
-        This method serves as a layer above the unit-level update logic to
-        enhance it with conflict resolution.
+    def merge_unit(self):
+        """Merges changes from the source unit into `self.unit`, without
+        saving them to the DB.
 
-        :return: (updated, suggested, unsynced) a tuple of booleans:
-            updated: whether an update to the unit was performed and saved .
-            suggested: whether a suggestion was added due to conflicts.
+        :return: (updated, unsynced) a tuple of booleans:
+            updated: whether the unit was updated and needs to be saved.
             unsynced: whether an obsolete unit was resurrected because it
                 contained unsynced changes.
         """
-        suggested = False
         updated = False
         unsynced = False
 
@@ -216,6 +260,23 @@ class UnitUpdater(object):
             self.unit.index = self.update.get_index(self.uid)
             updated = True
 
+        return updated, unsynced
+
+    def update_unit(self):
+        """Updates the current `self.unit` in the DB.
+
+        This method serves as a layer above the unit-level update logic to
+        enhance it with conflict resolution.
+
+        :return: (updated, suggested, unsynced) a tuple of booleans:
+            updated: whether an update to the unit was performed and saved .
+            suggested: whether a suggestion was added due to conflicts.
+            unsynced: whether an obsolete unit was resurrected because it
+                contained unsynced changes.
+        """
+        suggested = False
+        updated, unsynced = self.merge_unit()
+
         if updated:
             self.save_unit()
 
@@ -302,10 +363,9 @@ class StoreUpdater(object):
             self.target_store.update_index(start=start, delta=delta)
 
         # Add new units
-        for unit, new_unit_index in to_change["add"]:
-            self.target_store.addunit(
-                unit, new_unit_index, user=user, update_revision=update_revision,
-            )
+        self.target_store.addunits(
+            to_change["add"], user=user, update_revision=update_revision
+        )
         changes["added"] = len(to_change["add"])
 
         # Obsolete units
@@ -393,6 +453,10 @@ class StoreUpdater(object):
         These were previously calculated via a diff retrieved from
         `StoreDiff().diff()`.
 
+        Units are merged in memory and saved in batches of
+        `UNIT_UPDATE_BATCH_SIZE` units via `save_units()`. Suggestions for
+        conflicting units are added once all units have been saved.
+
         :param update: the update configuration, an instance of `StoreUpdate`.
         :return: tuple of (update_count, suggestion_count, unsynced_uids):
             update_count: the amount of updates performed.
@@ -404,13 +468,136 @@ class StoreUpdater(object):
         suggestion_count = 0
         unsynced_uids = []
 
+        to_save = []
+        to_suggest = []
         for unit in self.units(update.uids):
-            updated, suggested, unsynced = UnitUpdater(unit, update).update_unit()
+            unit_updater = UnitUpdater(unit, update)
+            updated, unsynced = unit_updater.merge_unit()
             if updated:
                 update_count += 1
-            if suggested:
-                suggestion_count += 1
+                to_save.append(unit_updater)
             if unsynced:
                 unsynced_uids.append(unit.id)
+            if unit_updater.should_create_suggestion:
+                to_suggest.append(unit_updater)
+
+            if len(to_save) >= UNIT_UPDATE_BATCH_SIZE:
+                self.save_units(to_save)
+                to_save = []
+
+        self.save_units(to_save)
+
+        for unit_updater in to_suggest:
+            if unit_updater.create_suggestion():
+                suggestion_count += 1
 
         return update_count, suggestion_count, unsynced_uids
+
+    def save_units(self, unit_updaters):
+        """Saves units merged by `unit_updaters` to the DB at once.
+
+        The result is the same as calling `UnitUpdater.save_unit()` for each
+        of them, but units are saved with a bulk update, submissions and
+        score logs are bulk created, and new revisions are allocated as a
+        single block.
+
+        :param unit_updaters: list of `UnitUpdater` instances sharing the
+            same `StoreUpdate` configuration.
+        """
+        if not unit_updaters:
+            return
+
+        update = unit_updaters[0].update
+        at = timezone.now()
+        User = get_user_model()
+        system_user = User.objects.get_system_user()
+
+        units = []
+        submissions = []
+        scorelogs = []
+        units_to_incr = []
+        for unit_updater in unit_updaters:
+            unit = unit_updater.unit
+            unit_updater.at = at
+
+            # Score logs are calculated before the unit's fields change, as
+            # they would be when recording submissions for a single unit
+            unit_submissions = unit_updater.get_submissions()
+            for submission in unit_submissions:
+                for scorelog in submission.get_new_scorelogs():
+                    scorelog.calculate_score()
+                    scorelogs.append(scorelog)
+            submissions.extend(unit_submissions)
+
+            unit_updater.update_submitter_fields()
+            if not hasattr(unit, "_log_user"):
+                unit._log_user = system_user
+            unit._prepare_save(
+                created=False,
+                revision=update.update_revision,
+                incr_revision=partial(units_to_incr.append, unit),
+            )
+            unit.mtime = at
+            units.append(unit)
+
+        if units_to_incr:
+            revisions = Revision.reserve(len(units_to_incr))
+            for revision, unit in zip(revisions, units_to_incr):
+                unit.revision = revision
+
+        self.target_store.UnitClass.objects.bulk_update(units, UNIT_UPDATE_FIELDS)
+
+        Submission.objects.bulk_create(submissions)
+        # Primary keys are only set by `bulk_create()` on some DB backends
+        if any(submission.id is None for submission in submissions):
+            submission_ids = {}
+            for i in range(0, len(units), UNIT_UPDATE_BATCH_SIZE):
+                submissions_qs = Submission.objects.filter(
+                    unit__in=[
+                        unit.id for unit in units[i : i + UNIT_UPDATE_BATCH_SIZE]
+                    ],
+                    creation_time=at,
+                )
+                for values in submissions_qs.values_list(
+                    "unit_id", "field", "type", "id"
+                ):
+                    submission_ids[values[:3]] = values[3]
+            for submission in submissions:
+                submission.id = submission_ids[
+                    (submission.unit_id, submission.field, submission.type)
+                ]
+
+        for scorelog in scorelogs:
+            # Refresh the foreign key now that the submission has an ID
+            scorelog.submission = scorelog.submission
+        ScoreLog.bulk_save(scorelogs)
+
+        tm_unit_ids = []
+        for unit in units:
+            if hasattr(unit, "_save_action"):
+                action_log(
+                    user=unit._log_user,
+                    action=unit._save_action,
+                    lang=self.target_store.translation_project.language.code,
+                    unit=unit.id,
+                    translation=unit.target_f,
+                    path=self.target_store.pootle_path,
+                )
+
+            if unit._checks_outdated:
+                unit.update_qualitychecks()
+            if (unit._source_updated or unit._target_updated) and unit.istranslated():
+                tm_unit_ids.append(unit.id)
+
+            unit._source_updated = False
+            unit._target_updated = False
+            unit._locations_updated = False
+            unit._state_updated = False
+            unit._comment_updated = False
+            unit._auto_translated = False
+
+        self.target_store.update_tmserver_units(tm_unit_ids)
+
+        if self.target_store.state >= PARSED:
+            self.target_store.mark_dirty(CachedMethods.MTIME)
+            self.target_store.update_dirty_cache()
@@ -66,6 +66,11 @@ urlpatterns = [
         views.manage_suggestion,
         name="pootle-xhr-units-suggest-manage",
     ),
+    url(
+        r"^xhr/checks/toggle/?$",
+        views.toggle_qualitychecks,
+        name="pootle-xhr-checks-toggle",
+    ),
     url(
         r"^xhr/units/(?P<uid>[0-9]+)/checks/(?P<check_id>[0-9]+)/toggle/?$",
         views.toggle_qualitycheck,
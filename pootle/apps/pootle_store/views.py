@@ -36,16 +36,19 @@ from pootle_misc.checks import get_qc_data_by_name
 from pootle_misc.util import ajax_required
 from pootle_project.views import ProjectBrowseView, ProjectsBrowseView
 from pootle_statistics.models import Submission, SubmissionFields, SubmissionTypes
+from pootle_translationproject.models import TranslationProject
 from pootle_translationproject.views import TPBrowseStoreView, TPBrowseView
 
 from .decorators import get_unit_context
 from .forms import (
+    QualityCheckToggleForm,
     UnitSearchForm,
+    UnitTMPrefetchForm,
     UnitViewRowsForm,
     unit_comment_form_factory,
     unit_form_factory,
 )
-from .models import Unit
+from .models import QualityCheck, Unit, queue_tm_suggestions_prefetch
 from .unit.results import CtxRowResults, ViewRowResults
 from .unit.search import DBSearchBackend
 from .unit.timeline import Timeline
@@ -465,8 +468,14 @@ class UnitEditJSON(PootleUnitJSON):
             "has_plurals": self.object.hasplural(),
         }
 
+    def prefetch_tm_suggestions(self):
+        """Schedules TM lookups for the units the editor will show next."""
+        form = UnitTMPrefetchForm(self.request.GET)
+        if form.is_valid():
+            queue_tm_suggestions_prefetch(form.cleaned_data["tm_prefetch"])
+
     def get_response_data(self, context):
-        return {
+        data = {
             "editor": self.render_edit_template(context),
             "tm_suggestions": self.object.get_tm_suggestions()[:MAX_TM_RESULTS],
             "is_obsolete": self.object.isobsolete(),
@@ -474,6 +483,8 @@ class UnitEditJSON(PootleUnitJSON):
             "target": self.object.target_f.strings,
             "isfuzzy": self.object.isfuzzy(),
         }
+        self.prefetch_tm_suggestions()
+        return data
 
 
 @get_unit_context("view")
@@ -730,3 +741,36 @@ def toggle_qualitycheck(request, unit, check_id):
         raise Http404
 
     return JsonResponse({})
+
+
+@ajax_required
+@require_http_methods(["POST"])
+def toggle_qualitychecks(request):
+    """Mutes or unmutes a quality check for all units matching the search
+    criteria, which are the same as in `get_uids`.
+
+    :return: An object in JSON notation with the number of toggled checks.
+    """
+    request_params = request.POST.copy()
+    request_params["include_disabled"] = "all" in request.POST
+    form = QualityCheckToggleForm(request_params, user=request.user)
+
+    if not form.is_valid():
+        raise Http400(forms.ValidationError(form.errors).messages)
+
+    search_backend = DBSearchBackend(request.user, **form.cleaned_data)
+    units = search_backend.filter_qs(search_backend.units_qs)
+
+    # Reviewing rights are needed in all affected translation projects
+    tps = TranslationProject.objects.filter(
+        id__in=units.order_by().values("store__translation_project_id")
+    ).select_related("directory")
+    for tp in tps:
+        if not check_user_permission(request.user, "review", tp.directory):
+            raise PermissionDenied(_("Insufficient rights to access review mode."))
+
+    count = QualityCheck.toggle_many(
+        units, form.cleaned_data["check"], form.cleaned_data["mute"], request.user
+    )
+
+    return JsonResponse({"count": count})
@@ -18,6 +18,7 @@ from django.utils.functional import cached_property
 
 from pootle.core.constants import PARSE_POOL_CULL_FREQUENCY, PARSE_POOL_SIZE
 from pootle.core.mixins import CachedMethods, CachedTreeItem
+from pootle.core.stats import get_stats_backend
 from pootle.core.url_helpers import get_editor_filter, split_pootle_path
 from pootle_app.models.directory import Directory
 from pootle_app.project_tree import (
@@ -30,6 +31,7 @@ from pootle_misc.checks import excluded_filters
 from pootle_project.models import Project
 from pootle_store.constants import PARSED
 from pootle_store.models import Store
+from pootle_store.stats import get_stores_stats
 from pootle_store.util import absolute_real_path, relative_real_path
 
 
@@ -314,12 +316,20 @@ class TranslationProject(models.Model, CachedTreeItem):
         self.scan_files()
 
         stores = self.stores.live().select_related("parent").exclude(file="")
-        # Update store content from disk store
+        # Update store content from disk store, and the stats of all
+        # changed stores at once afterwards
+        updated_stores = []
         for store in stores.iterator():
+            store.defer_cache_update = True
             changed = (
                 store.updater.update_from_disk(force=force, overwrite=overwrite)
                 or changed
             )
+            store.defer_cache_update = False
+            if store._dirty_cache:
+                updated_stores.append(store)
+
+        Store.update_cached_many(updated_stores)
 
         # If this TP has no stores, cache should be updated forcibly.
         if not changed and stores.count() == 0:
@@ -345,6 +355,57 @@ class TranslationProject(models.Model, CachedTreeItem):
     def get_parent(self):
         return self.project
 
+    def refresh_stats_bulk(self):
+        """Recalculates stats for all live stores and directories of this
+        translation project, and for the translation project itself.
+
+        Store stats are calculated with a few grouped queries, then rolled up
+        the directory tree in memory and stored in a single batch.
+        """
+        stores = list(self.stores.live())
+        stores_stats = get_stores_stats(self.stores.live())
+        directories = {
+            directory.id: directory
+            for directory in Directory.objects.live().filter(
+                pootle_path__startswith=self.pootle_path
+            )
+        }
+
+        children = {directory_id: [] for directory_id in directories}
+        for store in stores:
+            store._prefetched_stats = stores_stats[store.id]
+            if store.parent_id in children:
+                children[store.parent_id].append(store)
+        for directory in directories.values():
+            if directory.parent_id in children and directory.id != self.directory_id:
+                children[directory.parent_id].append(directory)
+
+        # Children need to be calculated before their parents
+        items = sorted(
+            directories.values(),
+            key=lambda directory: directory.pootle_path.count("/"),
+            reverse=True,
+        )
+        self._children = children[self.directory_id]
+        items.append(self)
+
+        try:
+            for item in items:
+                if item is not self:
+                    item._children = children[item.id]
+                item.initialized = True
+                item._prefetched_stats = {
+                    name: item.calc_cached(name) for name in CachedMethods.get_all()
+                }
+
+            get_stats_backend().set_many_paths(
+                {item.cache_key: item._prefetched_stats for item in stores + items}
+            )
+        finally:
+            for item in stores + items:
+                item._prefetched_stats = None
+                item.initialized = False
+
     # # # /TreeItem
 
     def directory_exists_on_disk(self):
@@ -188,7 +188,9 @@ def check_settings(app_configs=None, **kwargs):
         )
 
     if settings.ZING_TM_SERVER:
-        if "HOST" not in settings.ZING_TM_SERVER:
+        # Other engines than the default one may not need a server
+        needs_server = "ENGINE" not in settings.ZING_TM_SERVER
+        if needs_server and "HOST" not in settings.ZING_TM_SERVER:
             errors.append(
                 checks.Critical(
                     _("ZING_TM_SERVER has no HOST."),
@@ -197,7 +199,7 @@ def check_settings(app_configs=None, **kwargs):
                 )
             )
 
-        if "PORT" not in settings.ZING_TM_SERVER:
+        if needs_server and "PORT" not in settings.ZING_TM_SERVER:
             errors.append(
                 checks.Critical(
                     _("ZING_TM_SERVER has no PORT."),
@@ -9,11 +9,15 @@
 import logging
 import time
 from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 
+from django.db.models import Count
 from django.utils import timezone
 from django.utils.functional import cached_property
 
 from pootle.core.mixins.treeitem import CachedMethods
+from pootle.core.utils.workers import get_worker_state, run_in_workers
 from pootle_misc.checks import run_given_filters
 from pootle_store.constants import OBSOLETE
 from pootle_store.models import QualityCheck, Store, Unit
@@ -23,6 +27,26 @@ from pootle_translationproject.models import TranslationProject
 
 logger = logging.getLogger(__name__)
 
+#: Number of stores whose caches are expired at once
+STORE_CACHE_EXPIRY_BATCH_SIZE = 100
+
+#: Number of updated units whose check changes are applied at once
+CHECK_UPDATE_CHUNK_SIZE = 1000
+
+#: Approximate number of units per store range processed by a worker process
+UNITS_PER_STORE_RANGE = 50000
+
+
+class FailedStoreRangesError(Exception):
+    """Updating checks failed for some ranges of stores."""
+
+    def __init__(self, store_ranges):
+        self.store_ranges = store_ranges
+        super().__init__(
+            "Failed to update checks in stores: %s"
+            % ", ".join("%d-%d" % store_range for store_range in store_ranges)
+        )
+
 
 class CheckableUnit(UnitProxy):
     """CheckableUnit wraps a `Unit` values dictionary to provide a `Unit` like
@@ -49,11 +73,14 @@ class UnitQualityCheck(object):
     def __init__(
         self, unit, checker, original_checks, check_names, keep_false_positives=True
     ):
-        """Refreshes QualityChecks for a Unit
+        """Calculates QualityCheck changes for a Unit
 
         As this class can work with either `Unit` or `CheckableUnit` it only
         uses a minimum of `Unit` attributes from `self.unit`.
 
+        Changes are calculated in memory, and are to be applied by the
+        caller: see `new_checks`, `delete_ids` and `unmute_ids`.
+
         :param unit: an instance of Unit or CheckableUnit
         :param checker: a Checker for this Unit.
         :param original_checks: current QualityChecks for this Unit
@@ -66,7 +93,8 @@ class UnitQualityCheck(object):
         self.original_checks = original_checks
         self.check_names = check_names
         self.keep_false_positives = keep_false_positives
-        self.unmute_list = []
+        self.new_checks = []
+        self.unmute_ids = []
 
     @cached_property
     def check_failures(self):
@@ -76,51 +104,29 @@ class UnitQualityCheck(object):
             return self.checker.run_filters(self.unit, categorised=True)
         return run_given_filters(self.checker, self.unit, self.check_names)
 
-    @cached_property
-    def checks_qs(self):
-        """QualityCheck queryset for the Unit
-        """
-        return QualityCheck.objects.filter(unit=self.unit.id)
-
-    def delete_checks(self, checks):
-        """Delete checks that are no longer used.
-        """
-        to_delete = self.checks_qs.filter(name__in=checks)
-        if to_delete.exists():
-            to_delete.delete()
-            return True
-        return False
-
-    def unmute_checks(self, checks):
-        """Unmute checks that should no longer be muted
+    @property
+    def delete_ids(self):
+        """IDs of checks that are no longer used.
         """
-        to_unmute = self.checks_qs.filter(name__in=checks, false_positive=True)
-        if to_unmute.exists():
-            to_unmute.update(false_positive=False)
-            return True
-        return False
+        return [check["id"] for check in self.original_checks.values()]
 
     def update(self):
-        """Update QualityChecks for a Unit, deleting and unmuting as appropriate.
+        """Calculate new QualityChecks for a Unit, as well as the ones to
+        delete and to unmute.
+
+        :return: `True` if any checks need to be changed.
         """
-        # update the checks for this unit
+        # calculate the checks for this unit
         updated = self.update_checks()
 
-        # delete any remaining checks that were only in the original list
-        deleted = self.original_checks and self.delete_checks(self.original_checks)
-
-        # unmute any checks that have been marked for unmuting
-        unmuted = self.unmute_list and self.unmute_checks(self.unmute_list)
-
-        return updated or deleted or unmuted
+        # any remaining checks were only in the original list
+        return bool(updated or self.delete_ids or self.unmute_ids)
 
     def update_checks(self):
         """Compare self.original_checks to the Units calculated QualityCheck failures.
 
         Removes members of self.original_checks as they have been compared.
         """
-        updated = False
-        new_checks = []
         for name in iter(self.check_failures.keys()):
             if name in self.original_checks:
                 # keep false-positive checks if check is active
@@ -129,29 +135,30 @@ class UnitQualityCheck(object):
                     and not self.keep_false_positives
                 )
                 if unmute:
-                    self.unmute_list.append(name)
+                    self.unmute_ids.append(self.original_checks[name]["id"])
                 # if the check is valid remove from the list and continue
                 del self.original_checks[name]
                 continue
 
             # the check didnt exist previously - so create it
-            new_checks.append(
-                self.checks_qs.model(
+            self.new_checks.append(
+                QualityCheck(
                     unit_id=self.unit.id,
                     name=name,
                     message=self.check_failures[name]["message"],
                     category=self.check_failures[name]["category"],
                 )
             )
-            updated = True
-        if new_checks:
-            self.checks_qs.bulk_create(new_checks)
-        return updated
+        return bool(self.new_checks)
 
 
 class QualityCheckUpdater(object):
     def __init__(
-        self, check_names=None, translation_project=None, keep_false_positives=True
+        self,
+        check_names=None,
+        translation_project=None,
+        keep_false_positives=True,
+        store_range=None,
     ):
         """Refreshes QualityChecks for Units
 
@@ -160,17 +167,27 @@ class QualityCheckUpdater(object):
             restrict the update to.
         :param keep_false_positives: when set to `False`, it will unmute any
             existing false positive checks.
+        :param store_range: a `(first_store_id, last_store_id)` tuple to
+            restrict the update to.
         """
 
         self.check_names = check_names
         self.translation_project = translation_project
         self.keep_false_positives = keep_false_positives
+        self.store_range = store_range
         self.stores = set()
-        self._store_to_expire = None
+        self._stores_to_expire = set()
+        self._reset_changes()
 
-    @cached_property
-    def checks(self):
-        """Existing checks in the database for all units
+    def iter_unit_checks(self):
+        """Iterates over existing checks in the database, grouped by unit.
+
+        Checks are ordered the same way as units in `update_translated()`,
+        so both can be merged while streaming over them.
+
+        :return: an iterator of `((store_id, index, unit_id), unit_checks)`
+            tuples, where `unit_checks` is a dictionary of checks keyed by
+            check name.
         """
         checks = self.checks_qs
         check_keys = ("id", "name", "unit_id", "category", "false_positive")
@@ -178,29 +195,38 @@ class QualityCheckUpdater(object):
         if self.check_names is not None:
             checks = checks.filter(name__in=self.check_names)
 
-        all_units_checks = {}
-        for check in checks.values(*check_keys):
-            all_units_checks.setdefault(check["unit_id"], {})[check["name"]] = check
-        return all_units_checks
+        checks = checks.order_by("unit__store_id", "unit__index", "unit_id").values(
+            "unit__store_id", "unit__index", *check_keys
+        )
+        for key, unit_checks in groupby(
+            checks.iterator(),
+            key=itemgetter("unit__store_id", "unit__index", "unit_id"),
+        ):
+            yield key, {check["name"]: check for check in unit_checks}
 
     @cached_property
     def checks_qs(self):
-        """QualityCheck queryset for all units, restricted to TP if set
+        """QualityCheck queryset for all units, restricted to TP and store
+        range if set
         """
         checks_qs = QualityCheck.objects.all()
 
         if self.translation_project is not None:
             tp_pk = self.translation_project.pk
             checks_qs = checks_qs.filter(unit__store__translation_project__pk=tp_pk)
+        if self.store_range is not None:
+            checks_qs = checks_qs.filter(unit__store__id__range=self.store_range)
         return checks_qs
 
     @cached_property
     def units(self):
-        """Result set of Units, restricted to TP if set
+        """Result set of Units, restricted to TP and store range if set
         """
         units = Unit.simple_objects.all()
         if self.translation_project is not None:
             units = units.filter(store__translation_project=self.translation_project)
+        if self.store_range is not None:
+            units = units.filter(store__id__range=self.store_range)
         return units
 
     def clear_checks(self):
@@ -218,29 +244,55 @@ class QualityCheckUpdater(object):
             logger.error("Missing TP (pk '%s'). No checker retrieved.", tp_pk)
             return None
 
+    def get_store_ranges(self, size=UNITS_PER_STORE_RANGE):
+        """Splits stores into ranges of consecutive store IDs with about
+        `size` units each.
+
+        :return: a list of `(first_store_id, last_store_id)` tuples.
+        """
+        unit_counts = (
+            self.units.filter(state__gte=OBSOLETE)
+            .values("store_id")
+            .annotate(count=Count("id"))
+            .order_by("store_id")
+        )
+        store_ranges = []
+        first_store = None
+        count = 0
+        for item in unit_counts.iterator():
+            if first_store is None:
+                first_store = item["store_id"]
+            count += item["count"]
+            if count >= size:
+                store_ranges.append((first_store, item["store_id"]))
+                first_store = None
+                count = 0
+        if first_store is not None:
+            store_ranges.append((first_store, item["store_id"]))
+        return store_ranges
+
     def expire_store_cache(self, store_pk=None):
         """Whenever a store_pk is found it is queued for cache expiry
 
-        if a new store_pk is called the old one has its cache expired,
-        and the new store_pk is saved
+        caches of queued stores are expired in batches of
+        `STORE_CACHE_EXPIRY_BATCH_SIZE` stores
 
-        call with None to expire the current Store's cache
+        call with None to expire the caches of all queued stores
         """
-        if self._store_to_expire is None:
-            # there is no Store set - queue it for expiry
-            self._store_to_expire = store_pk
-            return
-        if store_pk == self._store_to_expire:
-            # its the same Store that we saw last time
-            return
-        # there was a _store_to_expire set and its changed - expire the cache
-        self.update_store_caches([self._store_to_expire])
-
-        # remember the new store_pk
-        self._store_to_expire = store_pk
+        if store_pk is not None:
+            self._stores_to_expire.add(store_pk)
+            if len(self._stores_to_expire) < STORE_CACHE_EXPIRY_BATCH_SIZE:
+                return
 
-    def update(self):
+        if self._stores_to_expire:
+            self.update_store_caches(self._stores_to_expire)
+            self._stores_to_expire = set()
+
+    def update(self, jobs=1):
         """Update/purge all QualityChecks for Units, and expire Store caches.
+
+        :param jobs: number of processes to spread the update of translated
+            units across.
         """
         start = time.time()
         logger.debug("Clearing unknown checks...")
@@ -258,7 +310,10 @@ class QualityCheckUpdater(object):
 
         start = time.time()
         logger.debug("Updating checks - this may take some time...")
-        trans = self.update_translated()
+        if jobs > 1:
+            trans = self.update_translated_in_pool(jobs)
+        else:
+            trans = self.update_translated()
         logger.debug(
             "Updated checks for %s units in %s seconds", trans, (time.time() - start)
         )
@@ -266,32 +321,73 @@ class QualityCheckUpdater(object):
     def update_store_caches(self, stores):
         """After completing QualityCheck updates expire caches for affected Stores.
         """
-        for store in Store.objects.filter(pk__in=stores):
+        stores = list(Store.objects.filter(pk__in=stores))
+        for store in stores:
             store.mark_dirty(CachedMethods.CHECKS, CachedMethods.MTIME)
-            store.update_dirty_cache()
+        Store.update_cached_many(stores)
+
+    def _reset_changes(self):
+        self._new_checks = []
+        self._delete_ids = []
+        self._unmute_ids = []
+        self._updated_unit_ids = []
+        self._updated_stores = set()
+
+    def apply_changes(self):
+        """Applies pending QualityCheck changes with bulk queries, and queues
+        the caches of the affected Stores for expiry.
+        """
+        if self._new_checks:
+            QualityCheck.objects.bulk_create(self._new_checks)
+        if self._delete_ids:
+            QualityCheck.objects.filter(id__in=self._delete_ids).delete()
+        if self._unmute_ids:
+            QualityCheck.objects.filter(id__in=self._unmute_ids).update(
+                false_positive=False
+            )
+        if self._updated_unit_ids:
+            Unit.simple_objects.filter(id__in=self._updated_unit_ids).update(
+                mtime=timezone.now()
+            )
 
-    def update_translated_unit(self, unit, checker=None):
+        for store_pk in self._updated_stores:
+            self.expire_store_cache(store_pk)
+        self._reset_changes()
+
+    def update_translated_unit(self, unit, checker=None, original_checks=None):
         """Update checks for a translated Unit
+
+        Changes are applied in chunks of `CHECK_UPDATE_CHUNK_SIZE` units.
+
+        :param original_checks: existing checks for the Unit, keyed by
+            check name.
         """
         unit = CheckableUnit(unit)
-        checker = UnitQualityCheck(
+        unit_checker = UnitQualityCheck(
             unit,
             checker,
-            self.checks.get(unit.id, {}),
+            original_checks or {},
             self.check_names,
             self.keep_false_positives,
         )
-        if checker.update():
-            self.expire_store_cache(unit.store)
-            self.units.filter(id=unit.id).update(mtime=timezone.now())
-            return True
-        return False
+        if not unit_checker.update():
+            return False
+
+        self._new_checks.extend(unit_checker.new_checks)
+        self._delete_ids.extend(unit_checker.delete_ids)
+        self._unmute_ids.extend(unit_checker.unmute_ids)
+        self._updated_unit_ids.append(unit.id)
+        self._updated_stores.add(unit.store)
+        if len(self._updated_unit_ids) >= CHECK_UPDATE_CHUNK_SIZE:
+            self.apply_changes()
+        return True
 
     def update_translated(self):
         """Update checks for translated Units
         """
         unit_fields = [
             "id",
+            "index",
             "source_f",
             "target_f",
             "locations",
@@ -308,20 +404,84 @@ class QualityCheckUpdater(object):
             # we only need to get the checker once if TP is set
             checker = self.get_checker(self.translation_project.id)
 
-        translated = self.units.filter(state__gte=OBSOLETE).order_by("store", "index")
+        translated = self.units.filter(state__gte=OBSOLETE).order_by(
+            "store_id", "index", "id"
+        )
+        # Existing checks are merged with units as both are streamed in the
+        # same order, rather than loading all of them upfront
+        unit_checks = self.iter_unit_checks()
+        checks_key, original_checks = next(unit_checks, (None, None))
+
         updated_count = 0
         for unit in translated.values(*unit_fields).iterator():
+            unit_key = (unit["store__id"], unit["index"], unit["id"])
+            while checks_key is not None and checks_key < unit_key:
+                checks_key, original_checks = next(unit_checks, (None, None))
+
             if self.translation_project is not None:
                 # if TP is set then manually add TP.id to the Unit value dict
                 unit[tp_key] = self.translation_project.id
             if checker is None:
                 checker = self.get_checker(unit[tp_key])
-            if checker and self.update_translated_unit(unit, checker=checker):
+            if checker and self.update_translated_unit(
+                unit,
+                checker=checker,
+                original_checks=original_checks if checks_key == unit_key else None,
+            ):
                 updated_count += 1
+        self.apply_changes()
         # clear the cache of the remaining Store
         self.expire_store_cache()
         return updated_count
 
+    def update_translated_in_pool(self, jobs):
+        """Update checks for translated Units, spreading ranges of stores
+        across `jobs` worker processes.
+
+        :raise FailedStoreRangesError: once all ranges have been processed,
+            if updating checks failed for some of them.
+        """
+        store_ranges = self.get_store_ranges()
+        tp_pk = None
+        if self.translation_project is not None:
+            tp_pk = self.translation_project.pk
+
+        updated_count = 0
+        failed = []
+        results = run_in_workers(
+            _update_translated_store_range,
+            store_ranges,
+            jobs,
+            state=(self.check_names, tp_pk, self.keep_false_positives),
+        )
+        for i, (store_range, success, count, elapsed) in enumerate(results, 1):
+            if not success:
+                failed.append(store_range)
+                logger.info(
+                    "[%d/%d] Failed to update checks in stores %d-%d in %.1fs",
+                    i,
+                    len(store_ranges),
+                    store_range[0],
+                    store_range[1],
+                    elapsed,
+                )
+                continue
+
+            updated_count += count
+            logger.info(
+                "[%d/%d] Updated checks for %d units in stores %d-%d in %.1fs",
+                i,
+                len(store_ranges),
+                count,
+                store_range[0],
+                store_range[1],
+                elapsed,
+            )
+
+        if failed:
+            raise FailedStoreRangesError(sorted(failed))
+        return updated_count
+
     def update_untranslated(self):
         """Delete QualityChecks for untranslated Units
         """
@@ -332,3 +492,31 @@ class QualityCheckUpdater(object):
         deleted = checks_qs.count()
         checks_qs.delete()
         return deleted
+
+
+def _update_translated_store_range(store_range):
+    """Updates checks for translated Units in a range of stores, with the
+    check names, TP ID and `keep_false_positives` flag the worker process
+    was started with.
+
+    Errors are reported as failures of the range rather than raised, so they
+    don't abort the whole pool.
+
+    :return: a `(store_range, success, updated_count, elapsed_seconds)` tuple.
+    """
+    check_names, tp_pk, keep_false_positives = get_worker_state()
+    start = time.time()
+    try:
+        translation_project = None
+        if tp_pk is not None:
+            translation_project = TranslationProject.objects.get(pk=tp_pk)
+        updater = QualityCheckUpdater(
+            check_names, translation_project, keep_false_positives, store_range
+        )
+        updated_count = updater.update_translated()
+    except Exception:
+        logger.exception(
+            "Failed to update checks in stores %d-%d", store_range[0], store_range[1]
+        )
+        return store_range, False, 0, time.time() - start
+    return store_range, True, updated_count, time.time() - start
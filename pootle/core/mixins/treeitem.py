@@ -8,20 +8,24 @@
 # AUTHORS file for copyright and authorship information.
 
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
+from itertools import chain
 
-from redis import WatchError
+from redis import ResponseError
 from rq import get_current_job
-from rq.job import Job, JobStatus, dumps, loads
-from rq.utils import utcnow
+from rq.job import Job, loads
+from rq.registry import DeferredJobRegistry, ScheduledJobRegistry
+from rq.utils import as_text, current_timestamp, utcformat, utcnow
 
+from django.conf import settings
 from django.db import connection
-from django.utils.encoding import iri_to_uri
 
 from django_rq.queues import get_connection, get_queue
 
-from pootle.core.cache import get_cache
+from pootle.core.stats import get_stats_backend
 from pootle.core.url_helpers import get_all_pootle_paths
 from pootle.core.utils.timezone import datetime_min
 from pootle_misc.util import dictsum
@@ -33,16 +37,61 @@ __all__ = ("TreeItem", "CachedTreeItem", "CachedMethods")
 KEY_DIRTY_TREEITEMS = "pootle:dirty:treeitems"
 KEY_STATS_LAST_JOB_PREFIX = "pootle:stats:lastjob:"
 KEY_STATS_JOB_PARAMS_PREFIX = "pootle:stats:job.params:"
+KEY_STATS_FULL_REFRESH = "pootle:stats:full_refresh"
+KEY_STATS_JOB_COUNTERS = "pootle:stats:job.counters"
 
 
 logger = logging.getLogger("stats")
-cache = get_cache("stats")
 
 
 class NoCachedStats(Exception):
     pass
 
 
+@contextmanager
+def prefetched_stats(items):
+    """Loads cached stats and dirty scores for `items` in bulk.
+
+    All cached method values for the given `CachedTreeItem` objects are
+    retrieved with a single stats backend `get_many` call, and their dirty
+    scores with a single pipeline, so that subsequent `get_cached()` and `is_dirty()`
+    calls within the block don't need to hit Redis.
+
+    Items which already have prefetched stats (i.e. when blocks are nested)
+    are left untouched.
+
+    :param items: iterable of tree items. Non-cached items are ignored.
+    """
+    items = [
+        item
+        for item in items
+        if isinstance(item, CachedTreeItem) and item._prefetched_stats is None
+    ]
+    if not items:
+        yield
+        return
+
+    values = get_stats_backend().get_many(
+        [item.cache_key for item in items], CachedMethods.get_all()
+    )
+
+    pipe = get_connection().pipeline(transaction=False)
+    for item in items:
+        pipe.zscore(KEY_DIRTY_TREEITEMS, item.cache_key)
+    scores = pipe.execute()
+
+    for item, score in zip(items, scores):
+        item._prefetched_stats = dict(values[item.cache_key])
+        item._prefetched_dirty_score = 0 if score is None else score
+
+    try:
+        yield
+    finally:
+        for item in items:
+            item._prefetched_stats = None
+            item._prefetched_dirty_score = None
+
+
 class CachedMethods(Enum):
     """Cached method names."""
 
@@ -61,6 +110,13 @@ class CachedMethods(Enum):
         """Retrieves all cached method names as a list."""
         return [str(e) for e in cls]
 
+    @classmethod
+    def get_additive(cls):
+        """Retrieves names of cached methods whose values are aggregated by
+        summing up children values.
+        """
+        return [str(e) for e in (cls.CHECKS, cls.SUGGESTIONS, cls.WORDCOUNT_STATS)]
+
 
 class TreeItem(object):
     def __init__(self, *args, **kwargs):
@@ -209,6 +265,10 @@ class TreeItem(object):
             included or not.
         """
         self.initialize_children()
+        with prefetched_stats(self.children):
+            return self._get_stats(include_children)
+
+    def _get_stats(self, include_children):
         result = {
             "total": None,
             "translated": None,
@@ -267,46 +327,59 @@ class TreeItem(object):
 
 
 class CachedTreeItem(TreeItem):
+    #: Cached values and dirty score loaded by `prefetched_stats()`
+    _prefetched_stats = None
+    _prefetched_dirty_score = None
+
+    #: Whether `update_dirty_cache()` should keep dirty stats around, so that
+    #: they can be updated later along with other items' via
+    #: `update_cached_many()`
+    defer_cache_update = False
+
     def __init__(self, *args, **kwargs):
         self._dirty_cache = set()
         super().__init__()
 
-    def make_cache_key(self, name):
-        return iri_to_uri("%s:%s" % (self.cache_key, name))
-
     def can_be_updated(self):
         """This method will be overridden in descendants"""
         return True
 
     def set_cached_value(self, name, value):
-        return cache.set(self.make_cache_key(name), value, None)
+        if self._prefetched_stats is not None:
+            self._prefetched_stats[str(name)] = value
+        return get_stats_backend().set(self.cache_key, str(name), value)
 
     def get_cached_value(self, name):
-        return cache.get(self.make_cache_key(name))
+        if self._prefetched_stats is not None:
+            return self._prefetched_stats.get(str(name))
+        return get_stats_backend().get(self.cache_key, str(name))
 
     def get_last_job_key(self):
         key = self.cache_key
         return KEY_STATS_LAST_JOB_PREFIX + key.replace("/", ".").strip(".")
 
-    def update_cached(self, name):
-        """calculate stat value and update cached value"""
-        start = datetime.now()
-
-        value = None
-
+    def calc_cached(self, name):
+        """calculate stat value without updating cached value"""
         if name == str(CachedMethods.WORDCOUNT_STATS):
-            value = self._calc_wordcount_stats()
+            return self._calc_wordcount_stats()
         elif name == str(CachedMethods.SUGGESTIONS):
-            value = self._calc_suggestion_count()
+            return self._calc_suggestion_count()
         elif name == str(CachedMethods.LAST_ACTION):
-            value = self._calc_last_action()
+            return self._calc_last_action()
         elif name == str(CachedMethods.LAST_UPDATED):
-            value = self._calc_last_updated()
+            return self._calc_last_updated()
         elif name == str(CachedMethods.CHECKS):
-            value = self._calc_checks()
+            return self._calc_checks()
         elif name == str(CachedMethods.MTIME):
-            value = self._calc_mtime()
+            return self._calc_mtime()
+
+        return None
 
+    def update_cached(self, name):
+        """calculate stat value and update cached value"""
+        start = datetime.now()
+
+        value = self.calc_cached(name)
         self.set_cached_value(name, value)
 
         end = datetime.now()
@@ -317,6 +390,45 @@ class CachedTreeItem(TreeItem):
         }
         logger.debug("update_cached(%(function)s)\t%(time)s\t%(key)s", ctx)
 
+        return value
+
+    @classmethod
+    def calc_cached_many(cls, items, names):
+        """calculate stat values of `names` for all `items` (this method
+        can be overridden in descendants to calculate them in bulk)
+
+        :return: a dictionary of `{cache_key: {name: value}}`.
+        """
+        return {
+            item.cache_key: {name: item.calc_cached(name) for name in names}
+            for item in items
+        }
+
+    @classmethod
+    def update_cached_many(cls, items):
+        """Update dirty cached stats of all `items` at once and add RQ jobs
+        for updating dirty cached stats of their parents
+        """
+        items = [item for item in items if item._dirty_cache]
+        if not items:
+            return
+
+        names = set().union(*(item._dirty_cache for item in items))
+        values = cls.calc_cached_many(items, names)
+        get_stats_backend().set_many_paths(values)
+        logger.debug("update_cached_many(%s)\t%s items", names, len(items))
+
+        parents = {}
+        for item in items:
+            parent = item.get_parent()
+            if parent is not None:
+                parent = parents.setdefault(parent.cache_key, parent)
+                parent.mark_dirty(*item._dirty_cache)
+            item._dirty_cache = set()
+
+        for parent in parents.values():
+            parent.update_dirty_cache()
+
     def get_cached(self, name):
         """get stat value from cache"""
         result = self.get_cached_value(name)
@@ -338,8 +450,15 @@ class CachedTreeItem(TreeItem):
         :param include_children: whether stats for children items should be
             included or not.
         """
+        items = [self]
         if include_children:
             self.initialize_children()
+            items.extend(self.children)
+
+        with prefetched_stats(items):
+            return self._get_stats(include_children)
+
+    def _get_stats(self, include_children):
         result = {
             "total": None,
             "translated": None,
@@ -404,8 +523,10 @@ class CachedTreeItem(TreeItem):
         self.mark_all_dirty()
 
         keys = self._dirty_cache
-        for key in keys:
-            cache.delete(self.make_cache_key(key))
+        get_stats_backend().delete(self.cache_key, keys)
+        if self._prefetched_stats is not None:
+            for key in keys:
+                self._prefetched_stats.pop(key, None)
 
         if keys:
             logger.debug("%s deleted from %s cache", keys, self.cache_key)
@@ -458,6 +579,9 @@ class CachedTreeItem(TreeItem):
         r_con.zincrby(KEY_DIRTY_TREEITEMS, 0 - decrement, self.cache_key)
 
     def get_dirty_score(self):
+        if self._prefetched_dirty_score is not None:
+            return self._prefetched_dirty_score
+
         r_con = get_connection()
         rv = r_con.zscore(KEY_DIRTY_TREEITEMS, self.cache_key)
         if rv is None:
@@ -468,19 +592,57 @@ class CachedTreeItem(TreeItem):
         """Add a RQ job which updates dirty cached stats of current TreeItem
         to the default queue
         """
+        if self.defer_cache_update:
+            return
+
         _dirty = self._dirty_cache.copy()
         if _dirty:
             self._dirty_cache = set()
             self.register_all_dirty()
             create_update_cache_job_wrapper(self, _dirty)
 
-    def update_all_cache(self):
+    def update_all_cache(self, full_refresh=False):
         """Add a RQ job which updates all cached stats of current TreeItem
         to the default queue
+
+        :param full_refresh: when stats delta propagation is enabled, forces
+            parent stats to be recalculated from their children rather than
+            having deltas applied to them.
         """
+        if full_refresh and getattr(settings, "ZING_STATS_DELTA_PROPAGATION", False):
+            get_connection().sadd(KEY_STATS_FULL_REFRESH, self.cache_key)
         self.mark_all_dirty()
         self.update_dirty_cache()
 
+    def get_stats_delta_paths(self):
+        """Get cache_key for all parents which should have stats deltas of
+        current TreeItem applied, or `None` if deltas can't be propagated
+        from it (this method will be overridden in descendants)
+        """
+        return None
+
+    def _get_delta_paths(self):
+        if not getattr(settings, "ZING_STATS_DELTA_PROPAGATION", False):
+            return None
+
+        if get_connection().srem(KEY_STATS_FULL_REFRESH, self.cache_key):
+            return None
+
+        return self.get_stats_delta_paths()
+
+    def _propagate_delta(self, paths, name, value):
+        """Update cached `name` stats with `value`, and apply the difference
+        with the previous value to `name` stats of all `paths`, atomically
+
+        :return: `True` if parent stats are up-to-date, `False` if they need
+            to be recalculated.
+        """
+        if self._prefetched_stats is not None:
+            self._prefetched_stats[str(name)] = value
+        return get_stats_backend().set_and_apply_delta(
+            self.cache_key, str(name), value, paths
+        )
+
     def _update_cache_job(self, keys, decrement):
         """Update dirty cached stats of current TreeItem and add RQ job for
         updating dirty cached stats of parent
@@ -494,9 +656,13 @@ class CachedTreeItem(TreeItem):
         self.initialized = False
         self.initialize_children()
         keys_for_parent = set(keys)
+        delta_paths = self._get_delta_paths()
         for key in keys:
             try:
-                self.update_cached(key)
+                if delta_paths is None or key not in CachedMethods.get_additive():
+                    self.update_cached(key)
+                elif self._propagate_delta(delta_paths, key, self.calc_cached(key)):
+                    keys_for_parent.remove(key)
             except NoCachedStats:
                 keys_for_parent.remove(key)
 
@@ -509,11 +675,77 @@ class CachedTreeItem(TreeItem):
             self.unregister_all_dirty(decrement)
 
 
+#: Enqueues an update cache job, or merges its params into the last job
+#: created for the same tree item if that one didn't start yet.
+#:
+#: KEYS: last job key, job counters key, RQ queues set key, RQ queue key,
+#:     deferred job registry key, scheduled job registry key
+#: ARGV: job id, decrement, scheduled_at timestamp (0 to enqueue right away),
+#:     current timestamp, enqueued_at date, RQ job key prefix, job params key
+#:     prefix, number of cache keys, cache keys..., RQ job hash field/values...
+#:
+#: Keys of the last job are derived from its id, so this can't be used with
+#: Redis Cluster. Job hashes, queues and registries follow the layout of the
+#: RQ version pinned in the requirements.
+UPDATE_CACHE_JOB_SCRIPT = """
+    local last_job_key, counters_key, queues_key, queue_key = unpack(KEYS, 1, 4)
+    local deferred_key, scheduled_key = KEYS[5], KEYS[6]
+    local job_id, decrement = ARGV[1], tonumber(ARGV[2])
+    local scheduled_at, now, enqueued_at = tonumber(ARGV[3]), ARGV[4], ARGV[5]
+    local job_prefix, params_prefix = ARGV[6], ARGV[7]
+    local n_keys = tonumber(ARGV[8])
+
+    local function save_params(params_key)
+        for i = 9, 8 + n_keys do
+            redis.call("HSET", params_key, ARGV[i], 1)
+        end
+        redis.call("HINCRBY", params_key, "decrement", decrement)
+    end
+
+    redis.call("SADD", queues_key, queue_key)
+
+    local last_job_id = redis.call("GET", last_job_key)
+    local status = false
+    if last_job_id then
+        status = redis.call("HGET", job_prefix .. last_job_id, "status")
+    end
+
+    if status == "queued" or status == "deferred" or status == "scheduled" then
+        save_params(params_prefix .. last_job_id)
+        redis.call("HINCRBY", counters_key, "merged", 1)
+        return {"merged", last_job_id}
+    end
+
+    local job_key = job_prefix .. job_id
+    redis.call("SET", last_job_key, job_id)
+    redis.call("HINCRBY", counters_key, "created", 1)
+    save_params(params_prefix .. job_id)
+    redis.call("HMSET", job_key, unpack(ARGV, 9 + n_keys))
+
+    if status and status ~= "finished" then
+        redis.call("HMSET", job_key, "status", "deferred", "dependency_id", last_job_id)
+        redis.call("ZADD", deferred_key, now, job_id)
+        redis.call("SADD", job_prefix .. last_job_id .. ":dependents", job_id)
+        return {"deferred", last_job_id}
+    end
+
+    if scheduled_at > 0 then
+        redis.call("HSET", job_key, "status", "scheduled")
+        redis.call("ZADD", scheduled_key, scheduled_at, job_id)
+        return {"scheduled", job_id}
+    end
+
+    redis.call("HMSET", job_key, "status", "queued", "enqueued_at", enqueued_at)
+    redis.call("RPUSH", queue_key, job_id)
+    return {"enqueued", job_id}
+"""
+
+
 class JobWrapper(object):
     """
-    Wraps RQ Job to handle it within external `watch`,
-    encapsulates work with external to RQ job params which is needed
-    because of possible race conditions
+    Wraps RQ Job to handle its params, which are kept in a Redis hash
+    external to the RQ job so they can be merged with the params of later
+    submissions until the job starts
     """
 
     def __init__(self, id, connection):
@@ -522,7 +754,6 @@ class JobWrapper(object):
         self.instance = None
         self.keys = None
         self.decrement = None
-        self.depends_on = None
         self.origin = None
         self.timeout = None
         self.connection = connection
@@ -561,18 +792,17 @@ class JobWrapper(object):
         Loads job params from Redis key
         """
         key = self.get_job_params_key()
-        data = self.connection.get(key)
-        if data is not None:
-            return loads(data)
-        return None
+        try:
+            data = self.connection.hgetall(key)
+        except ResponseError:
+            # params pickled by previous versions
+            return loads(self.connection.get(key))
 
-    def set_job_params(self, pipeline):
-        """
-        Sets dumped job params to Redis key
-        """
-        key = self.get_job_params_key()
-        value = (self.keys, self.decrement)
-        pipeline.set(key, dumps(value))
+        if not data:
+            return None
+
+        decrement = int(data.pop(b"decrement"))
+        return set(as_text(name) for name in data), decrement
 
     def clear_job_params(self):
         """
@@ -581,57 +811,22 @@ class JobWrapper(object):
         key = self.get_job_params_key()
         self.job.connection.delete(key)
 
-    def merge_job_params(self, keys, decrement, pipeline):
-        """
-        Merges job parameters to allow to skip one of these jobs
-        """
-        key = self.get_job_params_key()
-        data = self.connection.get(key)
-        old_keys, old_decrement = loads(data)
-        new_params = (keys | old_keys, decrement + old_decrement)
-        pipeline.set(key, dumps(new_params))
-
-        return new_params
-
-    def create_job(self, status=None, depends_on=None):
+    def create_job(self):
         """
         Creates Job object with given job ID
         """
         args = (self.instance,)
-        return Job.create(
+        job = Job.create(
             self.func,
             args=args,
             id=self.id,
             connection=self.connection,
-            depends_on=depends_on,
-            status=status,
             origin=self.origin,
         )
-
-    def save_enqueued(self, pipe):
-        """
-        Preparing job to enqueue. Works via pipeline.
-        Nothing done if WatchError happens while next `pipeline.execute()`.
-        """
-        job = self.create_job(status=JobStatus.QUEUED)
-        self.set_job_params(pipeline=pipe)
-        job.origin = self.origin
-        job.enqueued_at = utcnow()
         if job.timeout is None:
             job.timeout = self.timeout
-        job.save(pipeline=pipe)
         self.job = job
 
-    def save_deferred(self, depends_on, pipe):
-        """
-        Preparing job to defer (add as dependent). Works via pipeline.
-        Nothing done if WatchError happens while next `pipeline.execute()`.
-        """
-        job = self.create_job(depends_on=depends_on, status=JobStatus.DEFERRED)
-        self.set_job_params(pipeline=pipe)
-        job.register_dependency(pipeline=pipe)
-        job.save(pipeline=pipe)
-
         return job
 
 
@@ -641,6 +836,7 @@ def update_cache_job(instance):
     job_wrapper = JobWrapper(job.id, job.connection)
     keys, decrement = job_wrapper.get_job_params()
 
+    start = time.time()
     # close unusable and obsolete connections before and after the job
     # Note: setting CONN_MAX_AGE parameter can have negative side-effects
     # CONN_MAX_AGE value should be lower than DB wait_timeout
@@ -650,6 +846,36 @@ def update_cache_job(instance):
 
     job_wrapper.clear_job_params()
 
+    with job.connection.pipeline() as pipe:
+        pipe.hincrby(KEY_STATS_JOB_COUNTERS, "run", 1)
+        pipe.hincrbyfloat(KEY_STATS_JOB_COUNTERS, "run_time", time.time() - start)
+        pipe.execute()
+
+
+def get_update_cache_job_stats(queue=None):
+    """Gets counters of stats update jobs and their queue depth.
+
+    :return: a dictionary with the number of `queued` and `scheduled` jobs,
+        the number of `created` jobs and `merged` submissions which didn't
+        require a job of their own, and the number of jobs `run` along with
+        the worker time (`run_time`, in seconds) spent on them.
+    """
+    if queue is None:
+        queue = get_queue("default")
+
+    counters = {
+        as_text(name): float(value)
+        for name, value in queue.connection.hgetall(KEY_STATS_JOB_COUNTERS).items()
+    }
+    return {
+        "queued": queue.count,
+        "scheduled": len(ScheduledJobRegistry(queue.name, queue.connection)),
+        "created": int(counters.get("created", 0)),
+        "merged": int(counters.get("merged", 0)),
+        "run": int(counters.get("run", 0)),
+        "run_time": counters.get("run_time", 0.0),
+    }
+
 
 def create_update_cache_job_wrapper(instance, keys, decrement=1):
     queue = get_queue("default")
@@ -664,7 +890,6 @@ def create_update_cache_job_wrapper(instance, keys, decrement=1):
 
 
 def create_update_cache_job(queue, instance, keys, decrement=1):
-    queue.connection.sadd(queue.redis_queues_keys, queue.key)
     job_wrapper = JobWrapper.create(
         update_cache_job,
         instance=instance,
@@ -675,68 +900,48 @@ def create_update_cache_job(queue, instance, keys, decrement=1):
         timeout=queue.DEFAULT_TIMEOUT,
     )
     last_job_key = instance.get_last_job_key()
+    debounce = getattr(settings, "ZING_STATS_JOB_DEBOUNCE", 0)
+
+    job = job_wrapper.create_job()
+    job_fields = chain.from_iterable(job.to_dict().items())
+    now = current_timestamp()
+    script = queue.connection.register_script(UPDATE_CACHE_JOB_SCRIPT)
+    result, job_id = script(
+        keys=[
+            last_job_key,
+            KEY_STATS_JOB_COUNTERS,
+            queue.redis_queues_keys,
+            queue.key,
+            DeferredJobRegistry(queue.name, queue.connection).key,
+            ScheduledJobRegistry(queue.name, queue.connection).key,
+        ],
+        args=[
+            job_wrapper.id,
+            decrement,
+            now + debounce if debounce else 0,
+            now,
+            utcformat(utcnow()),
+            Job.redis_job_namespace_prefix,
+            KEY_STATS_JOB_PARAMS_PREFIX,
+            len(keys),
+        ]
+        + list(keys)
+        + list(job_fields),
+    )
+    result, job_id = as_text(result), as_text(job_id)
 
-    with queue.connection.pipeline() as pipe:
-        while True:
-            try:
-                pipe.watch(last_job_key)
-                last_job_id = str(queue.connection.get(last_job_key))
-                depends_on_wrapper = None
-                if last_job_id is not None:
-                    pipe.watch(
-                        Job.key_for(last_job_id), JobWrapper.params_key_for(last_job_id)
-                    )
-                    depends_on_wrapper = JobWrapper(last_job_id, queue.connection)
-
-                pipe.multi()
-
-                depends_on_status = None
-                if depends_on_wrapper is not None:
-                    depends_on = depends_on_wrapper.job
-                    depends_on_status = depends_on.get_status()
-
-                if depends_on_status is None:
-                    # enqueue without dependencies
-                    pipe.set(last_job_key, job_wrapper.id)
-                    job_wrapper.save_enqueued(pipe)
-                    pipe.execute()
-                    break
-
-                if depends_on_status in [JobStatus.QUEUED, JobStatus.DEFERRED]:
-                    new_job_params = depends_on_wrapper.merge_job_params(
-                        keys, decrement, pipeline=pipe
-                    )
-                    pipe.execute()
-                    logger.debug(
-                        "SKIP %s (decrement=%s, job_status=%s, " "job_id=%s)",
-                        last_job_key,
-                        new_job_params[1],
-                        depends_on_status,
-                        last_job_id,
-                    )
-                    # skip this job
-                    return None
-
-                pipe.set(last_job_key, job_wrapper.id)
-
-                if depends_on_status not in [JobStatus.FINISHED]:
-                    # add job as a dependent
-                    job = job_wrapper.save_deferred(last_job_id, pipe)
-                    pipe.execute()
-                    logger.debug(
-                        "ADD AS DEPENDENT for %s (job_id=%s) OF %s",
-                        last_job_key,
-                        job.id,
-                        last_job_id,
-                    )
-                    return job
-
-                job_wrapper.save_enqueued(pipe)
-                pipe.execute()
-                break
-            except WatchError:
-                logger.debug("RETRY after WatchError for %s", last_job_key)
-                continue
-    logger.debug("ENQUEUE %s (job_id=%s)", last_job_key, job_wrapper.id)
+    if result == "merged":
+        # skip this job
+        logger.debug("SKIP %s (job_id=%s)", last_job_key, job_id)
+        return None
+
+    if result == "deferred":
+        logger.debug(
+            "ADD AS DEPENDENT for %s (job_id=%s) OF %s", last_job_key, job.id, job_id
+        )
+    elif result == "scheduled":
+        logger.debug("SCHEDULE %s (job_id=%s) IN %ss", last_job_key, job.id, debounce)
+    else:
+        logger.debug("ENQUEUE %s (job_id=%s)", last_job_key, job.id)
 
-    queue.push_job_id(job_wrapper.id)
+    return job
@@ -6,6 +6,8 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+from contextlib import contextmanager
+
 from ..cache import get_cache
 
 
@@ -63,13 +65,67 @@ class Revision(object):
         return cache.add(cls.CACHE_KEY, value)
 
     @classmethod
-    def incr(cls):
+    def incr(cls, delta=1):
         """Increments the revision number.
 
+        :param delta: amount to increment the revision number by, allowing
+            to allocate a block of `delta` revisions at once.
         :return: the new revision number after incrementing it, or the
             initial number if there's no revision stored yet.
         """
         try:
-            return cache.incr(cls.CACHE_KEY)
+            return cache.incr(cls.CACHE_KEY, delta)
         except ValueError:
             raise NoRevision()
+
+    @classmethod
+    def reserve(cls, count):
+        """Reserves a block of `count` consecutive revision numbers with a
+        single increment.
+
+        :return: a `range` of the reserved revision numbers.
+        """
+        last_revision = cls.incr(count)
+        return range(last_revision - count + 1, last_revision + 1)
+
+    @classmethod
+    @contextmanager
+    def allocate(cls, block_size):
+        """Context manager handing out revision numbers from reserved blocks.
+
+        Yields a `RevisionAllocator` which can be used in place of
+        `Revision.incr` for bulk operations. Leftover numbers are discarded
+        on exit, so revisions reserved early are never used late.
+
+        :param block_size: number of revisions to reserve at once, typically
+            the number of units to be updated.
+        """
+        allocator = RevisionAllocator(cls, block_size)
+        try:
+            yield allocator
+        finally:
+            allocator.discard()
+
+
+class RevisionAllocator(object):
+    """Callable returning a new revision number on every call.
+
+    Numbers are taken from blocks reserved via `Revision.reserve()`, which
+    are only reserved once the previous block is used up.
+    """
+
+    def __init__(self, revision_class, block_size):
+        self.revision_class = revision_class
+        self.block_size = max(block_size, 1)
+        self.block = iter(())
+
+    def __call__(self):
+        try:
+            return next(self.block)
+        except StopIteration:
+            self.block = iter(self.revision_class.reserve(self.block_size))
+            return next(self.block)
+
+    def discard(self):
+        """Discards the numbers left in the current block."""
+        self.block = iter(())
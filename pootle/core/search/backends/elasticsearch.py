@@ -12,7 +12,7 @@ import logging
 import Levenshtein
 
 try:
-    from elasticsearch import Elasticsearch
+    from elasticsearch import Elasticsearch, helpers
     from elasticsearch.exceptions import ElasticsearchException
 except ImportError:
     Elasticsearch = None
@@ -28,6 +28,10 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_MIN_SIMILARITY = 0.7
 INDEX_PREFIX = "zing_tm_"
+#: Number of documents sent per bulk indexing request
+BULK_CHUNK_SIZE = 5000
+#: Seconds to wait for bulk indexing requests to complete
+BULK_REQUEST_TIMEOUT = 60
 
 
 def filter_hits_by_distance(hits, source_text, min_similarity=DEFAULT_MIN_SIMILARITY):
@@ -67,6 +71,8 @@ class ElasticSearchBackend(SearchBackend):
     def __init__(self):
         super().__init__()
         self._es = self._get_es_server()
+        # Names of indices known to exist, to avoid checking them on updates
+        self._existing_indices = set()
 
     def _get_es_server(self):
         return Elasticsearch(
@@ -74,14 +80,16 @@ class ElasticSearchBackend(SearchBackend):
         )
 
     def _create_index_if_missing(self, name):
+        if name in self._existing_indices:
+            return
+
         try:
             if not self._es.indices.exists(name):
                 self._es.indices.create(name)
         except ElasticsearchException as e:
             self._log_error(e)
-
-    def _is_valuable_hit(self, unit, hit):
-        return str(unit.id) != hit["_id"]
+        else:
+            self._existing_indices.add(name)
 
     def _es_call(self, cmd, *args, **kwargs):
         try:
@@ -98,69 +106,128 @@ class ElasticSearchBackend(SearchBackend):
             e,
         )
 
-    def search(self, unit):
-        counter = {}
-        res = []
-        language = unit.store.translation_project.language.code
-        index_name = INDEX_PREFIX + language.lower()
-        es_res = self._es_call(
-            "search",
-            index=index_name,
-            body={
-                "query": {
-                    "match": {"source": {"query": unit.source, "fuzziness": "AUTO"}}
-                }
-            },
-        )
-
-        if es_res is None:
-            # ElasticsearchException - eg ConnectionError.
-            return []
-        elif es_res == "":
-            # There seems to be an issue with urllib where an empty string is
-            # returned
-            logger.error(
-                "Elasticsearch search (%s:%s) returned an empty " "string: %s",
-                self._settings["HOST"],
-                self._settings["PORT"],
-                unit,
-            )
-            return []
+    @staticmethod
+    def _get_query(source):
+        return {"query": {"match": {"source": {"query": source, "fuzziness": "AUTO"}}}}
 
+    def _get_matches(self, es_res, source):
         hits = filter_hits_by_distance(
             es_res["hits"]["hits"],
-            unit.source,
+            source,
             min_similarity=self._settings.get("MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY),
         )
+        matches = []
         for hit in hits:
-            if self._is_valuable_hit(unit, hit):
-                body = hit["_source"]
-                translation_pair = body["source"] + body["target"]
-                if translation_pair not in counter:
-                    counter[translation_pair] = 1
-                    res.append(
-                        {
-                            "unit_id": hit["_id"],
-                            "source": body["source"],
-                            "target": body["target"],
-                            "project": body["project"],
-                            "path": body["path"],
-                            "username": body["username"],
-                            "fullname": body["fullname"],
-                            "email_md5": body["email_md5"],
-                            "mtime": body.get("mtime", None),
-                            "score": hit["_score"],
-                        }
-                    )
-                else:
-                    counter[translation_pair] += 1
-
-        for item in res:
-            item["count"] = counter[item["source"] + item["target"]]
-
-        return res
+            body = hit["_source"]
+            matches.append(
+                {
+                    "unit_id": hit["_id"],
+                    "source": body["source"],
+                    "target": body["target"],
+                    "project": body["project"],
+                    "path": body["path"],
+                    "username": body["username"],
+                    "fullname": body["fullname"],
+                    "email_md5": body["email_md5"],
+                    "mtime": body.get("mtime", None),
+                    "score": hit["_score"],
+                }
+            )
+
+        return matches
+
+    def get_matches(self, language, sources):
+        index_name = INDEX_PREFIX + language.lower()
+        if len(sources) == 1:
+            responses = [
+                self._es_call(
+                    "search", index=index_name, body=self._get_query(sources[0])
+                )
+            ]
+        else:
+            body = []
+            for source in sources:
+                body.extend([{}, self._get_query(source)])
+            es_res = self._es_call("msearch", index=index_name, body=body)
+            responses = [None] * len(sources) if es_res is None else es_res["responses"]
+
+        matches = []
+        for source, es_res in zip(sources, responses):
+            if es_res is None:
+                # ElasticsearchException - eg ConnectionError.
+                matches.append(None)
+            elif es_res == "":
+                # There seems to be an issue with urllib where an empty string
+                # is returned
+                logger.error(
+                    "Elasticsearch search (%s:%s) returned an empty string: %s",
+                    self._settings["HOST"],
+                    self._settings["PORT"],
+                    source,
+                )
+                matches.append(None)
+            elif "error" in es_res:
+                self._log_error(es_res["error"])
+                matches.append(None)
+            else:
+                matches.append(self._get_matches(es_res, source))
+
+        return matches
 
     def update(self, language, obj):
         index_name = INDEX_PREFIX + language.lower()
         self._create_index_if_missing(index_name)
-        self._es_call("index", index=index_name, body=obj, id=obj["id"])
+        # Wait for the unit to be searchable, so cached matches are not
+        # invalidated too early
+        self._es_call(
+            "index", index=index_name, body=obj, id=obj["id"], refresh="wait_for"
+        )
+
+    def update_many(self, language, objs):
+        index_name = INDEX_PREFIX + language.lower()
+        self._create_index_if_missing(index_name)
+        actions = (dict(obj, _index=index_name, _id=obj["id"]) for obj in objs)
+        try:
+            helpers.bulk(
+                self._es, actions, chunk_size=BULK_CHUNK_SIZE, refresh="wait_for"
+            )
+        except ElasticsearchException as e:
+            self._log_error(e)
+
+    def bulk_update(self, language, objs, chunk_size):
+        index_name = INDEX_PREFIX + language.lower()
+        actions = (dict(obj, _index=index_name, _id=obj["id"]) for obj in objs)
+        results = helpers.streaming_bulk(
+            self._es,
+            actions,
+            chunk_size=chunk_size,
+            request_timeout=BULK_REQUEST_TIMEOUT,
+        )
+        for ok_, item in results:
+            yield int(item["index"]["_id"])
+
+    def get_indexed_revisions(self, languages):
+        language_codes = {INDEX_PREFIX + code.lower(): code for code in languages}
+        result = self._es.search(
+            index=INDEX_PREFIX + "*",
+            body={
+                "aggs": {
+                    "indices": {
+                        "terms": {"field": "_index", "size": len(language_codes)},
+                        "aggs": {"max_revision": {"max": {"field": "revision"}}},
+                    },
+                },
+            },
+            size=0,
+        )
+        if "aggregations" not in result:
+            return {}
+
+        return {
+            language_codes[bucket["key"]]: int(bucket["max_revision"]["value"] or -1)
+            for bucket in result["aggregations"]["indices"]["buckets"]
+            if bucket["key"] in language_codes
+        }
+
+    def delete_all(self):
+        self._es.indices.delete(index=INDEX_PREFIX + "*")
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""TM backend storing translations in the database.
+
+Source texts of indexed units are split into n-grams, stored in the
+`TMNgram` table as an inverted index. Looking up a source text retrieves
+the units sharing enough n-grams with it to possibly be similar enough,
+which are then ranked by their Levenshtein similarity to the source text,
+as Elasticsearch results are.
+
+The units having each n-gram of the source text are counted up to
+`MAX_POSTINGS`, and up to `MAX_SCANNED_POSTINGS` units are then retrieved
+for the rarest n-grams, each step with a single query. Lookups thus scan a
+bounded part of the index however large it grows. The price is recall:
+units sharing nothing but frequent n-grams with the source text can be
+missed.
+"""
+
+import heapq
+import math
+import zlib
+from collections import Counter
+
+import Levenshtein
+
+from django.db import connection, transaction
+
+from pootle.core.utils.multistring import parse_multistring
+from pootle_language.models import Language
+from pootle_store.models import BULK_CREATE_BATCH_SIZE, TMNgram, TMUnit, Unit
+
+from ..base import SearchBackend
+from .elasticsearch import DEFAULT_MIN_SIMILARITY
+
+
+__all__ = ("EmbeddedTMBackend",)
+
+
+NGRAM_SIZE = 3
+#: Number of units beyond which n-grams are too frequent to tell units apart
+MAX_POSTINGS = 1000
+#: Maximum number of units retrieved for the n-grams of a source text
+MAX_SCANNED_POSTINGS = 10000
+#: Maximum number of subqueries combined in a single query, well below
+#: SQLite's limit of terms in a compound SELECT
+MAX_SUBQUERIES = 100
+#: Maximum number of units sharing n-grams with a source text to rank
+MAX_CANDIDATES = 100
+#: Maximum number of matches per source text, as returned by Elasticsearch
+MAX_MATCHES = 10
+
+
+def get_source_text(source):
+    """Returns the text units are indexed and looked up by, which is the
+    singular form of `source`.
+    """
+    return str(parse_multistring(source))
+
+
+def get_ngrams(text):
+    """Returns the hashes of the distinct n-grams of `text`.
+
+    `text` is padded with spaces so that any non-empty text has n-grams and
+    its first and last characters are part of as many n-grams as the rest.
+    """
+    text = " %s " % text
+    return set(
+        zlib.crc32(text[i : i + NGRAM_SIZE].encode("utf-8")) & 0x7FFFFFFF
+        for i in range(len(text) - NGRAM_SIZE + 1)
+    )
+
+
+def get_batch_size(objs):
+    """Returns the size of batches to insert model instances `objs` in.
+
+    Explicit batch sizes are not capped to the database limits by Django,
+    which SQLite easily exceeds.
+    """
+    if not objs:
+        return BULK_CREATE_BATCH_SIZE
+    fields = [field for field in objs[0]._meta.concrete_fields if not field.primary_key]
+    return min(BULK_CREATE_BATCH_SIZE, connection.ops.bulk_batch_size(fields, objs))
+
+
+def get_similarity(text, other_text):
+    distance = Levenshtein.distance(text, other_text)
+    return 1 - distance / float(max(len(text), len(other_text)))
+
+
+def get_postings_sql(order=None):
+    """Returns the SQL selecting `(unit_id, length)` rows of units having an
+    n-gram and a length in a range, taking `(language_id, ngram, min_length,
+    max_length, limit)` parameters.
+
+    :param order: `"ASC"` or `"DESC"` to get units by length in that order.
+    """
+    qn = connection.ops.quote_name
+    sql = (
+        "SELECT %s, %s FROM %s WHERE %s = %%s AND %s = %%s AND %s BETWEEN %%s AND %%s"
+        % (
+            qn("unit_id"),
+            qn("length"),
+            qn(TMNgram._meta.db_table),
+            qn("language_id"),
+            qn("ngram"),
+            qn("length"),
+        )
+    )
+    if order is not None:
+        sql += " ORDER BY %s %s, %s %s" % (qn("length"), order, qn("unit_id"), order)
+    return sql + " LIMIT %s"
+
+
+def fetch_union(queries):
+    """Runs `(sql, params)` subqueries combined with UNION ALL, in as few
+    queries as possible.
+
+    :return: a list of all rows returned by the subqueries.
+    """
+    rows = []
+    with connection.cursor() as cursor:
+        for i in range(0, len(queries), MAX_SUBQUERIES):
+            chunk = queries[i : i + MAX_SUBQUERIES]
+            # Subqueries are wrapped so that each keeps its own LIMIT
+            cursor.execute(
+                " UNION ALL ".join(
+                    "SELECT * FROM (%s) t%d" % (sql, n)
+                    for n, (sql, params) in enumerate(chunk)
+                ),
+                [param for sql, params in chunk for param in params],
+            )
+            rows.extend(cursor.fetchall())
+    return rows
+
+
+class EmbeddedTMBackend(SearchBackend):
+    def __init__(self):
+        super().__init__()
+        self._language_ids = {}
+
+    @property
+    def min_similarity(self):
+        min_similarity = self._settings.get("MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY)
+        if min_similarity <= 0 or min_similarity >= 1:
+            return DEFAULT_MIN_SIMILARITY
+        return min_similarity
+
+    def _get_language_id(self, language):
+        if language not in self._language_ids:
+            self._language_ids[language] = (
+                Language.objects.filter(code=language)
+                .values_list("id", flat=True)
+                .first()
+            )
+        return self._language_ids[language]
+
+    def _get_candidates(self, language_id, source):
+        """Gets the IDs of units which might be similar enough to `source`.
+
+        Units with a source text whose length differs too much from
+        `source`'s can't be similar enough. Neither can units sharing too
+        few n-grams with `source`, as each edit operation changes at most
+        `NGRAM_SIZE` of them.
+
+        Units are retrieved for the rarest n-grams of `source` first. Those
+        shared by more than `MAX_POSTINGS` units are too frequent to tell
+        units apart, and are only counted as possibly shared by every unit,
+        as are those left once `MAX_SCANNED_POSTINGS` units are retrieved.
+        If that leaves no units, the ones with the lengths closest to
+        `source`'s are retrieved for the skipped n-grams instead. Units
+        sharing as many n-grams are ranked by how close their length is.
+        """
+        ngrams = get_ngrams(source)
+        if not ngrams:
+            return []
+
+        # Small offsets avoid missing units right at the threshold
+        length = len(source)
+        min_length = math.ceil(length * self.min_similarity - 1e-9)
+        max_length = math.floor(length / self.min_similarity + 1e-9)
+        max_distance = math.floor((1 - self.min_similarity) * max_length + 1e-9)
+        min_shared = max(1, len(ngrams) - NGRAM_SIZE * max_distance)
+
+        postings_sql = get_postings_sql()
+        counts = dict(
+            fetch_union(
+                [
+                    (
+                        "SELECT %s AS ngram, COUNT(*) AS n FROM ("
+                        + postings_sql
+                        + ") p",
+                        [ngram, language_id, ngram, min_length, max_length]
+                        + [MAX_POSTINGS + 1],
+                    )
+                    for ngram in ngrams
+                ]
+            )
+        )
+
+        scanned = []
+        remaining = MAX_SCANNED_POSTINGS
+        for ngram in sorted(ngrams, key=lambda ngram: (counts[ngram], ngram)):
+            if counts[ngram] > min(MAX_POSTINGS, remaining):
+                break
+            remaining -= counts[ngram]
+            scanned.append(ngram)
+        skipped = ngrams.difference(scanned)
+        min_shared -= len(skipped)
+
+        # Counts shared n-grams per `(unit_id, length)` row
+        shared = Counter(
+            fetch_union(
+                [
+                    (
+                        postings_sql,
+                        [language_id, ngram, min_length, max_length, MAX_POSTINGS],
+                    )
+                    for ngram in scanned
+                    if counts[ngram]
+                ]
+            )
+        )
+
+        if not shared and skipped and min_shared <= 0:
+            limit = max(1, MAX_SCANNED_POSTINGS // (2 * len(skipped)))
+            longer_sql = get_postings_sql("ASC")
+            shorter_sql = get_postings_sql("DESC")
+            queries = []
+            for ngram in sorted(skipped):
+                queries.extend(
+                    [
+                        (longer_sql, [language_id, ngram, length, max_length, limit]),
+                        (
+                            shorter_sql,
+                            [language_id, ngram, min_length, length - 1, limit],
+                        ),
+                    ]
+                )
+            shared.update(fetch_union(queries))
+
+        candidates = heapq.nsmallest(
+            MAX_CANDIDATES,
+            (
+                (-count, abs(unit_length - length), unit_id)
+                for (unit_id, unit_length), count in shared.items()
+                if count >= min_shared
+            ),
+        )
+        return [unit_id for __, __, unit_id in candidates]
+
+    def _get_source_matches(self, language_id, source):
+        # Candidates are ranked by their source text only, and the units
+        # making it to the results are fetched afterwards
+        scores = {}
+        sources = (
+            Unit.simple_objects.filter(id__in=self._get_candidates(language_id, source))
+            .exclude(target_f__isnull=True)
+            .exclude(target_f__exact="")
+            .values_list("id", "source_f")
+        )
+        for unit_id, unit_source in sources:
+            score = get_similarity(source, get_source_text(unit_source))
+            if score >= self.min_similarity:
+                scores[unit_id] = score
+        unit_ids = heapq.nlargest(
+            MAX_MATCHES, scores, key=lambda unit_id: (scores[unit_id], -unit_id)
+        )
+
+        units = Unit.simple_objects.select_related(
+            "submitted_by", "store__translation_project__project"
+        ).in_bulk(unit_ids)
+        matches = []
+        for unit_id in unit_ids:
+            # Units may have been deleted in the meantime
+            if unit_id not in units:
+                continue
+
+            body = units[unit_id].get_tm_data()
+            matches.append(
+                {
+                    "unit_id": str(unit_id),
+                    "source": str(body["source"]),
+                    "target": str(body["target"]),
+                    "project": body["project"],
+                    "path": body["path"],
+                    "username": body["username"],
+                    "fullname": body["fullname"],
+                    "email_md5": body["email_md5"],
+                    "mtime": body.get("mtime", None),
+                    "score": scores[unit_id],
+                }
+            )
+
+        return matches
+
+    def get_matches(self, language, sources):
+        language_id = self._get_language_id(language)
+        if language_id is None:
+            return [[] for source in sources]
+
+        return [
+            self._get_source_matches(language_id, get_source_text(source))
+            for source in sources
+        ]
+
+    def update(self, language, obj):
+        self.update_many(language, [obj])
+
+    def update_many(self, language, objs):
+        language_id = self._get_language_id(language)
+        unit_ids = []
+        tm_units = []
+        ngrams = []
+        for obj in objs:
+            source = get_source_text(obj["source"])
+            unit_ids.append(obj["id"])
+            tm_units.append(
+                TMUnit(
+                    unit_id=obj["id"], language_id=language_id, revision=obj["revision"]
+                )
+            )
+            ngrams.extend(
+                TMNgram(
+                    unit_id=obj["id"],
+                    language_id=language_id,
+                    ngram=ngram,
+                    length=len(source),
+                )
+                for ngram in get_ngrams(source)
+            )
+
+        with transaction.atomic():
+            TMNgram.objects.filter(unit_id__in=unit_ids).delete()
+            TMUnit.objects.filter(unit_id__in=unit_ids).delete()
+            TMNgram.objects.bulk_create(ngrams, batch_size=get_batch_size(ngrams))
+            TMUnit.objects.bulk_create(tm_units, batch_size=get_batch_size(tm_units))
+
+    def get_indexed_revisions(self, languages):
+        revisions = {}
+        for language in Language.objects.filter(code__in=languages):
+            revision = (
+                TMUnit.objects.filter(language=language)
+                .order_by("-revision")
+                .values_list("revision", flat=True)
+                .first()
+            )
+            if revision is not None:
+                revisions[language.code] = revision
+
+        return revisions
+
+    def delete_all(self):
+        TMNgram.objects.all().delete()
+        TMUnit.objects.all().delete()
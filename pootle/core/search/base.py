@@ -7,6 +7,8 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+from itertools import islice
+
 from django.conf import settings
 
 
@@ -20,8 +22,85 @@ class SearchBackend(object):
         :param unit: :cls:`~pootle_store.models.Unit`
         :return: list of results or [] for no results or offline
         """
+        language = unit.store.translation_project.language.code
+        return self.get_results(unit, self.get_matches(language, [unit.source])[0])
+
+    def get_matches(self, language, sources):
+        """Looks up TM matches for several source texts at once.
+
+        Matches don't depend on the unit being translated, so they can be
+        shared by units having the same source text.
+
+        :param language: code of the language to look up translations for.
+        :param sources: list of source texts.
+        :return: list with the matches for each of `sources`, sorted from
+            higher to lower score, or `None` for failed lookups.
+        """
         raise NotImplementedError
 
+    def _is_valuable_hit(self, unit, match):
+        return str(unit.id) != str(match["unit_id"])
+
+    def get_results(self, unit, matches):
+        """Gets TM results for `unit` out of the matches for its source text.
+
+        The unit's own translation is left out, and identical translations
+        are counted as a single result.
+        """
+        counter = {}
+        res = []
+        for match in matches or []:
+            if not self._is_valuable_hit(unit, match):
+                continue
+
+            translation_pair = match["source"] + match["target"]
+            if translation_pair not in counter:
+                counter[translation_pair] = 1
+                res.append(dict(match))
+            else:
+                counter[translation_pair] += 1
+
+        for item in res:
+            item["count"] = counter[item["source"] + item["target"]]
+
+        return res
+
     def update(self, language, obj):
         """Add a unit to the backend"""
         pass
+
+    def update_many(self, language, objs):
+        """Add several units to the backend at once"""
+        for obj in objs:
+            self.update(language, obj)
+
+    def bulk_update(self, language, objs, chunk_size):
+        """Adds units to the backend in chunks of `chunk_size` units.
+
+        Errors are raised rather than logged, so bulk loads can be resumed.
+
+        :return: iterator yielding the ID of each unit once it's been added,
+            in the order of `objs`.
+        """
+        objs = iter(objs)
+        while True:
+            chunk = list(islice(objs, chunk_size))
+            if not chunk:
+                break
+
+            self.update_many(language, chunk)
+            for obj in chunk:
+                yield obj["id"]
+
+    def get_indexed_revisions(self, languages):
+        """Gets the latest revision of the units added for each language.
+
+        :param languages: codes of the languages to get revisions for.
+        :return: a dictionary of `{language_code: revision}`, leaving out
+            languages without units.
+        """
+        raise NotImplementedError
+
+    def delete_all(self):
+        """Removes all units from the backend."""
+        raise NotImplementedError
@@ -9,48 +9,262 @@
 
 import importlib
 import logging
+import time
+from collections import OrderedDict
+from hashlib import md5
+
+from django.conf import settings
+
+from pootle.core.cache import get_cache
+from pootle.core.utils.multistring import unparse_multistring
 
 from . import SearchBackend
+from .backends.elasticsearch import DEFAULT_MIN_SIMILARITY
+
+
+logger = logging.getLogger(__name__)
 
 
 DEFAULT_ENGINE_MODULE = "pootle.core.search.backends.ElasticSearchBackend"
+#: Seconds TM matches are cached for
+DEFAULT_CACHE_TIMEOUT = 600
+#: Maximum number of source texts TM matches are kept in memory for
+DEFAULT_CACHE_SIZE = 10000
+#: Seconds TM matches are kept in memory for, which bounds how long it takes
+#: for updates made by other processes to be seen
+LOCAL_CACHE_TIMEOUT = 60
+#: Number of upcoming units to look up TM matches for in the editor
+DEFAULT_PREFETCH_UNITS = 5
+#: Number of cache lookups between logging cache metrics
+CACHE_STATS_LOG_INTERVAL = 1000
+
+
+def get_source_hash(source):
+    """Returns the hash of a source text, as stored in `Unit.source_hash`."""
+    return md5(unparse_multistring(source).encode("utf-8")).hexdigest()
+
+
+def get_search_backend():
+    """Returns an instance of the TM backend set in `ZING_TM_SERVER`.
+
+    :return: the backend, or `None` if the TM server is not configured.
+    """
+    tm_settings = getattr(settings, "ZING_TM_SERVER", None)
+    if not tm_settings:
+        return None
+
+    # Other engines may not need to connect to a server
+    if "ENGINE" not in tm_settings and (
+        "HOST" not in tm_settings or "PORT" not in tm_settings
+    ):
+        return None
+
+    engine = tm_settings.get("ENGINE", DEFAULT_ENGINE_MODULE)
+    _module = ".".join(engine.split(".")[:-1])
+    _search_class = engine.split(".")[-1]
+
+    try:
+        module = importlib.import_module(_module)
+        try:
+            return getattr(module, _search_class)()
+        except AttributeError:
+            logging.warning("No search class '%s' defined.", _search_class)
+    except ImportError:
+        logging.warning("TM search backend: cannot import '%s'", _module)
+
+    return None
+
+
+class TMResultCache(object):
+    """Two-level cache of TM matches.
+
+    Matches are kept in a bounded in-memory LRU mapping, backed by the
+    `default` cache which is shared across processes. Keys include a
+    per-language generation number, so all matches of a language can be
+    invalidated at once by bumping it.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, timeout=DEFAULT_CACHE_TIMEOUT):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.shared = get_cache("default")
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(language, generation, source_hash, min_similarity):
+        return "pootle:tm:matches:%s:%s:%s:%s" % (
+            language,
+            generation,
+            source_hash,
+            min_similarity,
+        )
+
+    @staticmethod
+    def make_generation_key(language):
+        return "pootle:tm:generation:%s" % language
+
+    def get_generation(self, language):
+        return self.shared.get(self.make_generation_key(language), 0)
+
+    def bump_generation(self, language):
+        """Invalidates all cached matches of `language`."""
+        key = self.make_generation_key(language)
+        self.shared.add(key, 0, None)
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            # The key was evicted in the meantime
+            self.shared.set(key, 1, None)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return (self.hits + self.shared_hits) / lookups if lookups else 0.0
+
+    def get_stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+        }
+
+    def _set_local(self, key, value):
+        if self.max_size <= 0:
+            return
+
+        self._entries[key] = (time.monotonic() + LOCAL_CACHE_TIMEOUT, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """Gets cached matches for `keys`.
+
+        :return: a dictionary of `{key: matches}` for keys found in cache.
+        """
+        lookups = self.hits + self.shared_hits + self.misses
+        now = time.monotonic()
+        found = {}
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry[0] < now:
+                del self._entries[key]
+                continue
+            self._entries.move_to_end(key)
+            found[key] = entry[1]
+        self.hits += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared_found = self.shared.get_many(missing)
+            for key, value in shared_found.items():
+                self._set_local(key, value)
+            found.update(shared_found)
+            self.shared_hits += len(shared_found)
+            self.misses += len(missing) - len(shared_found)
+
+        if (lookups + len(keys)) // CACHE_STATS_LOG_INTERVAL > (
+            lookups // CACHE_STATS_LOG_INTERVAL
+        ):
+            logger.info("TM cache stats: %s", self.get_stats())
+
+        return found
+
+    def set_many(self, mapping):
+        for key, value in mapping.items():
+            self._set_local(key, value)
+        self.shared.set_many(mapping, self.timeout)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+        self.shared.delete_many(keys)
 
 
 class SearchBroker(SearchBackend):
     def __init__(self):
         super().__init__()
-        self._server = None
+        self._cache = None
+        self._server = get_search_backend()
+        if self._server is not None:
+            self._cache = TMResultCache(
+                max_size=self._settings.get("CACHE_SIZE", DEFAULT_CACHE_SIZE),
+                timeout=self._settings.get("CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT),
+            )
 
-        if self._settings is None:
-            return
+    @property
+    def enabled(self):
+        return self._server is not None
 
-        if "HOST" not in self._settings or "PORT" not in self._settings:
-            return
+    @property
+    def prefetch_units(self):
+        return self._settings.get("PREFETCH_UNITS", DEFAULT_PREFETCH_UNITS)
 
-        try:
-            engine = self._settings["ENGINE"]
-        except KeyError:
-            engine = DEFAULT_ENGINE_MODULE
+    def _make_cache_key(self, language, generation, source_hash):
+        return self._cache.make_key(
+            language,
+            generation,
+            source_hash,
+            self._settings.get("MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY),
+        )
 
-        _module = ".".join(engine.split(".")[:-1])
-        _search_class = engine.split(".")[-1]
+    def get_unit_matches(self, language, units):
+        """Gets TM matches for the source texts of `units` of `language`.
 
-        try:
-            module = importlib.import_module(_module)
-            try:
-                self._server = getattr(module, _search_class)()
-            except AttributeError:
-                logging.warning("No search class '%s' defined.", _search_class)
-        except ImportError:
-            logging.warning("TM search backend: cannot import '%s'", _module)
+        Matches are cached per source text hash and minimum similarity, and
+        those missing from the cache are looked up at once.
+
+        :return: list with the matches for each of `units`.
+        """
+        generation = self._cache.get_generation(language)
+        keys = [
+            self._make_cache_key(language, generation, unit.source_hash)
+            for unit in units
+        ]
+        matches = self._cache.get_many(keys)
+
+        sources = {}
+        for key, unit in zip(keys, units):
+            if key not in matches:
+                sources.setdefault(key, unit.source)
+        if sources:
+            found = {
+                key: key_matches
+                for key, key_matches in zip(
+                    sources.keys(),
+                    self._server.get_matches(language, list(sources.values())),
+                )
+                if key_matches is not None
+            }
+            self._cache.set_many(found)
+            matches.update(found)
+
+        return [matches.get(key, []) for key in keys]
+
+    def prefetch(self, language, units):
+        """Caches TM matches for `units` ahead of them being searched."""
+        if not self._server:
+            return
+
+        self.get_unit_matches(language, units)
 
     def search(self, unit):
         if not self._server:
             return []
 
+        language = unit.store.translation_project.language.code
+        matches = self.get_unit_matches(language, [unit])[0]
+
         results = []
         counter = {}
-        for result in self._server.search(unit):
+        for result in self._server.get_results(unit, matches):
             translation_pair = result["source"] + result["target"]
             if translation_pair not in counter:
                 counter[translation_pair] = result["count"]
@@ -67,8 +281,24 @@ class SearchBroker(SearchBackend):
 
         return results
 
+    def invalidate(self, language):
+        """Drops all cached TM matches of `language`.
+
+        New translations can be fuzzy matches for any source text, not just
+        their own, so this must be called once they can be looked up.
+        """
+        self._cache.bump_generation(language)
+
     def update(self, language, obj):
         if not self._server:
             return
 
         self._server.update(language, obj)
+        self.invalidate(language)
+
+    def update_many(self, language, objs):
+        if not self._server:
+            return
+
+        self._server.update_many(language, objs)
+        self.invalidate(language)
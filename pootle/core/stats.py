@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Storage backends for cached tree item stats.
+
+Stats are stored per `(pootle_path, name)` pair, where `name` is one of the
+`CachedMethods` values. The backend in use is set via the
+`ZING_STATS_BACKEND` setting.
+"""
+
+import datetime
+import json
+from functools import lru_cache
+
+from django_redis import get_redis_connection
+from redis import WatchError
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import force_str, iri_to_uri
+
+from pootle_misc.util import import_func
+
+from .cache import get_cache
+
+
+DEFAULT_STATS_BACKEND = "pootle.core.stats.KeyStatsBackend"
+
+
+@lru_cache()
+def get_stats_backend():
+    """Returns an instance of the configured stats storage backend.
+
+    The instance is shared by all callers, and replaced when the
+    `ZING_STATS_BACKEND` setting changes.
+    """
+    path = getattr(settings, "ZING_STATS_BACKEND", DEFAULT_STATS_BACKEND)
+    return import_func(path)()
+
+
+@receiver(setting_changed)
+def reset_stats_backend(**kwargs):
+    if kwargs["setting"] == "ZING_STATS_BACKEND":
+        get_stats_backend.cache_clear()
+
+
+def get_stats_delta(old, new):
+    """Returns the difference between two additive stats values.
+
+    Values can either be numbers or (nested) dictionaries of numbers, as
+    returned by the wordcount, checks and suggestion count stats.
+
+    :return: the difference with unchanged entries left out, or `None` if
+        both values are the same.
+    """
+    if not isinstance(new, dict):
+        delta = new - old
+        return delta if delta != 0 else None
+
+    delta = {}
+    for key in set(old) | set(new):
+        if isinstance(new.get(key, old.get(key)), dict):
+            key_delta = get_stats_delta(old.get(key, {}), new.get(key, {}))
+        else:
+            key_delta = get_stats_delta(old.get(key, 0), new.get(key, 0))
+
+        if key_delta is not None:
+            delta[key] = key_delta
+
+    return delta or None
+
+
+def apply_stats_delta(value, delta, nested=False):
+    """Applies a delta obtained via `get_stats_delta()` to `value`.
+
+    Entries of nested dictionaries (e.g. per-check counts) which drop to zero
+    are removed, so that the result matches what a full aggregation of
+    children stats would produce.
+    """
+    if not isinstance(delta, dict):
+        return value + delta
+
+    result = dict(value)
+    for key, key_delta in delta.items():
+        if isinstance(key_delta, dict):
+            result[key] = apply_stats_delta(result.get(key, {}), key_delta, True)
+        else:
+            result[key] = result.get(key, 0) + key_delta
+            if nested and result[key] == 0:
+                del result[key]
+
+    return result
+
+
+class StatsBackend(object):
+    """Base class for stats storage backends."""
+
+    def get(self, path, name):
+        """Gets the value stored for `name` in `path`, or `None`."""
+        return self.get_many([path], [name])[path][name]
+
+    def get_many(self, paths, names):
+        """Gets stored values for all `names` in all `paths`.
+
+        :return: a dictionary of `{path: {name: value}}`. Missing values
+            are set to `None`.
+        """
+        raise NotImplementedError
+
+    def set(self, path, name, value):
+        """Stores `value` for `name` in `path`."""
+        raise NotImplementedError
+
+    def set_many(self, path, mapping):
+        """Stores all `{name: value}` pairs in `mapping` for `path`."""
+        for name, value in mapping.items():
+            self.set(path, name, value)
+
+    def set_many_paths(self, values):
+        """Stores all `{path: {name: value}}` values in `values`."""
+        for path, mapping in values.items():
+            self.set_many(path, mapping)
+
+    def delete(self, path, names):
+        """Removes stored values for `names` in `path`."""
+        raise NotImplementedError
+
+    def set_and_apply_delta(self, path, name, value, parent_paths):
+        """Atomically stores `value` for `name` in `path`, and applies its
+        difference with the value previously stored there to `name` in all
+        `parent_paths`.
+
+        Parents are updated either all or none, so their values never
+        reflect only part of the changes of `path`.
+
+        :return: `True` if parent values are up-to-date, `False` if there
+            was no previous value to get the difference from, or no value
+            stored in some parent to apply it to.
+        """
+        raise NotImplementedError
+
+
+class KeyStatsBackend(StatsBackend):
+    """Stores each `(path, name)` pair as a separate pickled cache key."""
+
+    def __init__(self):
+        self.cache = get_cache("stats")
+
+    @staticmethod
+    def make_key(path, name):
+        return iri_to_uri("%s:%s" % (path, name))
+
+    def get(self, path, name):
+        return self.cache.get(self.make_key(path, name))
+
+    def get_many(self, paths, names):
+        keys = {
+            self.make_key(path, name): (path, name) for path in paths for name in names
+        }
+        values = self.cache.get_many(list(keys.keys()))
+
+        result = {path: {} for path in paths}
+        for key, (path, name) in keys.items():
+            result[path][name] = values.get(key)
+
+        return result
+
+    def set(self, path, name, value):
+        return self.cache.set(self.make_key(path, name), value, None)
+
+    def set_many(self, path, mapping):
+        self.cache.set_many(
+            {self.make_key(path, name): value for name, value in mapping.items()}, None,
+        )
+
+    def set_many_paths(self, values):
+        self.cache.set_many(
+            {
+                self.make_key(path, name): value
+                for path, mapping in values.items()
+                for name, value in mapping.items()
+            },
+            None,
+        )
+
+    def delete(self, path, names):
+        keys = [self.make_key(path, name) for name in names]
+        if keys:
+            self.cache.delete_many(keys)
+
+    def set_and_apply_delta(self, path, name, value, parent_paths):
+        client = self.cache.client
+        keys = [
+            client.make_key(self.make_key(key_path, name))
+            for key_path in [path] + list(parent_paths)
+        ]
+
+        with client.get_client(write=True).pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*keys)
+                    values = [pipe.get(key) for key in keys]
+                    values = [v if v is None else client.decode(v) for v in values]
+                    updates = {keys[0]: value}
+                    propagated = None not in values
+                    delta = None
+                    if propagated:
+                        delta = get_stats_delta(values[0], value)
+                    if delta is not None:
+                        for key, parent_value in zip(keys[1:], values[1:]):
+                            updates[key] = apply_stats_delta(parent_value, delta)
+
+                    pipe.multi()
+                    for key, key_value in updates.items():
+                        pipe.set(key, client.encode(key_value))
+                    pipe.execute()
+                    return propagated
+                except WatchError:
+                    continue
+
+
+class StatsJSONEncoder(json.JSONEncoder):
+    """Encodes stats values, keeping datetimes round-trippable."""
+
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            return {"__datetime__": obj.isoformat()}
+
+        return force_str(obj)
+
+
+def _decode_stats_object(obj):
+    if "__datetime__" in obj:
+        return datetime.datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class HashStatsBackend(StatsBackend):
+    """Stores all stats for a path in a single Redis hash.
+
+    Hash fields are the stat names, and values are serialized as JSON.
+    """
+
+    KEY_PREFIX = "pootle:stats:path:"
+
+    def __init__(self):
+        self.connection = get_redis_connection("stats")
+
+    @classmethod
+    def make_key(cls, path):
+        return cls.KEY_PREFIX + iri_to_uri(path)
+
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value, cls=StatsJSONEncoder, separators=(",", ":"))
+
+    @staticmethod
+    def loads(data):
+        if data is None:
+            return None
+        return json.loads(data, object_hook=_decode_stats_object)
+
+    def get(self, path, name):
+        return self.loads(self.connection.hget(self.make_key(path), name))
+
+    def get_many(self, paths, names):
+        names = list(names)
+        pipe = self.connection.pipeline(transaction=False)
+        for path in paths:
+            pipe.hmget(self.make_key(path), names)
+
+        return {
+            path: {name: self.loads(value) for name, value in zip(names, values)}
+            for path, values in zip(paths, pipe.execute())
+        }
+
+    def get_all(self, path):
+        """Gets all stored values for `path` with a single HGETALL."""
+        return {
+            force_str(name): self.loads(value)
+            for name, value in self.connection.hgetall(self.make_key(path)).items()
+        }
+
+    def set(self, path, name, value):
+        if value is None:
+            return self.delete(path, [name])
+        return self.connection.hset(self.make_key(path), name, self.dumps(value))
+
+    def set_many(self, path, mapping):
+        """Stores all values in `mapping` for `path` at once."""
+        self.set_many_paths({path: mapping})
+
+    def set_many_paths(self, values):
+        pipe = self.connection.pipeline(transaction=False)
+        for path, mapping in values.items():
+            key = self.make_key(path)
+            for name, value in mapping.items():
+                pipe.hset(key, name, self.dumps(value))
+        pipe.execute()
+
+    def delete(self, path, names):
+        names = list(names)
+        if names:
+            self.connection.hdel(self.make_key(path), *names)
+
+    def set_and_apply_delta(self, path, name, value, parent_paths):
+        if value is None:
+            self.set(path, name, value)
+            return False
+
+        keys = [self.make_key(key_path) for key_path in [path] + list(parent_paths)]
+        with self.connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*keys)
+                    values = [self.loads(pipe.hget(key, name)) for key in keys]
+                    updates = {keys[0]: value}
+                    propagated = None not in values
+                    delta = None
+                    if propagated:
+                        delta = get_stats_delta(values[0], value)
+                    if delta is not None:
+                        for key, parent_value in zip(keys[1:], values[1:]):
+                            updates[key] = apply_stats_delta(parent_value, delta)
+
+                    pipe.multi()
+                    for key, key_value in updates.items():
+                        pipe.hset(key, name, self.dumps(key_value))
+                    pipe.execute()
+                    return propagated
+                except WatchError:
+                    continue
@@ -35,3 +35,13 @@ def rq_workers_are_running():
         if len(queue.connection.smembers(Worker.redis_workers_keys)):
             return True
     return False
+
+
+class SchedulerWorker(Worker):
+    """RQ worker which also runs the RQ scheduler, enqueueing jobs
+    scheduled for later execution (e.g. debounced stats update jobs).
+    """
+
+    def work(self, *args, **kwargs):
+        kwargs.setdefault("with_scheduler", True)
+        return super().work(*args, **kwargs)
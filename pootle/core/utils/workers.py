@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import multiprocessing
+
+from django.db import connections
+
+
+#: State shared with worker processes
+_worker_state = None
+
+
+def _init_worker(state):
+    global _worker_state
+    _worker_state = state
+
+
+def get_worker_state():
+    """Returns the `state` the current worker process was started with by
+    `run_in_workers()`.
+    """
+    return _worker_state
+
+
+def run_in_workers(func, items, processes, state=None):
+    """Runs `func` over each of `items` spread across `processes` forked
+    worker processes, which can get `state` via `get_worker_state()`.
+
+    :return: iterator yielding the results of `func` as they complete.
+    """
+    # Worker processes need to open their own DB connections
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes, initializer=_init_worker, initargs=(state,)) as pool:
+        yield from pool.imap_unordered(func, items)
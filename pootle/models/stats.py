@@ -8,14 +8,11 @@
 
 import logging
 
-from django.utils.encoding import iri_to_uri
-
-from pootle.core.cache import get_cache
 from pootle.core.mixins.treeitem import CachedMethods
+from pootle.core.stats import get_stats_backend
 
 
 logger = logging.getLogger("stats")
-cache = get_cache("stats")
 
 
 class Stats(object):
@@ -65,15 +62,11 @@ class Stats(object):
     def last_updated(self):
         return self.get_value(CachedMethods.LAST_UPDATED)
 
-    def make_cache_key(self, name):
-        return iri_to_uri("%s:%s" % (self.path, name))
-
     def get_value(self, name, default=None):
         """get stat value from cache"""
-        key = self.make_cache_key(name)
-        result = cache.get(key)
+        result = get_stats_backend().get(self.path, str(name))
         if result is None:
-            logger.debug(u"Cache miss %s for %s", name, key)
+            logger.debug(u"Cache miss %s for %s", name, self.path)
             return default
 
         return result
@@ -24,6 +24,7 @@ class UnitsList {
     this.visibleRowsBefore = 10;
     this.visibleRowsAfter = 31;
     this.prefetchRows = 5; // extra rows around visible ones
+    this.tmPrefetchRows = 5; // upcoming units to look up TM results for
 
     this.includeDisabled = false;
 
@@ -79,9 +80,17 @@ class UnitsList {
   }
 
   fetchFullUnitData(uid) {
-    return UnitAPI.fetchFullUnitData(uid, this.includeDisabled).then(
-      (data) => data
-    );
+    const idx = this.uids.indexOf(uid);
+    let tmPrefetchUids = [];
+    // Units out of the list have no upcoming units to prefetch TM results for
+    if (idx !== -1) {
+      tmPrefetchUids = this.uids.slice(idx + 1, idx + 1 + this.tmPrefetchRows);
+    }
+    return UnitAPI.fetchFullUnitData(
+      uid,
+      this.includeDisabled,
+      tmPrefetchUids
+    ).then((data) => data);
   }
 
   handleUnitChange(uid) {
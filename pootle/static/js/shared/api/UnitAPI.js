@@ -26,11 +26,14 @@ const UnitAPI = {
     });
   },
 
-  fetchFullUnitData(uId, includeDisabled = false) {
+  fetchFullUnitData(uId, includeDisabled = false, tmPrefetchUids = []) {
     const body = {};
     if (includeDisabled) {
       body.all = '';
     }
+    if (tmPrefetchUids.length) {
+      body.tm_prefetch = tmPrefetchUids.join(',');
+    }
     return fetch({
       body,
       queue: 'unitWidget',
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import glob
+import logging
+import os
+import time
+
+import pytest
+from translate.storage import factory
+
+from pootle.core.checks.checker import CheckableUnit
+from pootle_misc.checks import ENChecker, run_given_filters, source_fingerprints
+from pootle_store.fields import to_db
+
+
+LANGUAGES = ["lang%d" % i for i in range(200)]
+
+logger = logging.getLogger(__name__)
+
+
+def get_po_units():
+    po_dir = os.path.join(os.path.dirname(__file__), "..", "data", "po")
+    units = []
+    for path in sorted(glob.glob(os.path.join(po_dir, "**", "*.po"), recursive=True)):
+        with open(path, "rb") as f:
+            store = factory.getobject(f)
+        for unit in store.units:
+            if unit.isheader() or not unit.istranslated():
+                continue
+            units.append(
+                {
+                    "source_f": to_db(unit.source),
+                    "target_f": to_db(unit.target),
+                    "locations": "\n".join(unit.getlocations()),
+                }
+            )
+    return units
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("cached", [False, True])
+def test_enchecker_throughput(cached):
+    """Runs all `ENChecker` checks over the units in `tests/data/po` once per
+    language, as `calculate_checks` does for sources shared across TPs.
+    """
+    checker = ENChecker()
+    check_names = sorted(checker.defaultfilters)
+    units = get_po_units()
+    assert units
+
+    source_fingerprints.clear()
+    start = time.perf_counter()
+    for language_code in LANGUAGES:
+        for values in units:
+            if not cached:
+                source_fingerprints.clear()
+            unit = CheckableUnit(
+                dict(values, store__translation_project__language__code=language_code)
+            )
+            run_given_filters(checker, unit, check_names)
+    elapsed = time.perf_counter() - start
+
+    total = len(LANGUAGES) * len(units) * len(check_names)
+    logger.info(
+        "cached=%s: %d checks in %.3fs (%.0f checks/s)",
+        cached,
+        total,
+        elapsed,
+        total / elapsed,
+    )
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import itertools
+import logging
+import random
+import time
+
+import pytest
+
+from pootle.core.search.backends.embedded import EmbeddedTMBackend
+from pootle_store.constants import TRANSLATED
+from pootle_store.models import Unit
+
+
+LOOKUPS = 100
+#: Units indexed per `update_many()` call, as `update_tmserver` does
+INDEX_BATCH_SIZE = 5000
+#: Median lookup latency to stay under, in seconds
+MAX_MEDIAN_LATENCY = 0.05
+#: Share of lookups to find the looked up text among the matches of, as texts
+#: sharing nothing but frequent n-grams with others can be missed
+MIN_RECALL = 0.95
+VOCABULARY_SIZE = 5000
+SYLLABLES = [c + v for c in "bcdfghjklmnprstvwz" for v in "aeiou"]
+
+logger = logging.getLogger(__name__)
+
+
+def get_vocabulary(rng):
+    """Returns words and their cumulative weights, which follow Zipf's law as
+    in natural language so that some n-grams are shared by most texts.
+    """
+    words = [
+        "".join(rng.choice(SYLLABLES) for i in range(rng.randint(1, 4)))
+        for i in range(VOCABULARY_SIZE)
+    ]
+    cum_weights = list(
+        itertools.accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1))
+    )
+    return words, cum_weights
+
+
+def get_text(rng, vocabulary):
+    words, cum_weights = vocabulary
+    return " ".join(
+        rng.choices(words, cum_weights=cum_weights, k=rng.randint(3, 10))
+    ).capitalize()
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("indexed_texts", [2000, 20000, 200000])
+def test_embedded_tm_lookup_latency(settings, store0, indexed_texts):
+    """Looks up source texts similar to indexed ones in an index of
+    `indexed_texts` synthetic units.
+    """
+    settings.ZING_TM_SERVER = {
+        "ENGINE": "pootle.core.search.backends.embedded.EmbeddedTMBackend",
+    }
+    backend = EmbeddedTMBackend()
+    language = store0.translation_project.language.code
+
+    rng = random.Random(0)
+    vocabulary = get_vocabulary(rng)
+    texts = [get_text(rng, vocabulary) for i in range(indexed_texts)]
+    first_index = store0.max_index() + 1
+    for offset in range(0, indexed_texts, INDEX_BATCH_SIZE):
+        Unit.objects.bulk_create(
+            [
+                Unit(
+                    store=store0,
+                    index=first_index + i,
+                    unitid="unit-%d" % i,
+                    unitid_hash="unit-%d" % i,
+                    source_f=text,
+                    target_f=text.upper(),
+                    state=TRANSLATED,
+                    revision=i + 1,
+                )
+                for i, text in enumerate(
+                    texts[offset : offset + INDEX_BATCH_SIZE], offset
+                )
+            ]
+        )
+        units = store0.unit_set.filter(
+            index__gte=first_index + offset,
+            index__lt=first_index + offset + INDEX_BATCH_SIZE,
+        ).values("id", "source_f", "revision")
+        backend.update_many(
+            language,
+            [
+                {
+                    "id": unit["id"],
+                    "source": unit["source_f"],
+                    "revision": unit["revision"],
+                }
+                for unit in units
+            ],
+        )
+
+    # Similar, but mostly not identical, texts
+    lookups = []
+    for i in range(LOOKUPS):
+        text = rng.choice(texts)
+        lookups.append((text, text + rng.choice(["", ".", "s", "!"])))
+
+    timings = []
+    found = 0
+    for text, source in lookups:
+        start = time.perf_counter()
+        matches = backend.get_matches(language, [source])[0]
+        timings.append(time.perf_counter() - start)
+
+        found += text in [match["source"] for match in matches]
+        assert all(match["target"] == match["source"].upper() for match in matches)
+
+    timings.sort()
+    median = timings[len(timings) // 2]
+    logger.info(
+        "%d indexed texts: %d lookups, %d found, median %.2fms, p99 %.2fms",
+        indexed_texts,
+        LOOKUPS,
+        found,
+        median * 1000,
+        timings[int(len(timings) * 0.99)] * 1000,
+    )
+    assert found >= MIN_RECALL * LOOKUPS
+    assert median < MAX_MEDIAN_LATENCY
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import difflib
+import logging
+import time
+
+import pytest
+
+from pootle_store.diff import get_opcodes
+
+
+STORE_SIZE = 50000
+
+logger = logging.getLogger(__name__)
+
+
+def get_uids(start, stop):
+    return ["unit-%d" % i for i in range(start, stop)]
+
+
+SCENARIOS = {
+    "unchanged": lambda uids: list(uids),
+    "appended": lambda uids: uids + get_uids(STORE_SIZE, STORE_SIZE + 100),
+    "removed_tail": lambda uids: uids[:-100],
+    "inserted_middle": lambda uids: (
+        uids[: STORE_SIZE // 2]
+        + get_uids(STORE_SIZE, STORE_SIZE + 100)
+        + uids[STORE_SIZE // 2 :]
+    ),
+    "removed_scattered": lambda uids: [
+        uid for i, uid in enumerate(uids) if i % 1000 != 500
+    ],
+}
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_store_diff_opcodes(scenario):
+    """Compares `get_opcodes()` with running `SequenceMatcher` over the whole
+    unit ID lists of a synthetic 50k-unit store.
+    """
+    old_uids = get_uids(0, STORE_SIZE)
+    new_uids = SCENARIOS[scenario](old_uids)
+
+    start = time.perf_counter()
+    expected = difflib.SequenceMatcher(None, old_uids, new_uids).get_opcodes()
+    matcher_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    opcodes = get_opcodes(old_uids, new_uids)
+    elapsed = time.perf_counter() - start
+
+    assert opcodes == expected
+    logger.info(
+        "%s: SequenceMatcher %.4fs, get_opcodes %.4fs",
+        scenario,
+        matcher_elapsed,
+        elapsed,
+    )
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from rq.job import Job
+
+from django_rq.queues import get_queue
+
+from pootle.core.mixins.treeitem import (
+    KEY_STATS_JOB_COUNTERS,
+    JobWrapper,
+    create_update_cache_job,
+    get_update_cache_job_stats,
+)
+
+
+SUBMISSIONS_PER_PRODUCER = 50
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("producers", [1, 4, 16])
+def test_create_update_cache_job_contention(store0, producers):
+    """Concurrent producers submitting stats updates for the same store end
+    up with a single job, with no retries needed.
+    """
+    queue = get_queue("default", is_async=True)
+    r_con = queue.connection
+    last_job_key = store0.get_last_job_key()
+    r_con.delete(last_job_key, KEY_STATS_JOB_COUNTERS)
+
+    def produce(i):
+        timings = []
+        for j in range(SUBMISSIONS_PER_PRODUCER):
+            start = time.perf_counter()
+            create_update_cache_job(queue, store0, {"get_mtime"})
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=producers) as executor:
+        timings = sorted(sum(executor.map(produce, range(producers)), []))
+    elapsed = time.perf_counter() - start
+
+    total = producers * SUBMISSIONS_PER_PRODUCER
+    stats = get_update_cache_job_stats(queue)
+    assert stats["created"] == 1
+    assert stats["merged"] == total - 1
+
+    job_id = r_con.get(last_job_key).decode()
+    assert JobWrapper(job_id, r_con).get_job_params() == ({"get_mtime"}, total)
+
+    logger.info(
+        "%d producers: %d submissions in %.3fs (%.0f/s), median %.2fms, p99 %.2fms",
+        producers,
+        total,
+        elapsed,
+        total / elapsed,
+        timings[len(timings) // 2] * 1000,
+        timings[int(len(timings) * 0.99)] * 1000,
+    )
+
+    queue.remove(job_id)
+    r_con.delete(
+        last_job_key,
+        KEY_STATS_JOB_COUNTERS,
+        Job.key_for(job_id),
+        JobWrapper.params_key_for(job_id),
+    )
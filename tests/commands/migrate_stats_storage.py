@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from django.core.management import call_command
+
+from pootle.core.mixins.treeitem import CachedMethods
+from pootle.core.stats import HashStatsBackend, KeyStatsBackend
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+@pytest.mark.parametrize("keep_keys", [False, True])
+def test_migrate_stats_storage(capfd, tp0, keep_keys):
+    for store in tp0.stores.live().iterator():
+        store.update_all_cache()
+
+    key_backend = KeyStatsBackend()
+    hash_backend = HashStatsBackend()
+    names = CachedMethods.get_all()
+    expected = key_backend.get_many([tp0.pootle_path], names)[tp0.pootle_path]
+    all_keys = list(key_backend.cache.iter_keys("*:get_*"))
+    all_values = key_backend.cache.get_many(all_keys)
+
+    args = ["--keep-keys"] if keep_keys else []
+    call_command("migrate_stats_storage", *args)
+    out, err = capfd.readouterr()
+    assert "Converted stats for" in out
+
+    assert hash_backend.get_all(tp0.pootle_path) == expected
+    kept = key_backend.get_many([tp0.pootle_path], names)[tp0.pootle_path]
+    if keep_keys:
+        assert kept == expected
+    else:
+        assert set(kept.values()) == {None}
+
+    # Restore the original layout for the rest of the test session
+    key_backend.cache.set_many(all_values, None)
+    hash_backend.connection.delete(
+        *hash_backend.connection.keys(HashStatsBackend.KEY_PREFIX + "*")
+    )
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from django.core.management.base import CommandError
+
+from pootle.core.utils.workers import _init_worker
+from pootle_app.management.commands import PootleCommand, _run_translation_project
+
+
+class DummyCommand(PootleCommand):
+    name = "dummy"
+
+    def __init__(self, *args, **kwargs):
+        self.processed = []
+        super().__init__(*args, **kwargs)
+
+    def handle_all_stores(self, translation_project, **options):
+        if options["fail"]:
+            raise ValueError("failed")
+        self.processed.append(translation_project.pootle_path)
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_pootle_command_get_translation_projects(project0, language0):
+    command = DummyCommand()
+    command.projects = [project0.code]
+    command.languages = [language0.code]
+
+    assert [tp.pootle_path for tp in command.get_translation_projects()] == [
+        "/%s/%s/" % (language0.code, project0.code)
+    ]
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+@pytest.mark.parametrize("fail", [False, True])
+def test_pootle_command_run_translation_project(tp0, fail):
+    """Worker processes report the outcome of running over each TP."""
+    command = DummyCommand()
+    _init_worker((command, {"fail": fail}))
+
+    pootle_path, success, elapsed = _run_translation_project((tp0.id, tp0.pootle_path))
+    assert pootle_path == tp0.pootle_path
+    assert success is not fail
+    assert elapsed >= 0
+    assert command.processed == ([] if fail else [tp0.pootle_path])
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_pootle_command_run_missing_translation_project(tp0):
+    """Errors outside the command's handlers fail the TP being run only."""
+    command = DummyCommand()
+    _init_worker((command, {"fail": False}))
+
+    pootle_path, success, elapsed = _run_translation_project((-1, "/missing/"))
+    assert pootle_path == "/missing/"
+    assert success is False
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_pootle_command_handle_all_failures(tp0, jobs):
+    """TPs are run serially or across worker processes, with failed ones
+    reported the same way once all of them have been run.
+    """
+    options = {"no_rq": False, "jobs": jobs}
+    tps = list(DummyCommand().get_translation_projects())
+    DummyCommand().handle_all(fail=False, **options)
+
+    with pytest.raises(CommandError) as e:
+        DummyCommand().handle_all(fail=True, **options)
+    assert str(e.value) == "Failed to run dummy over: %s" % ", ".join(
+        sorted(tp.pootle_path for tp in tps)
+    )
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from django.core.management import call_command
+
+from pootle.core.mixins.treeitem import CachedMethods
+from pootle.core.stats import get_stats_backend
+from pootle_app.models import Directory
+from pootle_store.models import Store
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_refresh_stats_bulk(project0, jobs):
+    """Bulk stats match the ones calculated by per-store jobs, also when
+    spreading TPs across processes.
+    """
+    call_command("refresh_stats", "--project=project0")
+
+    backend = get_stats_backend()
+    names = CachedMethods.get_all()
+    paths = [project0.pootle_path]
+    paths += [tp.pootle_path for tp in project0.translationproject_set.live()]
+    paths += (
+        Directory.objects.live()
+        .filter(pootle_path__regex=r"^/[^/]+/%s/" % project0.code)
+        .values_list("pootle_path", flat=True)
+    )
+    paths += (
+        Store.objects.live()
+        .filter(translation_project__project=project0)
+        .values_list("pootle_path", flat=True)
+    )
+    expected = backend.get_many(paths, names)
+    assert all(value is not None for path in paths for value in expected[path].values())
+
+    for path in paths:
+        backend.delete(path, names)
+
+    call_command("refresh_stats", "--bulk", "--project=project0", "--jobs=%d" % jobs)
+    assert backend.get_many(paths, names) == expected
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from pootle_store.unit.textsearch import SQLiteUnitTextSearch
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_text_search_index(capfd, settings):
+    settings.ZING_TEXT_SEARCH_BACKEND = (
+        "pootle_store.unit.textsearch.SQLiteUnitTextSearch"
+    )
+    call_command("text_search_index")
+    out, err = capfd.readouterr()
+    assert "Created the text search index" in out
+    assert SQLiteUnitTextSearch.table_name in connection.introspection.table_names()
+
+    call_command("text_search_index", "--drop")
+    out, err = capfd.readouterr()
+    assert "Dropped the text search index" in out
+    assert SQLiteUnitTextSearch.table_name not in connection.introspection.table_names()
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_text_search_index_not_indexed():
+    with pytest.raises(CommandError) as e:
+        call_command("text_search_index")
+    assert "doesn't use an index" in str(e.value)
@@ -12,6 +12,8 @@ import pytest
 from django.core.management import call_command
 from django.core.management.base import CommandError
 
+from pootle.core.search import SearchBackend
+
 
 @pytest.mark.cmd
 @pytest.mark.django_db
@@ -41,3 +43,167 @@ def __test_update_tmserver_noargs(capfd, tp0, settings):
     assert "Last indexed revision = -1" in out
 
     assert ("%d translations to index" % units_qs.count()) in out
+
+
+class DummyTMBackend(SearchBackend):
+    """Records the translations added to it, optionally failing after
+    `fail_after` chunks have been added.
+    """
+
+    indexed = []
+    fail_after = None
+
+    def update_many(self, language, objs):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise RuntimeError("TM server went away")
+            DummyTMBackend.fail_after -= 1
+        self.indexed.extend(objs)
+
+    def get_indexed_revisions(self, languages):
+        return {}
+
+    def delete_all(self):
+        pass
+
+
+@pytest.fixture
+def dummy_tm(settings, monkeypatch):
+    from pootle_app.management.commands.update_tmserver import Checkpoints
+
+    settings.ZING_TM_SERVER = {"ENGINE": "%s.DummyTMBackend" % __name__}
+    monkeypatch.setattr(DummyTMBackend, "indexed", [])
+    monkeypatch.setattr(DummyTMBackend, "fail_after", None)
+    Checkpoints().clear()
+    yield DummyTMBackend
+    Checkpoints().clear()
+
+
+@pytest.mark.django_db
+def test_update_tmserver_get_units(tp0):
+    """Units are retrieved per language, after the given position."""
+    from pootle_app.management.commands.update_tmserver import DBParser
+
+    parser = DBParser(stdout=None, disabled_projects=False)
+    language_code = tp0.language.code
+    units, total = parser.get_units(language_code, (-1, 0))
+    units = list(units)
+    assert total == len(units) > 2
+    assert all(
+        unit["store__translation_project__language__code"] == language_code
+        for unit in units
+    )
+    positions = [(unit["revision"], unit["id"]) for unit in units]
+    assert positions == sorted(positions)
+
+    units_after, total_after = parser.get_units(language_code, positions[1])
+    assert total_after == total - 2
+    assert [unit["id"] for unit in units_after] == [unit["id"] for unit in units[2:]]
+
+
+@pytest.mark.django_db
+def test_update_tmserver_checkpoints():
+    from pootle_app.management.commands.update_tmserver import Checkpoints
+
+    checkpoints = Checkpoints()
+    checkpoints.clear()
+    assert checkpoints.get_all() == {}
+
+    checkpoints.set("language0", 12, 34)
+    checkpoints.set_done("language1")
+    assert checkpoints.get_all() == {
+        "language0": (12, 34),
+        "language1": Checkpoints.DONE,
+    }
+
+    checkpoints.clear()
+    assert checkpoints.get_all() == {}
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_update_tmserver_resume(capfd, dummy_tm):
+    """An interrupted rebuild resumes from the last indexed chunk."""
+    from pootle_app.management.commands.update_tmserver import Checkpoints
+    from pootle_store.models import Unit
+
+    unit_ids = set(
+        Unit.objects.exclude(target_f__isnull=True)
+        .exclude(target_f__exact="")
+        .exclude(store__translation_project__project__disabled=True)
+        .values_list("id", flat=True)
+    )
+
+    dummy_tm.fail_after = 1
+    with pytest.raises(RuntimeError):
+        call_command("update_tmserver", "--rebuild", "--chunk-size=2")
+    indexed_ids = [obj["id"] for obj in dummy_tm.indexed]
+    assert len(indexed_ids) == 2
+    language_code, position = Checkpoints().get_all().popitem()
+    assert position == (dummy_tm.indexed[1]["revision"], indexed_ids[1])
+
+    dummy_tm.fail_after = None
+    call_command("update_tmserver", "--rebuild", "--chunk-size=2")
+    out, err = capfd.readouterr()
+    assert "Resuming interrupted run" in out
+    assert ("Indexed %d translations" % (len(unit_ids) - 2)) in out
+
+    indexed_ids = [obj["id"] for obj in dummy_tm.indexed]
+    assert len(indexed_ids) == len(unit_ids)
+    assert set(indexed_ids) == unit_ids
+    assert Checkpoints().get_all() == {}
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_update_tmserver_dry_run(capfd, dummy_tm):
+    from pootle_store.models import Unit
+
+    total = (
+        Unit.objects.exclude(target_f__isnull=True)
+        .exclude(target_f__exact="")
+        .exclude(store__translation_project__project__disabled=True)
+        .count()
+    )
+    call_command("update_tmserver", "--rebuild", "--dry-run")
+    out, err = capfd.readouterr()
+    assert ("%d translations to index" % total) in out
+    assert dummy_tm.indexed == []
+
+
+@pytest.mark.cmd
+@pytest.mark.django_db
+def test_update_tmserver_workers(capfd, dummy_tm, monkeypatch):
+    """Languages are indexed by worker processes, which checkpoint their
+    progress in Redis.
+    """
+    from pootle_app.management.commands.update_tmserver import Checkpoints
+    from pootle_language.models import Language
+    from pootle_store.models import Unit
+
+    units = (
+        Unit.objects.exclude(target_f__isnull=True)
+        .exclude(target_f__exact="")
+        .exclude(store__translation_project__project__disabled=True)
+    )
+    language_codes = set(
+        units.values_list("store__translation_project__language__code", flat=True)
+    )
+    assert len(language_codes) > 1
+
+    # Keep the checkpoints of the run around to check them
+    monkeypatch.setattr(Checkpoints, "clear", lambda self: None)
+    call_command("update_tmserver", "--rebuild", "--workers=2", "--chunk-size=2")
+    out, err = capfd.readouterr()
+
+    assert Checkpoints().get_all() == {
+        code: Checkpoints.DONE
+        for code in Language.objects.values_list("code", flat=True)
+    }
+    for code in language_codes:
+        count = units.filter(store__translation_project__language__code=code).count()
+        assert ("] %s: indexed %d translations in" % (code, count)) in out
+    assert ("Indexed %d translations in" % units.count()) in out
+
+    monkeypatch.undo()
+    Checkpoints().clear()
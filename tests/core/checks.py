@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from pootle.core.checks.checker import (
+    FailedStoreRangesError,
+    QualityCheckUpdater,
+    _update_translated_store_range,
+)
+from pootle.core.utils.workers import _init_worker
+from pootle_store.constants import OBSOLETE
+from pootle_store.models import QualityCheck
+
+
+def _get_checks(tp):
+    return set(
+        QualityCheck.objects.filter(unit__store__translation_project=tp).values_list(
+            "unit", "name", "category", "false_positive"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_quality_check_updater_get_store_ranges(tp0):
+    updater = QualityCheckUpdater(translation_project=tp0)
+    store_ranges = updater.get_store_ranges(size=10)
+    assert len(store_ranges) > 1
+
+    store_ids = sorted(
+        set(updater.units.filter(state__gte=OBSOLETE).values_list("store", flat=True))
+    )
+    assert store_ranges[0][0] == store_ids[0]
+    assert store_ranges[-1][1] == store_ids[-1]
+    for (first, last), (next_first, next_last) in zip(store_ranges, store_ranges[1:]):
+        assert first <= last < next_first <= next_last
+
+
+@pytest.mark.django_db
+def test_quality_check_updater_store_ranges(monkeypatch, tp0):
+    """Updating checks by store ranges in small chunks results in the same
+    checks as a full update.
+    """
+    monkeypatch.setattr("pootle.core.checks.checker.CHECK_UPDATE_CHUNK_SIZE", 3)
+
+    QualityCheckUpdater(translation_project=tp0, keep_false_positives=False).update()
+    expected = _get_checks(tp0)
+    assert expected
+
+    checks = QualityCheck.objects.filter(unit__store__translation_project=tp0)
+    unit = checks.first().unit
+    checks.filter(id__in=list(checks.values_list("id", flat=True)[:5])).delete()
+    checks.filter(id=checks.last().id).update(false_positive=True)
+    QualityCheck.objects.create(unit=unit, name="bogus_check", category=0)
+    assert _get_checks(tp0) != expected
+
+    updater = QualityCheckUpdater(translation_project=tp0, keep_false_positives=False)
+    _init_worker((None, tp0.pk, False))
+    updated_count = 0
+    for store_range in updater.get_store_ranges(size=10):
+        result = _update_translated_store_range(store_range)
+        assert result[:2] == (store_range, True)
+        updated_count += result[2]
+
+    assert 1 < updated_count <= 7
+    assert _get_checks(tp0) == expected
+
+
+@pytest.mark.django_db
+def test_quality_check_updater_store_range_failure(tp0):
+    """Errors updating a range of stores fail that range only."""
+    _init_worker((None, -1, False))
+    store_range, success, updated_count, elapsed = _update_translated_store_range(
+        (1, 2)
+    )
+    assert store_range == (1, 2)
+    assert success is False
+    assert updated_count == 0
+
+
+@pytest.mark.django_db
+def test_quality_check_updater_in_pool(monkeypatch, tp0):
+    """Store ranges are updated across worker processes, with failed ones
+    reported once all of them have been processed.
+    """
+    updater = QualityCheckUpdater(translation_project=tp0)
+    store_ranges = updater.get_store_ranges(size=10)
+    assert len(store_ranges) > 1
+    monkeypatch.setattr(
+        QualityCheckUpdater, "get_store_ranges", lambda self: store_ranges
+    )
+    assert updater.update_translated_in_pool(2) == updater.update_translated()
+
+    def update_translated(self):
+        if self.store_range == store_ranges[0]:
+            raise ValueError("failed")
+        return 0
+
+    monkeypatch.setattr(QualityCheckUpdater, "update_translated", update_translated)
+    with pytest.raises(FailedStoreRangesError) as e:
+        QualityCheckUpdater(translation_project=tp0).update_translated_in_pool(2)
+    assert e.value.store_ranges == [store_ranges[0]]
+
+
+@pytest.mark.django_db
+def test_quality_check_updater_iter_unit_checks(tp0):
+    """Existing checks are streamed grouped by unit, in unit order."""
+    updater = QualityCheckUpdater(translation_project=tp0)
+    unit_checks = list(updater.iter_unit_checks())
+
+    keys = [key for key, checks in unit_checks]
+    assert keys == sorted(set(keys))
+
+    checks = QualityCheck.objects.filter(unit__store__translation_project=tp0)
+    assert {
+        (key, name, check["id"])
+        for key, unit_checks in unit_checks
+        for name, check in unit_checks.items()
+    } == {
+        ((check.unit.store_id, check.unit.index, check.unit_id), check.name, check.id)
+        for check in checks.select_related("unit")
+    }
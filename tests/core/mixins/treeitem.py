@@ -8,13 +8,32 @@
 # AUTHORS file for copyright and authorship information.
 
 import pytest
-
-from pootle.core.mixins.treeitem import CachedMethods, CachedTreeItem
+from rq.job import Job, JobStatus
+from rq.registry import DeferredJobRegistry, ScheduledJobRegistry
+
+from django.utils import timezone
+
+from django_rq.queues import get_queue
+
+from pootle.core.mixins.treeitem import (
+    KEY_STATS_JOB_COUNTERS,
+    CachedMethods,
+    CachedTreeItem,
+    JobWrapper,
+    NoCachedStats,
+    TreeItem,
+    create_update_cache_job,
+    get_update_cache_job_stats,
+    prefetched_stats,
+)
+from pootle.core.stats import KeyStatsBackend
 from pootle_app.models import Directory
 from pootle_project.models import Project
+from pootle_store.constants import TRANSLATED, UNTRANSLATED
 from pootle_store.models import Store
 from pootle_translationproject.models import TranslationProject
 
+
 ALL_CACHED_METHODS = [
     "get_checks",
     "get_last_action",
@@ -122,3 +141,275 @@ def test_get_parent(project0, language0, tp0, store0, subdir0):
 
     parent = language0.directory.get_parent()
     assert parent is None
+
+
+def _update_stats(tp):
+    for store in tp.stores.live().iterator():
+        store.update_all_cache()
+
+
+@pytest.mark.django_db
+def test_prefetched_stats_single_read(tp0, monkeypatch):
+    """All cached values for an item and its children are read at once."""
+    _update_stats(tp0)
+    items = [tp0] + list(tp0.children)
+    expected = {
+        item.pootle_path: {
+            name: item.get_cached_value(name) for name in CachedMethods.get_all()
+        }
+        for item in items
+    }
+
+    get_many_calls = []
+    orig_get_many = KeyStatsBackend.get_many
+
+    def _get_many(self, paths, names):
+        get_many_calls.append(paths)
+        return orig_get_many(self, paths, names)
+
+    def _get(self, path, name):
+        raise AssertionError("Unexpected single-key read for %s" % path)
+
+    monkeypatch.setattr(KeyStatsBackend, "get_many", _get_many)
+    monkeypatch.setattr(KeyStatsBackend, "get", _get)
+
+    with prefetched_stats(items):
+        for item in items:
+            for name in CachedMethods.get_all():
+                assert item.get_cached_value(name) == expected[item.pootle_path][name]
+
+    assert len(get_many_calls) == 1
+    assert all(item._prefetched_stats is None for item in items)
+
+
+def test_prefetched_stats_no_cached_stats():
+    """Missing values raise `NoCachedStats` when prefetched too."""
+    cti = CachedTreeItem()
+    cti.pootle_path = "/non/existing/path/"
+
+    with prefetched_stats([cti]):
+        assert cti._prefetched_stats is not None
+        with pytest.raises(NoCachedStats):
+            cti.get_cached(CachedMethods.WORDCOUNT_STATS)
+
+
+@pytest.mark.django_db
+def test_get_stats_matches_unbatched(tp0, language0):
+    """Batched `get_stats()` output is the same as per-key retrieval."""
+    _update_stats(tp0)
+
+    def _unbatched_stats(item):
+        result = {
+            "total": None,
+            "translated": None,
+            "fuzzy": None,
+            "suggestions": None,
+            "lastaction": None,
+            "critical": None,
+            "lastupdated": None,
+            "is_dirty": item.is_dirty(),
+        }
+        try:
+            result.update(item.get_cached(CachedMethods.WORDCOUNT_STATS))
+            result["suggestions"] = item.get_cached(CachedMethods.SUGGESTIONS)
+            result["lastaction"] = item.get_cached(CachedMethods.LAST_ACTION)
+            result["critical"] = item.get_error_unit_count()
+            result["lastupdated"] = item.get_cached(CachedMethods.LAST_UPDATED)
+        except NoCachedStats:
+            pass
+        return result
+
+    stats = tp0.get_stats()
+    children_stats = stats.pop("children")
+    assert stats == _unbatched_stats(tp0)
+    assert children_stats == [_unbatched_stats(item) for item in tp0.children]
+
+    language_stats = language0.get_stats()
+    assert language_stats["children"] == [
+        _unbatched_stats(item) for item in language0.children
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "stats_backend",
+    ["pootle.core.stats.KeyStatsBackend", "pootle.core.stats.HashStatsBackend"],
+)
+def test_update_cache_job_delta_propagation(
+    settings, subdir0, system, revision, monkeypatch, stats_backend
+):
+    """Store changes are applied to parents as deltas, without recalculating
+    their stats from their children.
+    """
+    settings.ZING_STATS_BACKEND = stats_backend
+    settings.ZING_STATS_DELTA_PROPAGATION = True
+
+    tp = subdir0.translation_project
+    for project_tp in tp.project.translationproject_set.all():
+        _update_stats(project_tp)
+
+    unit = subdir0.child_stores.first().units.filter(state=UNTRANSLATED).first()
+    store = unit.store
+
+    recalculated = []
+    orig_calc_wordcount_stats = TreeItem._calc_wordcount_stats
+
+    def _calc_wordcount_stats(self):
+        recalculated.append(self)
+        return orig_calc_wordcount_stats(self)
+
+    monkeypatch.setattr(TreeItem, "_calc_wordcount_stats", _calc_wordcount_stats)
+
+    unit.target = "Translated"
+    unit.submitted_by = system
+    unit.submitted_on = timezone.now()
+    unit.save()
+    store.update_dirty_cache()
+
+    assert unit.state == TRANSLATED
+    assert recalculated == [store]
+    monkeypatch.undo()
+
+    for item in [
+        Directory.objects.get(id=subdir0.id),
+        TranslationProject.objects.get(id=tp.id),
+        Project.objects.get(id=tp.project_id),
+    ]:
+        assert item.get_cached(CachedMethods.WORDCOUNT_STATS) == (
+            item._calc_wordcount_stats()
+        )
+        assert item.get_cached(CachedMethods.CHECKS) == item._calc_checks()
+        assert item.get_cached(CachedMethods.SUGGESTIONS) == (
+            item._calc_suggestion_count()
+        )
+
+
+@pytest.mark.django_db
+def test_create_update_cache_job_debounce(settings, store0):
+    """Submissions within the debounce window are merged into a single
+    scheduled job.
+    """
+    settings.ZING_STATS_JOB_DEBOUNCE = 2
+    queue = get_queue("default", is_async=True)
+    r_con = queue.connection
+    registry = ScheduledJobRegistry(queue.name, r_con)
+    last_job_key = store0.get_last_job_key()
+    r_con.delete(last_job_key, KEY_STATS_JOB_COUNTERS)
+    queue_count = queue.count
+
+    job = create_update_cache_job(queue, store0, {"get_mtime"})
+    assert job.get_status() == JobStatus.SCHEDULED
+    assert job.id in registry.get_job_ids()
+    assert queue.count == queue_count
+
+    assert create_update_cache_job(queue, store0, {"get_checks"}) is None
+    assert create_update_cache_job(queue, store0, {"get_mtime"}, decrement=2) is None
+    assert JobWrapper(job.id, r_con).get_job_params() == (
+        {"get_mtime", "get_checks"},
+        4,
+    )
+
+    stats = get_update_cache_job_stats(queue)
+    assert stats["created"] == 1
+    assert stats["merged"] == 2
+    assert stats["scheduled"] == len(registry)
+
+    registry.remove(job)
+    r_con.delete(
+        last_job_key,
+        KEY_STATS_JOB_COUNTERS,
+        Job.key_for(job.id),
+        JobWrapper.params_key_for(job.id),
+    )
+
+
+@pytest.mark.django_db
+def test_create_update_cache_job(store0):
+    """Jobs are enqueued, deferred or merged depending on the status of the
+    last job created for a tree item.
+    """
+    queue = get_queue("default", is_async=True)
+    r_con = queue.connection
+    last_job_key = store0.get_last_job_key()
+    r_con.delete(last_job_key)
+
+    job = create_update_cache_job(queue, store0, {"get_mtime"})
+    assert job.get_status() == JobStatus.QUEUED
+    assert job.id in queue.job_ids
+    assert JobWrapper(job.id, r_con).get_job_params() == ({"get_mtime"}, 1)
+    assert Job.fetch(job.id, r_con).args == (store0,)
+
+    r_con.hset(job.key, "status", JobStatus.STARTED)
+    deferred_job = create_update_cache_job(queue, store0, {"get_checks"})
+    assert deferred_job.get_status() == JobStatus.DEFERRED
+    assert deferred_job.id not in queue.job_ids
+    assert deferred_job.id in DeferredJobRegistry(queue.name, r_con).get_job_ids()
+    assert r_con.smembers(Job.dependents_key_for(job.id)) == {deferred_job.id.encode()}
+
+    assert create_update_cache_job(queue, store0, {"get_mtime"}, decrement=3) is None
+    assert JobWrapper(deferred_job.id, r_con).get_job_params() == (
+        {"get_mtime", "get_checks"},
+        4,
+    )
+
+    r_con.hset(deferred_job.key, "status", JobStatus.FINISHED)
+    new_job = create_update_cache_job(queue, store0, {"get_mtime"})
+    assert new_job.get_status() == JobStatus.QUEUED
+    assert r_con.get(last_job_key).decode() == new_job.id
+
+    for queued_job in [job, deferred_job, new_job]:
+        queue.remove(queued_job.id)
+        r_con.delete(queued_job.key, JobWrapper.params_key_for(queued_job.id))
+    DeferredJobRegistry(queue.name, r_con).remove(deferred_job)
+    r_con.delete(last_job_key, Job.dependents_key_for(job.id))
+
+
+@pytest.mark.django_db
+def test_create_update_cache_job_rq_roundtrip(store0):
+    """Jobs written by `UPDATE_CACHE_JOB_SCRIPT` are loaded by RQ as the jobs
+    it creates itself, and deferred ones are enqueued by RQ once the job
+    they depend on finishes.
+    """
+    queue = get_queue("default", is_async=True)
+    r_con = queue.connection
+    last_job_key = store0.get_last_job_key()
+    r_con.delete(last_job_key)
+
+    job = create_update_cache_job(queue, store0, {"get_mtime"})
+    rq_job = queue.enqueue_job(
+        JobWrapper.create(
+            job.func,
+            instance=store0,
+            keys={"get_mtime"},
+            decrement=1,
+            connection=r_con,
+            origin=queue.name,
+            timeout=queue.DEFAULT_TIMEOUT,
+        ).create_job()
+    )
+    assert set(r_con.hkeys(job.key)) == set(r_con.hkeys(rq_job.key))
+
+    fetched_job = Job.fetch(job.id, r_con)
+    assert fetched_job.get_status() == JobStatus.QUEUED
+    assert fetched_job.func_name == rq_job.func_name
+    assert fetched_job.args == (store0,)
+    assert fetched_job.origin == queue.name
+    assert fetched_job.timeout == queue.DEFAULT_TIMEOUT
+    assert fetched_job.enqueued_at is not None
+
+    r_con.hset(job.key, "status", JobStatus.STARTED)
+    deferred_job = create_update_cache_job(queue, store0, {"get_checks"})
+    fetched_deferred_job = Job.fetch(deferred_job.id, r_con)
+    assert fetched_deferred_job.get_status() == JobStatus.DEFERRED
+    assert fetched_deferred_job.dependency.id == job.id
+
+    fetched_job.set_status(JobStatus.FINISHED)
+    queue.enqueue_dependents(fetched_job)
+    assert Job.fetch(deferred_job.id, r_con).get_status() == JobStatus.QUEUED
+    assert deferred_job.id in queue.job_ids
+    assert deferred_job.id not in DeferredJobRegistry(queue.name, r_con).get_job_ids()
+
+    for queued_job in [job, rq_job, deferred_job]:
+        queue.remove(queued_job.id)
+        r_con.delete(queued_job.key, JobWrapper.params_key_for(queued_job.id))
+    r_con.delete(last_job_key)
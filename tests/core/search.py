@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+
+from pootle.core.search import SearchBroker
+from pootle.core.search.broker import TMResultCache, get_source_hash
+from pootle_store.constants import TRANSLATED
+
+
+@pytest.fixture
+def dummy_tm_broker(dummy_tm_backend, locmem_cache):
+    return SearchBroker()
+
+
+def test_tm_result_cache_lru(locmem_cache):
+    """The least recently used matches are evicted from memory first, but
+    are still available from the shared cache.
+    """
+    cache = TMResultCache(max_size=2)
+    keys = [TMResultCache.make_key("fr", 0, "hash%d" % i, 0.7) for i in range(3)]
+    cache.set_many({keys[0]: [0], keys[1]: [1]})
+    assert cache.get_many([keys[0]]) == {keys[0]: [0]}
+
+    cache.set_many({keys[2]: [2]})
+    assert cache.get_stats()["size"] == 2
+    assert cache.get_many(keys[1:]) == {keys[1]: [1], keys[2]: [2]}
+    assert (cache.hits, cache.shared_hits, cache.misses) == (2, 1, 0)
+
+    cache.delete_many([keys[0]])
+    assert cache.get_many([keys[0]]) == {}
+    assert cache.misses == 1
+    assert cache.hit_ratio == 0.75
+
+
+@pytest.mark.django_db
+def test_tm_broker_cache(dummy_tm_backend, dummy_tm_broker, store0):
+    """Units with the same source share cached matches, but never get their
+    own translation as a result.
+    """
+    unit, other_unit = store0.units.filter(state=TRANSLATED)[:2]
+    other_unit.source = unit.source
+    dummy_tm_backend.units = {unit.id: unit, other_unit.id: other_unit}
+    for tm_unit in dummy_tm_backend.units.values():
+        tm_unit.source_hash = get_source_hash(tm_unit.source)
+
+    results = dummy_tm_broker.search(unit)
+    assert [result["unit_id"] for result in results] == [str(other_unit.id)]
+    results = dummy_tm_broker.search(other_unit)
+    assert [result["unit_id"] for result in results] == [str(unit.id)]
+    language = store0.translation_project.language.code
+    assert dummy_tm_backend.lookups == [(language, [unit.source])]
+    assert dummy_tm_broker._cache.hits == 1
+
+    # Indexing a translation drops cached matches of all sources, as it can
+    # be a fuzzy match for any of them
+    third_unit = store0.units.filter(state=TRANSLATED).exclude(source_f=unit.source)[0]
+    dummy_tm_broker.update_many(language, [third_unit.get_tm_data()])
+    dummy_tm_broker.search(unit)
+    assert dummy_tm_backend.lookups == [(language, [unit.source])] * 2
+
+    # Other languages are not affected
+    dummy_tm_broker.update_many("other-language", [third_unit.get_tm_data()])
+    dummy_tm_broker.search(unit)
+    assert len(dummy_tm_backend.lookups) == 2
+
+
+@pytest.mark.django_db
+def test_tm_broker_cache_min_similarity(
+    dummy_tm_backend, dummy_tm_broker, settings, store0
+):
+    """Matches are cached per minimum similarity."""
+    unit = store0.units.filter(state=TRANSLATED).first()
+    unit.source_hash = get_source_hash(unit.source)
+    dummy_tm_broker.search(unit)
+    dummy_tm_broker.search(unit)
+    assert len(dummy_tm_backend.lookups) == 1
+
+    settings.ZING_TM_SERVER = dict(settings.ZING_TM_SERVER, MIN_SIMILARITY=0.9)
+    dummy_tm_broker = SearchBroker()
+    dummy_tm_broker.search(unit)
+    assert len(dummy_tm_backend.lookups) == 2
+
+
+@pytest.fixture
+def embedded_tm(settings):
+    from pootle.core.search.backends.embedded import EmbeddedTMBackend
+
+    settings.ZING_TM_SERVER = {
+        "ENGINE": "pootle.core.search.backends.embedded.EmbeddedTMBackend",
+    }
+    return EmbeddedTMBackend()
+
+
+def _get_tm_units(tp, count):
+    from pootle_store.models import Unit
+
+    units = list(
+        Unit.objects.filter(store__translation_project=tp, state=TRANSLATED)[:count]
+    )
+    assert len(units) == count
+    return units
+
+
+def _set_tm_sources(units, sources):
+    from pootle_store.models import Unit
+
+    for unit, source in zip(units, sources):
+        Unit.objects.filter(id=unit.id).update(source_f=source)
+        unit.refresh_from_db()
+        unit.source_hash = get_source_hash(unit.source)
+
+
+@pytest.mark.django_db
+def test_embedded_tm_get_matches(embedded_tm, settings, store0):
+    """Indexed translations are looked up by their source text similarity."""
+    language = store0.translation_project.language.code
+    units = _get_tm_units(store0.translation_project, 3)
+    _set_tm_sources(units, ["Open the file", "Open the files", "Close the window"])
+    embedded_tm.update_many(language, [unit.get_tm_data() for unit in units])
+
+    matches = embedded_tm.get_matches(language, ["Open the file"])[0]
+    assert [match["unit_id"] for match in matches] == [
+        str(units[0].id),
+        str(units[1].id),
+    ]
+    assert matches[0]["score"] == 1
+    assert matches[0]["target"] == str(units[0].target)
+    assert matches[1]["score"] < 1
+    assert embedded_tm.get_matches("unknown-language", ["Open the file"]) == [[]]
+
+    settings.ZING_TM_SERVER = dict(settings.ZING_TM_SERVER, MIN_SIMILARITY=0.95)
+    assert len(embedded_tm.__class__().get_matches(language, ["Open the file"])[0]) == 1
+
+    # The unit's own translation is not a TM result for itself
+    broker = SearchBroker()
+    results = broker.search(units[0])
+    assert results == []
+
+
+@pytest.mark.django_db
+def test_embedded_tm_get_matches_frequent_ngrams(embedded_tm, monkeypatch, store0):
+    """N-grams shared by too many units, or left once enough units are
+    retrieved, are skipped unless the source text has no other n-gram.
+    """
+    from pootle.core.search.backends import embedded
+
+    monkeypatch.setattr(embedded, "MAX_POSTINGS", 1)
+    monkeypatch.setattr(embedded, "MAX_SCANNED_POSTINGS", 2)
+    language = store0.translation_project.language.code
+    units = _get_tm_units(store0.translation_project, 3)
+    _set_tm_sources(units, ["Open the file", "Open the files", "Close the window"])
+    embedded_tm.update_many(language, [unit.get_tm_data() for unit in units])
+
+    # Only "le " isn't shared by both "Open" units
+    matches = embedded_tm.get_matches(language, ["Open the file"])[0]
+    assert [match["unit_id"] for match in matches] == [str(units[0].id)]
+
+    # "il " isn't indexed, so units closest in length are retrieved instead
+    matches = embedded_tm.get_matches(language, ["Open the fil"])[0]
+    assert [match["unit_id"] for match in matches] == [str(units[0].id)]
+
+    # Only two of the n-grams not shared with other units are scanned
+    matches = embedded_tm.get_matches(language, ["Close the window"])[0]
+    assert [match["unit_id"] for match in matches] == [str(units[2].id)]
+
+
+@pytest.mark.django_db
+def test_embedded_tm_update(embedded_tm, store0):
+    """Reindexed units are looked up by their current source text only."""
+    from pootle_store.models import TMNgram, TMUnit
+
+    language = store0.translation_project.language.code
+    units = list(store0.units.filter(state=TRANSLATED)[:2])
+    _set_tm_sources(units, ["Open the file", "Open the files"])
+    embedded_tm.update_many(language, [unit.get_tm_data() for unit in units])
+    assert embedded_tm.get_indexed_revisions([language]) == {
+        language: max(unit.revision for unit in units)
+    }
+
+    _set_tm_sources(units[1:], ["Close the window"])
+    embedded_tm.update(language, units[1].get_tm_data())
+    matches = embedded_tm.get_matches(language, ["Open the file", "Close the window"])
+    unit_ids = [[match["unit_id"] for match in result] for result in matches]
+    assert unit_ids == [[str(units[0].id)], [str(units[1].id)]]
+
+    embedded_tm.delete_all()
+    assert not TMNgram.objects.exists()
+    assert not TMUnit.objects.exists()
+    assert embedded_tm.get_matches(language, ["Open the file"]) == [[]]
+    assert embedded_tm.get_indexed_revisions([language]) == {}
+
+
+@pytest.mark.django_db
+def test_embedded_tm_indexed_revisions(embedded_tm, store0):
+    """Indexed revisions are the ones units were indexed at, which later
+    changes to units not reindexed yet don't affect.
+    """
+    from pootle_store.models import Unit
+
+    language = store0.translation_project.language.code
+    units = _get_tm_units(store0.translation_project, 2)
+    Unit.objects.filter(id=units[0].id).update(revision=10)
+    units[0].refresh_from_db()
+    embedded_tm.update(language, units[0].get_tm_data())
+
+    # A unit is translated but not indexed yet, and the indexed one changes
+    Unit.objects.filter(id=units[1].id).update(revision=11)
+    Unit.objects.filter(id=units[0].id).update(revision=12)
+    assert embedded_tm.get_indexed_revisions([language]) == {language: 10}
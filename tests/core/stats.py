@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import pytest
+from django_redis import get_redis_connection
+
+from pootle.core.mixins.treeitem import CachedMethods
+from pootle.core.stats import (
+    HashStatsBackend,
+    KeyStatsBackend,
+    apply_stats_delta,
+    get_stats_backend,
+    get_stats_delta,
+)
+from pootle.core.utils.timezone import datetime_min
+from pootle.models import Stats
+
+
+STATS_BACKENDS = [
+    "pootle.core.stats.KeyStatsBackend",
+    "pootle.core.stats.HashStatsBackend",
+]
+
+TEST_PATH = "/test-stats/path/"
+
+
+@pytest.fixture(params=STATS_BACKENDS)
+def stats_backend(request, settings):
+    settings.ZING_STATS_BACKEND = request.param
+    backend = get_stats_backend()
+    backend.delete(TEST_PATH, CachedMethods.get_all())
+    yield backend
+    backend.delete(TEST_PATH, CachedMethods.get_all())
+
+
+def test_get_stats_backend_cached(settings):
+    """The backend instance is reused until the setting changes."""
+    settings.ZING_STATS_BACKEND = "pootle.core.stats.KeyStatsBackend"
+    backend = get_stats_backend()
+    assert isinstance(backend, KeyStatsBackend)
+    assert get_stats_backend() is backend
+
+    settings.ZING_STATS_BACKEND = "pootle.core.stats.HashStatsBackend"
+    assert isinstance(get_stats_backend(), HashStatsBackend)
+
+
+def test_stats_backend_get_set(stats_backend):
+    """Values are stored and retrieved as they were set."""
+    name = str(CachedMethods.WORDCOUNT_STATS)
+    assert stats_backend.get(TEST_PATH, name) is None
+
+    value = {"total": 10, "translated": 5, "fuzzy": 0}
+    stats_backend.set(TEST_PATH, name, value)
+    assert stats_backend.get(TEST_PATH, name) == value
+
+
+def test_stats_backend_datetime(stats_backend):
+    """Datetimes survive serialization."""
+    name = str(CachedMethods.MTIME)
+    stats_backend.set(TEST_PATH, name, datetime_min)
+    assert stats_backend.get(TEST_PATH, name) == datetime_min
+
+
+def test_stats_backend_get_many(stats_backend):
+    """All values for several paths are retrieved at once."""
+    other_path = TEST_PATH + "other/"
+    stats_backend.set_many(
+        TEST_PATH,
+        {str(CachedMethods.SUGGESTIONS): 0, str(CachedMethods.LAST_UPDATED): 1234},
+    )
+
+    names = [str(CachedMethods.SUGGESTIONS), str(CachedMethods.LAST_UPDATED)]
+    assert stats_backend.get_many([TEST_PATH, other_path], names) == {
+        TEST_PATH: {names[0]: 0, names[1]: 1234},
+        other_path: {names[0]: None, names[1]: None},
+    }
+
+
+def test_stats_backend_delete(stats_backend):
+    """Deleting values only removes the given names."""
+    stats_backend.set_many(
+        TEST_PATH,
+        {str(CachedMethods.SUGGESTIONS): 3, str(CachedMethods.LAST_UPDATED): 1234},
+    )
+    stats_backend.delete(TEST_PATH, [str(CachedMethods.SUGGESTIONS)])
+
+    assert stats_backend.get(TEST_PATH, str(CachedMethods.SUGGESTIONS)) is None
+    assert stats_backend.get(TEST_PATH, str(CachedMethods.LAST_UPDATED)) == 1234
+
+
+def test_stats_backend_stats_model(stats_backend):
+    """`Stats` reads values from the configured backend."""
+    stats_backend.set(
+        TEST_PATH,
+        str(CachedMethods.WORDCOUNT_STATS),
+        {"total": 10, "translated": 4, "fuzzy": 1},
+    )
+
+    stats = Stats(TEST_PATH)
+    assert stats.total == 10
+    assert stats.incomplete == 6
+    assert stats.suggestions is None
+
+
+def test_hash_stats_backend_single_key():
+    """All values for a path are stored in a single hash."""
+    backend = HashStatsBackend()
+    backend.delete(TEST_PATH, CachedMethods.get_all())
+    values = {
+        str(CachedMethods.SUGGESTIONS): 2,
+        str(CachedMethods.CHECKS): {"unit_critical_error_count": 1, "checks": {}},
+    }
+    backend.set_many(TEST_PATH, values)
+
+    r_con = get_redis_connection("stats")
+    assert r_con.type(HashStatsBackend.make_key(TEST_PATH)) == b"hash"
+    assert backend.get_all(TEST_PATH) == values
+
+    backend.delete(TEST_PATH, CachedMethods.get_all())
+    assert not r_con.exists(HashStatsBackend.make_key(TEST_PATH))
+
+
+def test_key_stats_backend_make_key():
+    assert KeyStatsBackend.make_key(u"/ru/proj/fóo.po", "get_mtime") == (
+        "/ru/proj/f%C3%B3o.po:get_mtime"
+    )
+
+
+@pytest.mark.parametrize(
+    "old, new, delta",
+    [
+        (3, 3, None),
+        (3, 5, 2),
+        ({"total": 10, "translated": 5}, {"total": 10, "translated": 5}, None),
+        (
+            {"total": 10, "translated": 5},
+            {"total": 12, "translated": 4},
+            {"total": 2, "translated": -1},
+        ),
+        (
+            {"unit_critical_error_count": 0, "checks": {"printf": 1}},
+            {"unit_critical_error_count": 1, "checks": {"endpunc": 1}},
+            {"unit_critical_error_count": 1, "checks": {"printf": -1, "endpunc": 1}},
+        ),
+    ],
+)
+def test_get_stats_delta(old, new, delta):
+    assert get_stats_delta(old, new) == delta
+    if delta is not None:
+        assert apply_stats_delta(old, delta) == new
+
+
+def test_apply_stats_delta_prunes_nested():
+    """Nested entries dropping to zero are removed."""
+    value = {"unit_critical_error_count": 2, "checks": {"printf": 1, "endpunc": 2}}
+    delta = {"unit_critical_error_count": -2, "checks": {"printf": -1}}
+    assert apply_stats_delta(value, delta) == {
+        "unit_critical_error_count": 0,
+        "checks": {"endpunc": 2},
+    }
+
+
+def test_stats_backend_set_and_apply_delta(stats_backend):
+    """Values are stored along with their delta applied to parents, unless
+    some of them have no value to apply it to.
+    """
+    name = str(CachedMethods.WORDCOUNT_STATS)
+    parent_paths = [TEST_PATH + "parent0/", TEST_PATH + "parent1/"]
+    value = {"total": 10, "translated": 5, "fuzzy": 0}
+    new_value = {"total": 10, "translated": 6, "fuzzy": 0}
+    parent_value = {"total": 30, "translated": 15, "fuzzy": 1}
+    try:
+        assert not stats_backend.set_and_apply_delta(
+            TEST_PATH, name, value, parent_paths
+        )
+        assert stats_backend.get(TEST_PATH, name) == value
+
+        stats_backend.set(parent_paths[0], name, parent_value)
+        assert not stats_backend.set_and_apply_delta(
+            TEST_PATH, name, new_value, parent_paths
+        )
+        assert stats_backend.get(TEST_PATH, name) == new_value
+        assert stats_backend.get(parent_paths[0], name) == parent_value
+
+        stats_backend.set(parent_paths[1], name, parent_value)
+        assert stats_backend.set_and_apply_delta(TEST_PATH, name, value, parent_paths)
+        assert stats_backend.set_and_apply_delta(TEST_PATH, name, value, parent_paths)
+        assert stats_backend.get(TEST_PATH, name) == value
+        for path in parent_paths:
+            assert stats_backend.get(path, name) == {
+                "total": 30,
+                "translated": 14,
+                "fuzzy": 1,
+            }
+    finally:
+        for path in parent_paths:
+            stats_backend.delete(path, [name])
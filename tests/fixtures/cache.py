@@ -29,3 +29,15 @@ def refresh_stats(flush_stats):
 
     for store in Store.objects.live().iterator():
         store.update_all_cache()
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Uses an actual cache backend as the `default` cache."""
+    from django.core.cache import caches
+
+    settings.CACHES = dict(
+        settings.CACHES,
+        default={"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    )
+    caches["default"].clear()
@@ -10,6 +10,8 @@ from collections import OrderedDict
 
 import pytest
 
+from pootle.core.search import SearchBackend
+
 
 UNITS_TEXT_SEARCH_TESTS = OrderedDict()
 UNITS_TEXT_SEARCH_TESTS["exact:Translated (source)"] = {
@@ -149,3 +151,83 @@ def units_text_searches(request):
     test["empty"] = test.get("empty", False)
     test["exact"] = exact
     return test
+
+
+@pytest.fixture
+def sqlite_text_search(settings):
+    """Sets up the SQLite FTS5 unit text search backend and its index."""
+    from django.db import connection
+
+    from pootle_store.unit.textsearch import SQLiteUnitTextSearch
+
+    settings.ZING_TEXT_SEARCH_BACKEND = (
+        "pootle_store.unit.textsearch.SQLiteUnitTextSearch"
+    )
+    SQLiteUnitTextSearch.create_index(connection)
+    yield SQLiteUnitTextSearch
+    SQLiteUnitTextSearch.drop_index(connection)
+
+
+class DummyTMBackend(SearchBackend):
+    """Records the lookups made to it.
+
+    Source texts are matched by the `units` added to it with the same
+    source, or by a made-up translation if no units were added.
+    """
+
+    lookups = []
+    units = {}
+
+    def get_matches(self, language, sources):
+        self.lookups.append((language, list(sources)))
+        if not self.units:
+            return [
+                [
+                    {
+                        "unit_id": "0",
+                        "source": str(source),
+                        "target": "Translation of %s" % source,
+                        "project": "Project",
+                        "path": "/path/",
+                        "username": "user",
+                        "fullname": "User",
+                        "email_md5": None,
+                        "mtime": None,
+                        "score": 1.0,
+                    }
+                ]
+                for source in sources
+            ]
+
+        return [
+            [
+                {
+                    "unit_id": str(unit.id),
+                    "source": str(unit.source),
+                    "target": str(unit.target),
+                    "score": 1.0,
+                }
+                for unit in self.units.values()
+                if unit.source == source
+            ]
+            for source in sources
+        ]
+
+    def update_many(self, language, objs):
+        pass
+
+
+@pytest.fixture
+def dummy_tm_backend(settings, monkeypatch):
+    """Sets up `DummyTMBackend` as the TM server, with no lookups made and no
+    units added yet.
+    """
+    settings.ZING_TM_SERVER = {
+        "ENGINE": "%s.DummyTMBackend" % __name__,
+        "HOST": "localhost",
+        "PORT": 9200,
+    }
+    monkeypatch.setattr("pootle_store.models.TM_BROKER", None)
+    monkeypatch.setattr(DummyTMBackend, "lookups", [])
+    monkeypatch.setattr(DummyTMBackend, "units", {})
+    return DummyTMBackend
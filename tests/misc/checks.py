@@ -11,14 +11,20 @@ import pytest
 
 from translate.filters.checks import FilterFailure
 
+from pootle.core.checks.checker import CheckableUnit
 from pootle_misc.checks import (
     ENChecker,
+    SkipCheck,
+    SourceFingerprintCache,
     check_names,
+    check_translation,
     get_category_code,
     get_category_name,
     get_qc_data_by_name,
     get_qualitychecks,
     get_qualitycheck_schema,
+    run_given_filters,
+    source_fingerprints,
 )
 
 try:
@@ -607,3 +613,81 @@ def test_get_qc_data_by_name(fake_check_name):
         "is_critical": False,
         "title": fake_check_name,
     }
+
+
+def test_source_fingerprints_cache():
+    """Source fingerprints are calculated once and reused across targets."""
+    source_fingerprints.clear()
+    calls = []
+
+    def get_fingerprint(string, is_source=False, translation=""):
+        calls.append((string, is_source))
+        if string == u"skip":
+            raise SkipCheck()
+        return len(string)
+
+    for __ in range(2):
+        source_fingerprints.get(get_fingerprint, "fake", u"foo")
+    assert calls == [(u"foo", True)]
+
+    assert source_fingerprints.get(get_fingerprint, "fake", u"skip") is SkipCheck
+    assert source_fingerprints.get(get_fingerprint, "fake", u"skip") is SkipCheck
+    assert calls == [(u"foo", True), (u"skip", True)]
+
+    assert check_translation(get_fingerprint, u"foo", u"bar", name="fake")
+    assert not check_translation(get_fingerprint, u"foo", u"barbar", name="fake")
+    assert check_translation(get_fingerprint, u"skip", u"barbar", name="fake")
+    assert len(calls) == 4
+    source_fingerprints.clear()
+
+
+def test_source_fingerprints_cache_maxsize():
+    cache = SourceFingerprintCache(maxsize=2)
+    for string in [u"a", u"b", u"a", u"c"]:
+        cache.get(lambda string, is_source=False: string, "fake", string)
+
+    assert list(cache.data.keys()) == [u"a", u"c"]
+
+
+def test_source_fingerprints_skipped_checks():
+    """Checks known to pass for a source are tracked across targets."""
+    source_fingerprints.clear()
+    source = u"No placeholders here"
+    skipped_checks = source_fingerprints.get_skipped_checks(source)
+    assert "plurr_format" in skipped_checks
+    assert "unescaped_ampersands" in skipped_checks
+    assert "java_format" not in skipped_checks
+
+    checker.java_format(source, u"Sin marcadores")
+    assert "java_format" in source_fingerprints.get_skipped_checks(source)
+    source_fingerprints.clear()
+
+
+@pytest.mark.parametrize(
+    "source_string, target_string",
+    [
+        (u"{0,number} foo", u"{0,number} bar"),
+        (u"{0,number} foo", u"bar"),
+        (u"&amp; $1 {n_PLURAL:a|b}", u"& $2"),
+        (u"Wait…", u"Wait..."),
+        (u"No placeholders here", u"%s {0} $1 &amp;"),
+    ],
+)
+def test_run_given_filters_skipped_checks(source_string, target_string):
+    """Skipping checks which don't apply to a source doesn't change results."""
+    unit = CheckableUnit(
+        {
+            "source_f": source_string,
+            "target_f": target_string,
+            "locations": "",
+            "store__translation_project__language__code": "fr",
+        }
+    )
+    check_names = sorted(checker.defaultfilters)
+
+    source_fingerprints.clear()
+    expected = run_given_filters(checker, unit, check_names)
+    # Skipped checks are now known for the source
+    assert run_given_filters(checker, unit, check_names) == expected
+    assert checker.run_filters(unit, categorised=True) == expected
+    source_fingerprints.clear()
@@ -58,3 +58,47 @@ def test_revision_incr(store0):
     assert db_unit.revision != previous_revision
     assert Revision.get() != previous_revision
     assert db_unit.revision == Revision.get()
+
+
+@pytest.mark.django_db
+def test_revision_reserve(revision):
+    """Tests a block of consecutive revisions is reserved at once."""
+    previous_revision = Revision.get()
+    revisions = Revision.reserve(5)
+
+    assert list(revisions) == list(range(previous_revision + 1, previous_revision + 6))
+    assert Revision.get() == previous_revision + 5
+
+
+@pytest.mark.django_db
+def test_revision_allocate(revision):
+    """Tests revisions are handed out from blocks reserved as needed."""
+    previous_revision = Revision.get()
+
+    with Revision.allocate(2) as incr_revision:
+        assert Revision.get() == previous_revision
+
+        assert incr_revision() == previous_revision + 1
+        assert Revision.get() == previous_revision + 2
+        assert incr_revision() == previous_revision + 2
+
+        # Further blocks are reserved once the previous one is used up
+        assert incr_revision() == previous_revision + 3
+        assert Revision.get() == previous_revision + 4
+
+    # Leftover revisions are not handed out once done
+    assert incr_revision() == previous_revision + 5
+    assert Revision.get() == previous_revision + 6
+
+
+@pytest.mark.django_db
+def test_revision_allocate_mark_units_obsolete(revision, store0):
+    """Tests units obsoleted in bulk get consecutive revisions."""
+    ids = [unit.id for unit in store0.units[:3]]
+    previous_revision = Revision.get()
+
+    assert store0.mark_units_obsolete(ids) == 3
+    assert Revision.get() == previous_revision + 3
+    assert sorted(
+        store0.unit_set.filter(id__in=ids).values_list("revision", flat=True)
+    ) == list(range(previous_revision + 1, previous_revision + 4))
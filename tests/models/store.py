@@ -7,6 +7,7 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import difflib
 import io
 import logging
 import os
@@ -19,12 +20,26 @@ from translate.storage.factory import getclass
 
 from django.core.exceptions import ValidationError
 
+from django_rq.queues import get_queue
+
+from pootle.core.mixins.treeitem import CachedMethods
 from pootle.core.models import Revision
+from pootle.core.search import SearchBackend
 from pootle.core.url_helpers import to_tp_relative_path
+from pootle_statistics.models import ScoreLog, SubmissionTypes
 from pootle_store.constants import OBSOLETE, PARSED, TRANSLATED
-from pootle_store.diff import StoreDiff
-from pootle_store.models import Store
+from pootle_store.diff import DBStore, FileStore, StoreDiff, get_opcodes
+from pootle_store.models import (
+    KEY_TM_FLUSH_SCHEDULED,
+    KEY_TM_PENDING_UNITS,
+    TM_FLUSH_SCHEDULED_TIMEOUT,
+    Store,
+    buffer_tmserver_units,
+    flush_tmserver_buffer_job,
+)
+from pootle_store.stats import get_stores_stats
 from pootle_store.syncer import PoStoreSyncer
+from pootle_store.updater import StoreUpdate, UnitUpdater
 
 
 @pytest.mark.django_db
@@ -388,19 +403,9 @@ def test_store_file_diff(store_diff_tests):
     assert diff.target.active_uids == [x.source for x in store.units]
     assert diff.target_revision == store.get_max_unit_revision()
     assert diff.target.units == {
-        unit["source_f"]: unit
+        unit["unitid"]: unit
         for unit in store.unit_set.values(
-            "source_f",
-            "index",
-            "target_f",
-            "state",
-            "unitid",
-            "id",
-            "revision",
-            "developer_comment",
-            "translator_comment",
-            "locations",
-            "context",
+            "index", "state", "unitid", "id", "revision", "content_hash",
         )
     }
     diff_diff = diff.diff()
@@ -650,6 +655,97 @@ def test_store_diff_delete_obsoleted_source_unit(diffable_stores):
     assert not differ.diff()
 
 
+@pytest.mark.django_db
+def test_store_diff_content_hash(diffable_stores):
+    """Stored unit fingerprints match the ones calculated for file units."""
+    complex_po, other_po = diffable_stores
+    file_store = FileStore(complex_po.deserialize(complex_po.serialize()))
+    db_store = DBStore(other_po, only_active=True)
+
+    assert db_store.units
+    for uid, unit in db_store.units.items():
+        assert unit["content_hash"] is not None
+        assert "source_f" not in unit
+        assert db_store.get_content_hash(uid) == file_store.get_content_hash(uid)
+
+    update_unit = other_po.units.first()
+    update_unit.translator_comment = "Some other comment"
+    update_unit.save()
+    assert update_unit.content_hash != file_store.get_content_hash(update_unit.unitid)
+
+
+@pytest.mark.django_db
+def test_store_diff_missing_content_hash(diffable_stores):
+    """Fingerprints are calculated for units lacking a stored one."""
+    target_store, source_store = diffable_stores
+    target_store.unit_set.update(content_hash=None)
+    differ = StoreDiff(
+        target_store, source_store, target_store.get_max_unit_revision() + 1
+    )
+    assert not differ.diff()
+
+    update_unit = target_store.units.first()
+    target_store.unit_set.filter(id=update_unit.id).update(target_f="Other string")
+    differ = StoreDiff(
+        target_store, source_store, target_store.get_max_unit_revision() + 1
+    )
+    assert differ.diff()["update"][0] == set([update_unit.pk])
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("", ""),
+        ("", "abc"),
+        ("abc", ""),
+        ("abcdef", "abcdef"),
+        ("abcdef", "abcdefgh"),
+        ("abcdef", "xyabcdef"),
+        ("abcdef", "abxycdef"),
+        ("abcdef", "abef"),
+        ("abcdef", "abdcef"),
+        ("abcdef", "fedcba"),
+        ("abcdef", "axcdyf"),
+    ],
+)
+def test_store_diff_get_opcodes(old, new):
+    """Opcodes match those of `SequenceMatcher` for the whole sequences."""
+    old, new = list(old), list(new)
+    expected = difflib.SequenceMatcher(None, old, new).get_opcodes()
+    assert get_opcodes(old, new) == expected
+
+
+def _get_unit_ids(start, stop):
+    return ["unit-%d" % i for i in range(start, stop)]
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda uids: list(uids),
+        lambda uids: uids + _get_unit_ids(5000, 5100),
+        lambda uids: uids[:-100],
+        lambda uids: uids[:2500] + _get_unit_ids(5000, 5100) + uids[2500:],
+        lambda uids: [uid for i, uid in enumerate(uids) if i % 1000 != 500],
+    ],
+    ids=[
+        "unchanged",
+        "appended",
+        "removed_tail",
+        "inserted_middle",
+        "removed_scattered",
+    ],
+)
+def test_store_diff_get_opcodes_unit_ids(change):
+    """Opcodes for typical changes to the unit IDs of a large store match
+    those of `SequenceMatcher`.
+    """
+    old_uids = _get_unit_ids(0, 5000)
+    new_uids = change(old_uids)
+    expected = difflib.SequenceMatcher(None, old_uids, new_uids).get_opcodes()
+    assert get_opcodes(old_uids, new_uids) == expected
+
+
 @pytest.mark.django_db
 def test_store_syncer(tp0):
     store = tp0.stores.live().first()
@@ -881,3 +977,321 @@ def test_update_mtime_optimization(caplog, project0_disk, tp0, store0, test_fs):
     assert not store0.updater.update_from_disk(force=True)
     assert store0.file_mtime == store0.get_file_mtime() == mtime
     assert len(caplog.records) == 0
+
+
+@pytest.mark.django_db
+def test_get_stores_stats(tp0):
+    """Bulk calculated stats match the per-store calculated ones."""
+    stores_stats = get_stores_stats(tp0.stores.live())
+    assert any(stats["get_suggestion_count"] for stats in stores_stats.values())
+    assert any(
+        stats["get_checks"]["unit_critical_error_count"]
+        for stats in stores_stats.values()
+    )
+
+    for store in tp0.stores.live():
+        assert stores_stats[store.id] == {
+            str(CachedMethods.WORDCOUNT_STATS): store._get_wordcount_stats(),
+            str(CachedMethods.CHECKS): store._get_checks(),
+            str(CachedMethods.SUGGESTIONS): store._get_suggestion_count(),
+            str(CachedMethods.MTIME): store._get_mtime(),
+            str(CachedMethods.LAST_UPDATED): store._get_last_updated(),
+            str(CachedMethods.LAST_ACTION): store._get_last_action(),
+        }
+
+
+@pytest.mark.django_db
+def test_store_update_cached_many(tp0, django_assert_num_queries):
+    """Stats of many stores are updated with a fixed number of queries."""
+    stores = list(tp0.stores.live())
+    names = CachedMethods.get_all()
+    for store in stores:
+        store.clear_cache()
+
+    with django_assert_num_queries(7):
+        values = Store.calc_cached_many(stores, names)
+
+    for store in stores:
+        store.mark_all_dirty()
+    Store.update_cached_many(stores)
+
+    for store in stores:
+        assert not store._dirty_cache
+        assert {name: store.get_cached_value(name) for name in names} == (
+            values[store.cache_key]
+        )
+        assert store.get_cached_value(str(CachedMethods.CHECKS)) == (
+            store._calc_checks()
+        )
+
+    tp_stats = tp0.get_stats()
+    assert tp_stats["total"] == tp0._calc_wordcount_stats()["total"]
+
+
+@pytest.mark.django_db
+def test_store_addunits(tp0, complex_po):
+    """Adding units in bulk results in the same state as adding them one by
+    one.
+    """
+    source_store = complex_po.deserialize(
+        complex_po.serialize()
+        + b"""
+msgid "Failing %d checks"
+msgstr "Failing checks."
+
+#, fuzzy
+msgid "Fuzzy %s"
+msgstr "Fuzzy"
+
+msgid "..."
+msgstr ""
+"""
+    )
+    to_add = [(unit, i) for i, unit in enumerate(source_store.units) if unit.source]
+    revision = Revision.incr()
+
+    store = StoreDBFactory(translation_project=tp0, parent=tp0.directory)
+    for unit, index in to_add:
+        store.addunit(unit, index, update_revision=revision)
+
+    bulk_store = StoreDBFactory(translation_project=tp0, parent=tp0.directory)
+    bulk_store.addunits(to_add, update_revision=revision)
+
+    unit_fields = [
+        "index",
+        "unitid",
+        "unitid_hash",
+        "source_f",
+        "source_hash",
+        "source_wordcount",
+        "source_length",
+        "target_f",
+        "target_wordcount",
+        "target_length",
+        "developer_comment",
+        "translator_comment",
+        "locations",
+        "context",
+        "state",
+        "submitted_by",
+    ]
+    units = list(store.unit_set.order_by("index").values(*unit_fields))
+    bulk_units = list(bulk_store.unit_set.order_by("index").values(*unit_fields))
+    assert len(units) == len(to_add)
+    assert units == bulk_units
+
+    for field, values in [
+        ("submission", ["unit__index", "type", "field", "new_value", "submitter"]),
+        ("qualitycheck", ["unit__index", "name", "category", "message"]),
+    ]:
+        lookup = {"unit__store": store}
+        bulk_lookup = {"unit__store": bulk_store}
+        model = store.unit_set.model._meta.get_field(field).related_model
+        assert model.objects.filter(**lookup).exists()
+        assert list(
+            model.objects.filter(**lookup).order_by(*values).values(*values)
+        ) == list(model.objects.filter(**bulk_lookup).order_by(*values).values(*values))
+
+    assert bulk_store._get_wordcount_stats() == store._get_wordcount_stats()
+    assert bulk_store._get_checks() == store._get_checks()
+
+
+class DummyTMBackend(SearchBackend):
+    indexed = []
+
+    def update_many(self, language, objs):
+        self.indexed.append((language, [obj["id"] for obj in objs]))
+
+
+@pytest.mark.django_db
+def test_store_addunits_tmserver(settings, monkeypatch, tp0, store0):
+    """New translations are indexed in the TM server at once."""
+    settings.ZING_TM_SERVER = {
+        "ENGINE": "tests.models.store.DummyTMBackend",
+        "HOST": "localhost",
+        "PORT": 9200,
+    }
+    monkeypatch.setattr("pootle_store.models.TM_BROKER", None)
+    monkeypatch.setattr(DummyTMBackend, "indexed", [])
+
+    store = StoreDBFactory(translation_project=tp0, parent=tp0.directory)
+    source_store = store0.deserialize(store0.serialize())
+    newunits = store.addunits(
+        (unit, i) for i, unit in enumerate(source_store.units) if unit.source
+    )
+
+    assert DummyTMBackend.indexed == [
+        (
+            tp0.language.code,
+            [newunit.id for newunit in newunits if newunit.istranslated()],
+        )
+    ]
+
+
+@pytest.fixture
+def dummy_tmserver(settings, monkeypatch):
+    settings.ZING_TM_SERVER = {
+        "ENGINE": "tests.models.store.DummyTMBackend",
+        "HOST": "localhost",
+        "PORT": 9200,
+    }
+    monkeypatch.setattr("pootle_store.models.TM_BROKER", None)
+    monkeypatch.setattr(DummyTMBackend, "indexed", [])
+    return DummyTMBackend
+
+
+@pytest.mark.django_db
+def test_unit_save_tmserver(dummy_tmserver, store0):
+    """Translated units are indexed in the TM server when saved."""
+    unit = store0.units.filter(state=TRANSLATED).first()
+    unit.target = "Another translation"
+    unit.save()
+
+    assert dummy_tmserver.indexed == [
+        (store0.translation_project.language.code, [unit.id])
+    ]
+
+
+@pytest.mark.django_db
+def test_tmserver_buffer(dummy_tmserver, monkeypatch, store0):
+    """Buffered units are indexed in the TM server in batches."""
+    monkeypatch.setattr("pootle_store.models.TM_FLUSH_BATCH_SIZE", 2)
+    r_con = get_queue().connection
+    r_con.delete(KEY_TM_PENDING_UNITS, KEY_TM_FLUSH_SCHEDULED)
+    unit_ids = [unit.id for unit in store0.units[:3]]
+
+    # Only the first units buffered require enqueuing a flush job
+    assert buffer_tmserver_units(r_con, unit_ids[:2])
+    assert not buffer_tmserver_units(r_con, unit_ids[1:])
+    assert r_con.scard(KEY_TM_PENDING_UNITS) == 3
+    assert 0 < r_con.ttl(KEY_TM_FLUSH_SCHEDULED) <= TM_FLUSH_SCHEDULED_TIMEOUT
+
+    flush_tmserver_buffer_job()
+    assert len(dummy_tmserver.indexed) == 2
+    assert sorted(
+        unit_id for language_, ids in dummy_tmserver.indexed for unit_id in ids
+    ) == sorted(unit_ids)
+    assert not r_con.exists(KEY_TM_PENDING_UNITS)
+
+    assert buffer_tmserver_units(r_con, unit_ids)
+    r_con.delete(KEY_TM_PENDING_UNITS, KEY_TM_FLUSH_SCHEDULED)
+
+
+@pytest.mark.django_db
+def test_tmserver_buffer_flush_failure(dummy_tmserver, monkeypatch, store0):
+    """Units failing to be indexed are kept pending."""
+    r_con = get_queue().connection
+    r_con.delete(KEY_TM_PENDING_UNITS, KEY_TM_FLUSH_SCHEDULED)
+    unit_ids = [unit.id for unit in store0.units[:3]]
+    buffer_tmserver_units(r_con, unit_ids)
+
+    def update_tmserver_job(unit_ids):
+        raise ValueError("TM server unavailable")
+
+    with monkeypatch.context() as m:
+        m.setattr("pootle_store.models.update_tmserver_job", update_tmserver_job)
+        with pytest.raises(ValueError):
+            flush_tmserver_buffer_job()
+    pending = r_con.smembers(KEY_TM_PENDING_UNITS)
+    assert sorted(int(unit_id) for unit_id in pending) == sorted(unit_ids)
+
+    flush_tmserver_buffer_job()
+    assert sorted(
+        unit_id for language_, ids in dummy_tmserver.indexed for unit_id in ids
+    ) == sorted(unit_ids)
+    assert not r_con.exists(KEY_TM_PENDING_UNITS)
+
+
+def _update_store_units(store, file_store, user, batched):
+    update_revision = Revision.incr()
+    diff = StoreDiff(store, file_store, store.get_max_unit_revision()).diff()
+    update_dbids, uid_index_map = diff["update"]
+    update = StoreUpdate(
+        file_store,
+        user=user,
+        submission_type=SubmissionTypes.UPLOAD,
+        uids=update_dbids,
+        indices=uid_index_map,
+        store_revision=store.get_max_unit_revision(),
+        update_revision=update_revision,
+    )
+    if batched:
+        return store.updater.update_units(update)
+
+    update_count = 0
+    for unit in store.updater.units(update.uids):
+        update_count += UnitUpdater(unit, update).update_unit()[0]
+    return update_count, 0, []
+
+
+@pytest.mark.django_db
+def test_store_update_units_batched(diffable_stores, member):
+    """Updating units in batches results in the same state as updating them
+    one by one.
+    """
+    store, other_store = diffable_stores
+
+    file_store = store.deserialize(store.serialize())
+    for i, unit in enumerate(file_store.units[1:]):
+        if i % 3 == 0:
+            unit.target = "Changed %d" % i
+        elif i % 3 == 1:
+            unit.markfuzzy(not unit.isfuzzy())
+        else:
+            unit.addnote("Comment %d" % i, origin="translator")
+
+    scores = [member.score]
+    count, suggested, unsynced = _update_store_units(
+        store, file_store, member, batched=False
+    )
+    member.refresh_from_db()
+    scores.append(member.score)
+    assert (count, suggested, unsynced) == _update_store_units(
+        other_store, file_store, member, batched=True
+    )
+    member.refresh_from_db()
+    scores.append(member.score)
+    assert count > 10
+    assert scores[1] != scores[0]
+    assert scores[2] - scores[1] == pytest.approx(scores[1] - scores[0])
+
+    unit_fields = [
+        "unitid",
+        "index",
+        "target_f",
+        "target_wordcount",
+        "translator_comment",
+        "state",
+        "submitted_by",
+        "commented_by",
+        "reviewed_by",
+    ]
+    assert list(store.unit_set.order_by("index").values(*unit_fields)) == list(
+        other_store.unit_set.order_by("index").values(*unit_fields)
+    )
+
+    submission_fields = ["unit__unitid", "field", "type", "old_value", "new_value"]
+    assert list(
+        store.submission_set.order_by(*submission_fields).values(*submission_fields)
+    ) == list(
+        other_store.submission_set.order_by(*submission_fields).values(
+            *submission_fields
+        )
+    )
+
+    scorelog_fields = [
+        "submission__unit__unitid",
+        "submission__field",
+        "action_code",
+        "user",
+        "score_delta",
+    ]
+    assert list(
+        ScoreLog.objects.filter(submission__store=store)
+        .order_by(*scorelog_fields)
+        .values(*scorelog_fields)
+    ) == list(
+        ScoreLog.objects.filter(submission__store=other_store)
+        .order_by(*scorelog_fields)
+        .values(*scorelog_fields)
+    )
@@ -17,8 +17,9 @@ from django.utils import timezone
 
 from pootle.core.mixins.treeitem import CachedMethods
 from pootle_store.constants import FUZZY, OBSOLETE, TRANSLATED, UNTRANSLATED
-from pootle_store.models import Unit
+from pootle_store.models import QualityCheck, Store, Unit
 from pootle_store.syncer import UnitSyncer
+from pootle_statistics.models import Submission, SubmissionTypes
 
 
 User = get_user_model()
@@ -385,3 +386,89 @@ def test_unit_resurrect_active_unit(store0):
     assert not unit.isobsolete()
     assert not unit.resurrect()
     assert not unit.isobsolete()
+
+
+@pytest.mark.django_db
+def test_update_qualitychecks_only_on_check_inputs(store0):
+    """Checks are only rerun when a check input changes, not on state or
+    comment changes alone.
+    """
+    unit = store0.units.exclude(source_f__contains="\n").first()
+    unit.target = u"foo\nbar"
+    unit.save()
+    assert "linebreaks_single" in unit.qualitycheck_set.values_list("name", flat=True)
+
+    unit.qualitycheck_set.all().delete()
+    unit = Unit.objects.get(id=unit.id)
+    unit.markfuzzy(True)
+    unit.translator_comment = u"Needs work"
+    unit._comment_updated = True
+    unit.save()
+    assert not unit.qualitycheck_set.exists()
+
+    newunit = unit.convert(pounit)
+    newunit.addlocation("foo.c:1")
+    unit = Unit.objects.get(id=unit.id)
+    assert unit.update(newunit)
+    assert unit._locations_updated
+    unit.save()
+    assert not unit._locations_updated
+    assert "linebreaks_single" in unit.qualitycheck_set.values_list("name", flat=True)
+
+
+@pytest.mark.django_db
+def test_update_qualitychecks_false_positives(store0):
+    unit = store0.units.exclude(source_f__contains="\n").first()
+    unit.target = u"foo\nbar"
+    unit.save()
+    unit.qualitycheck_set.update(false_positive=True)
+
+    assert not unit.update_qualitychecks(keep_false_positives=True)
+    assert unit.update_qualitychecks()
+    assert not unit.qualitycheck_set.filter(false_positive=True).exists()
+
+    unit.target = u"foobar"
+    assert unit.update_qualitychecks()
+    assert not unit.qualitycheck_set.filter(name="linebreaks_single").exists()
+
+
+@pytest.mark.django_db
+def test_qualitycheck_toggle_many(tp0, admin):
+    checks = QualityCheck.objects.filter(
+        unit__store__translation_project=tp0, false_positive=False
+    )
+    name = checks.values_list("name", flat=True).first()
+    check_ids = set(checks.filter(name=name).values_list("id", flat=True))
+    other_ids = set(checks.exclude(name=name).values_list("id", flat=True))
+    units = Unit.objects.filter(store__translation_project=tp0)
+    submission_count = Submission.objects.count()
+
+    assert QualityCheck.toggle_many(units, name, True, admin) == len(check_ids)
+    assert (
+        set(
+            QualityCheck.objects.filter(false_positive=True).values_list(
+                "id", flat=True
+            )
+        )
+        >= check_ids
+    )
+    assert set(checks.values_list("id", flat=True)) == other_ids
+    submissions = Submission.objects.filter(quality_check_id__in=check_ids)
+    assert submissions.count() == len(check_ids)
+    assert set(submissions.values_list("type", flat=True)) == {
+        SubmissionTypes.MUTE_CHECK
+    }
+    assert Submission.objects.count() == submission_count + len(check_ids)
+
+    # Stores' cached mtime reflects the units' bumped mtime
+    muted_units = Unit.objects.filter(qualitycheck__id__in=check_ids)
+    for store in Store.objects.filter(unit__in=muted_units).distinct():
+        assert store.get_cached(CachedMethods.MTIME) == max(
+            store.units.values_list("mtime", flat=True)
+        )
+
+    # Checks already muted are left alone
+    assert QualityCheck.toggle_many(units, name, True, admin) == 0
+
+    assert QualityCheck.toggle_many(units, name, False, admin) == len(check_ids)
+    assert set(checks.filter(name=name).values_list("id", flat=True)) == check_ids
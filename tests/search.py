@@ -9,6 +9,8 @@
 
 import pytest
 
+from django.db import connection
+
 from pootle_project.models import Project
 from pootle_statistics.models import SubmissionTypes
 from pootle_store.constants import FUZZY, TRANSLATED, UNTRANSLATED
@@ -22,6 +24,7 @@ from pootle_store.unit.filters import (
     UnitStateFilter,
     UnitTextSearch,
 )
+from pootle_store.unit.textsearch import get_text_search_backend
 
 
 def _expected_text_search_words(text, exact):
@@ -294,3 +297,60 @@ def test_units_checks_filter_bad():
 def test_units_filters():
     qs = Unit.objects.all()
     assert UnitSearchFilter().filter(qs, "FOO").count() == 0
+
+
+@pytest.mark.django_db
+def test_get_units_text_search_indexed(units_text_searches, sqlite_text_search):
+    search = units_text_searches
+    assert get_text_search_backend() is sqlite_text_search
+
+    for qs in [Unit.objects.all(), Unit.objects.live(), Unit.objects.none()]:
+        expected = UnitTextSearch(qs).search(
+            search["text"], search["sfields"], search["exact"]
+        )
+        result = sqlite_text_search(qs).search(
+            search["text"], search["sfields"], search["exact"]
+        )
+        assert list(result.order_by("pk")) == list(expected.order_by("pk"))
+
+
+def _get_indexed_unit_ids(text_search, text, sfields):
+    unit_search = text_search(Unit.objects.none())
+    sql, params = unit_search.get_candidates_sql(
+        unit_search.get_words(text, False),
+        sorted(unit_search.get_search_fields(sfields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return set(row[0] for row in cursor.fetchall())
+
+
+@pytest.mark.django_db
+def test_text_search_index_sync(sqlite_text_search, store0):
+    """The index is kept in sync with unit changes, including bulk ones."""
+    unit = store0.units[0]
+    assert not _get_indexed_unit_ids(sqlite_text_search, "Zyxwvu", ["target"])
+
+    unit.target = "Zyxwvu"
+    unit.save()
+    assert _get_indexed_unit_ids(sqlite_text_search, "zyxwvu", ["target"]) == {unit.id}
+    assert not _get_indexed_unit_ids(sqlite_text_search, "zyxwvu", ["source"])
+
+    Unit.objects.filter(id=unit.id).update(target_f="Other", translator_comment="Zyx")
+    assert not _get_indexed_unit_ids(sqlite_text_search, "zyxwvu", ["target"])
+    assert _get_indexed_unit_ids(sqlite_text_search, "zyx", ["notes"]) == {unit.id}
+
+    unit.delete()
+    assert not _get_indexed_unit_ids(sqlite_text_search, "zyx", ["notes"])
+
+
+@pytest.mark.django_db
+def test_text_search_indexed_short_words(sqlite_text_search):
+    """Words too short for the index are searched without it."""
+    qs = Unit.objects.all()
+    unit_search = sqlite_text_search(qs)
+    assert not unit_search.can_search(["of", "translated"])
+
+    expected = UnitTextSearch(qs).search("of translated", ["source"])
+    result = unit_search.search("of translated", ["source"])
+    assert list(result.order_by("pk")) == list(expected.order_by("pk"))
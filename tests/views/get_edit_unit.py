@@ -8,10 +8,12 @@
 # AUTHORS file for copyright and authorship information.
 
 import json
+from hashlib import md5
 
 import pytest
 
 from pootle_app.models.permissions import check_user_permission
+from pootle_store.models import Unit
 from pootle_store.util import find_altsrcs
 from pootle_store.views import get_alt_src_langs
 
@@ -63,3 +65,64 @@ def test_get_edit_unit(project0_disk, get_edit_unit, client, request_users, sett
     assert response.context["has_admin_access"] == check_user_permission(
         user, "administrate", directory
     )
+
+
+@pytest.mark.django_db
+def test_get_edit_unit_tm_prefetch(
+    get_edit_unit, client, admin, settings, dummy_tm_backend, locmem_cache
+):
+    """TM matches for upcoming units are looked up at once and cached."""
+    settings.ZING_TM_SERVER = dict(settings.ZING_TM_SERVER, PREFETCH_UNITS=2)
+    client.force_login(admin)
+
+    unit = get_edit_unit
+    language = unit.store.translation_project.language.code
+    # Fixture units don't have their source hashes calculated
+    units = [unit]
+    for other in Unit.objects.filter(
+        store__translation_project=unit.store.translation_project
+    ):
+        if all(other.source_f != prev.source_f for prev in units):
+            units.append(other)
+    for other in units:
+        other.source_hash = md5(other.source_f.encode("utf-8")).hexdigest()
+    Unit.objects.bulk_update(units, ["source_hash"])
+    unit, next_units = units[0], units[1:4]
+    assert len(next_units) == 3
+
+    response = client.get(
+        "/xhr/units/%s/edit/" % unit.id,
+        {"tm_prefetch": ",".join(str(next_unit.id) for next_unit in next_units)},
+        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+    )
+    assert response.status_code == 200
+    assert json.loads(response.content)["tm_suggestions"][0]["target"] == (
+        "Translation of %s" % unit.source
+    )
+    # Prefetching is limited to `PREFETCH_UNITS` units
+    assert dummy_tm_backend.lookups == [
+        (language, [unit.source]),
+        (language, [next_unit.source for next_unit in next_units[:2]]),
+    ]
+
+    response = client.get(
+        "/xhr/units/%s/edit/" % next_units[0].id,
+        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+    )
+    result = json.loads(response.content)
+    assert len(dummy_tm_backend.lookups) == 2
+    assert result["tm_suggestions"] == [
+        {
+            "unit_id": "0",
+            "source": str(next_units[0].source),
+            "target": "Translation of %s" % next_units[0].source,
+            "project": "Project",
+            "path": "/path/",
+            "username": "user",
+            "fullname": "User",
+            "email_md5": None,
+            "mtime": None,
+            "score": 1.0,
+            "count": 1,
+        }
+    ]
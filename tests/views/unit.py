@@ -7,8 +7,11 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import json
+
 import pytest
 
+from django.core.exceptions import PermissionDenied
 from django.http import Http404
 
 from tests.utils import create_api_request
@@ -18,10 +21,10 @@ from translate.misc.multistring import multistring
 from pootle.core.exceptions import Http400
 from pootle_app.models.permissions import check_permission
 from pootle_comment import get_model as get_comment_model
-from pootle_store.constants import TRANSLATED, UNTRANSLATED
+from pootle_store.constants import OBSOLETE, TRANSLATED, UNTRANSLATED
 from pootle_store.models import QualityCheck, Suggestion, Unit
 from pootle_statistics.models import Submission, SubmissionTypes
-from pootle_store.views import get_uids, toggle_qualitycheck
+from pootle_store.views import get_uids, toggle_qualitycheck, toggle_qualitychecks
 
 
 @pytest.mark.django_db
@@ -237,3 +240,51 @@ def test_submit_unit_plural(client, unit_plural, request_users):
 
     else:
         assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_toggle_quality_checks(rf, admin, member, tp0):
+    """Tests the view that mutes/unmutes quality checks in bulk."""
+    checks = QualityCheck.objects.filter(
+        unit__store__translation_project=tp0,
+        unit__state__gt=OBSOLETE,
+        false_positive=False,
+    )
+    name = checks.values_list("name", flat=True).first()
+    check_ids = list(checks.filter(name=name).values_list("id", flat=True))
+
+    data = "path=%s&check=%s&mute=1" % (tp0.pootle_path, name)
+    request = create_api_request(
+        rf, method="post", user=member, data=data, encode_as_json=False
+    )
+    with pytest.raises(PermissionDenied):
+        toggle_qualitychecks(request)
+
+    request = create_api_request(
+        rf, method="post", user=admin, data=data, encode_as_json=False
+    )
+    response = toggle_qualitychecks(request)
+    assert response.status_code == 200
+    assert json.loads(response.content) == {"count": len(check_ids)}
+    assert not QualityCheck.objects.filter(
+        id__in=check_ids, false_positive=False
+    ).exists()
+
+    # No `mute` parameter, unmute
+    data = "path=%s&check=%s" % (tp0.pootle_path, name)
+    request = create_api_request(
+        rf, method="post", user=admin, data=data, encode_as_json=False
+    )
+    response = toggle_qualitychecks(request)
+    assert json.loads(response.content) == {"count": len(check_ids)}
+    assert not QualityCheck.objects.filter(
+        id__in=check_ids, false_positive=True
+    ).exists()
+
+    # Unknown check
+    data = "path=%s&check=foo" % tp0.pootle_path
+    request = create_api_request(
+        rf, method="post", user=admin, data=data, encode_as_json=False
+    )
+    with pytest.raises(Http400):
+        toggle_qualitychecks(request)